@@ -0,0 +1,286 @@
+import ctypes
+import array
+import bisect
+import logging
+
+import pyglet.gl as gl
+import numpy as np
+
+import vertex_format
+
+INITIAL_CAPACITY = 1 << 16 # in quads (2 MiB)
+COMMAND_WORDS = 5 # index count, instance count, first index, base vertex, base instance
+
+def get_draw_commands(ranges, base = 0, first_index = 0, instance = 0):
+	# indirect draw commands of an (N, 2) array of ranges of quads, as an (N, COMMAND_WORDS) NumPy array
+	# 'base', 'first_index' & 'instance' are either the same for all ranges, or arrays of one per range
+	commands = np.empty((len(ranges), COMMAND_WORDS), dtype = np.uint32)
+
+	commands[:, 0] = ranges[:, 1] * 6
+	commands[:, 1] = 1
+	commands[:, 2] = first_index
+	commands[:, 3] = (base + ranges[:, 0]) * 4
+	commands[:, 4] = instance
+
+	return commands
+
+class Allocator:
+	"""First-fit allocator of ranges of quads, keeping a sorted list of free blocks
+	which get merged back together as soon as they're next to each other again"""
+
+	def __init__(self, capacity):
+		self.capacity = capacity
+		self.used = 0
+		self.allocation_count = 0
+
+		# free blocks, as sorted lists of their starts and of their sizes
+
+		self.free_starts = [0] if capacity else []
+		self.free_sizes = [capacity] if capacity else []
+
+	def allocate(self, size):
+		# start of a free range of 'size' quads, or None if there's no block big enough
+		for i, free_size in enumerate(self.free_sizes):
+			if free_size < size:
+				continue
+
+			start = self.free_starts[i]
+
+			if free_size == size:
+				del self.free_starts[i]
+				del self.free_sizes[i]
+			else:
+				self.free_starts[i] += size
+				self.free_sizes[i] -= size
+
+			self.used += size
+			self.allocation_count += 1
+			return start
+
+		return None
+
+	def free(self, start, size):
+		self.used -= size
+		self.allocation_count -= 1
+
+		i = bisect.bisect(self.free_starts, start)
+
+		# merge with the free blocks right before and after
+
+		if i < len(self.free_starts) and start + size == self.free_starts[i]:
+			size += self.free_sizes[i]
+			del self.free_starts[i]
+			del self.free_sizes[i]
+
+		if i and self.free_starts[i - 1] + self.free_sizes[i - 1] == start:
+			self.free_sizes[i - 1] += size
+			return
+
+		self.free_starts.insert(i, start)
+		self.free_sizes.insert(i, size)
+
+	def get_free_end(self):
+		# size of the free block at the end, if there's one
+		if self.free_starts and self.free_starts[-1] + self.free_sizes[-1] == self.capacity:
+			return self.free_sizes[-1]
+		return 0
+
+	def grow(self, capacity):
+		# the new space is free, merged with the free block at the end if there's one
+		if self.get_free_end():
+			self.free_sizes[-1] += capacity - self.capacity
+		else:
+			self.free_starts.append(self.capacity)
+			self.free_sizes.append(capacity - self.capacity)
+
+		self.capacity = capacity
+
+	def get_largest_free_block(self):
+		return max(self.free_sizes, default = 0)
+
+class Geometry_arena:
+	"""One big vertex buffer all chunk meshes are sub-allocated from, so that all visible chunks
+	can be drawn with a single multi-draw indirect call, without any state change in between
+	Each chunk gets one range of quads, its opaque region followed by its translucent region (see 'mesh_layout')
+	Chunk positions are an instanced vertex attribute, read at the base instance of each draw command
+	With translucent sorting, the sorted indices of the visible chunks are put one after the other in an index buffer of their own,
+	which translucent commands point into (see 'translucency')"""
+
+	def __init__(self, world):
+		self.world = world
+		self.allocator = Allocator(INITIAL_CAPACITY)
+
+		self.vao = gl.GLuint(0)
+		gl.glGenVertexArrays(1, self.vao)
+		gl.glBindVertexArray(self.vao)
+
+		self.vbo = self.create_vertex_buffer(INITIAL_CAPACITY)
+
+		# chunk positions of the chunks being drawn, one per instance
+
+		self.instance_buffer = gl.GLuint(0)
+		gl.glGenBuffers(1, self.instance_buffer)
+		gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instance_buffer)
+		gl.glVertexAttribIPointer(1, 2, gl.GL_INT, 2 * ctypes.sizeof(gl.GLint), 0)
+		gl.glVertexAttribDivisor(1, 1)
+		gl.glEnableVertexAttribArray(1)
+
+		gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, world.ibo)
+
+		self.indirect_command_buffer = gl.GLuint(0)
+		gl.glGenBuffers(1, self.indirect_command_buffer)
+
+		self.translucent_ibo = gl.GLuint(0)
+		gl.glGenBuffers(1, self.translucent_ibo)
+
+		self.draw_count = 0
+		self.translucent_draw_count = 0
+
+	def delete(self):
+		gl.glDeleteBuffers(1, self.vbo)
+		gl.glDeleteBuffers(1, self.instance_buffer)
+		gl.glDeleteBuffers(1, self.indirect_command_buffer)
+		gl.glDeleteBuffers(1, self.translucent_ibo)
+		gl.glDeleteVertexArrays(1, self.vao)
+
+	def create_vertex_buffer(self, capacity):
+		# the arena VAO needs to be bound
+		vbo = gl.GLuint(0)
+		gl.glGenBuffers(1, vbo)
+		gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo)
+		gl.glBufferData(gl.GL_ARRAY_BUFFER, capacity * vertex_format.QUAD_SIZE, None, gl.GL_DYNAMIC_DRAW)
+
+		gl.glVertexAttribIPointer(0, vertex_format.VERTEX_WORDS, gl.GL_UNSIGNED_INT, vertex_format.VERTEX_SIZE, 0)
+		gl.glEnableVertexAttribArray(0)
+		return vbo
+
+	def grow(self, size):
+		# double the arena until an allocation of 'size' quads fits at its end, copying the meshes over on the GPU
+		capacity = self.allocator.capacity
+
+		while capacity - self.allocator.capacity + self.allocator.get_free_end() < size:
+			capacity *= 2
+
+		logging.info(f"Growing geometry arena to {capacity} quads ({capacity * vertex_format.QUAD_SIZE // 1048576} MiB)")
+
+		gl.glBindVertexArray(self.vao)
+		old_vbo = self.vbo
+		self.vbo = self.create_vertex_buffer(capacity)
+
+		gl.glBindBuffer(gl.GL_COPY_READ_BUFFER, old_vbo)
+		gl.glCopyBufferSubData(gl.GL_COPY_READ_BUFFER, gl.GL_ARRAY_BUFFER, 0, 0, self.allocator.capacity * vertex_format.QUAD_SIZE)
+		gl.glDeleteBuffers(1, old_vbo)
+
+		self.allocator.grow(capacity)
+
+	def allocate(self, size):
+		start = self.allocator.allocate(size)
+
+		if start is None:
+			self.grow(size)
+			start = self.allocator.allocate(size)
+
+		return start
+
+	def free(self, start, size):
+		self.allocator.free(start, size)
+
+	def upload(self, start, meshes):
+		# write meshes one after the other, from the start of an allocation
+		gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+		offset = start * vertex_format.QUAD_SIZE
+
+		for mesh in meshes:
+			if not mesh:
+				continue
+
+			size = ctypes.sizeof(gl.GLuint * len(mesh))
+			gl.glBufferSubData(gl.GL_ARRAY_BUFFER, offset, size, (gl.GLuint * len(mesh)).from_buffer(mesh))
+			offset += size
+
+	def prepare_draw_commands(self, visible_chunks, sorted_chunks):
+		"""Fill the instance & indirect command buffers for this frame
+		Opaque commands come first, nearest chunk first, then translucent ones, furthest chunk first"""
+
+		# the commands of all chunks are made at once, out of their ranges and the base, first index & instance of each range
+
+		positions = array.array('i')
+		instances = {}
+		ranges, bases, first_indices, range_instances = [], [], [], []
+
+		def add_ranges(render_chunk, chunk_ranges, first_index):
+			ranges.append(chunk_ranges)
+			bases.append(render_chunk.arena_start)
+			first_indices.append(first_index)
+			range_instances.append(instances[render_chunk])
+
+		for render_chunk in visible_chunks:
+			if render_chunk.arena_start is None:
+				continue
+
+			instances[render_chunk] = len(instances)
+			positions.extend((render_chunk.chunk_position[0], render_chunk.chunk_position[2]))
+			add_ranges(render_chunk, render_chunk.draw_ranges, 0)
+
+		opaque_chunk_count = len(ranges)
+		translucent_indices = []
+		first_index = 0
+
+		for render_chunk in sorted_chunks:
+			if render_chunk.translucent_draw_quad_count and render_chunk in instances:
+				add_ranges(render_chunk, render_chunk.translucent_draw_ranges, first_index)
+
+				if render_chunk.quad_sorter:
+					translucent_indices.append(render_chunk.quad_sorter.indices)
+					first_index += len(translucent_indices[-1])
+
+		range_counts = list(map(len, ranges))
+		self.draw_count = sum(range_counts[:opaque_chunk_count])
+		self.translucent_draw_count = sum(range_counts[opaque_chunk_count:])
+
+		commands = get_draw_commands(np.concatenate(ranges) if ranges else np.zeros((0, 2), dtype = np.int64),
+			*(np.repeat(np.array(values, dtype = np.int64), range_counts) for values in (bases, first_indices, range_instances)))
+
+		if translucent_indices:
+			# not bound as an element array buffer, which would change the binding of whatever VAO is bound
+			indices = np.concatenate(translucent_indices)
+			gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, self.translucent_ibo)
+			gl.glBufferData(gl.GL_COPY_WRITE_BUFFER, indices.nbytes, indices.ctypes.data, gl.GL_STREAM_DRAW)
+
+		if not len(commands):
+			return
+
+		gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.instance_buffer)
+		gl.glBufferData(gl.GL_ARRAY_BUFFER, ctypes.sizeof(gl.GLint * len(positions)),
+			(gl.GLint * len(positions)).from_buffer(positions), gl.GL_STREAM_DRAW)
+
+		gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, self.indirect_command_buffer)
+		gl.glBufferData(gl.GL_DRAW_INDIRECT_BUFFER, commands.nbytes, commands.ctypes.data, gl.GL_STREAM_DRAW)
+
+	def draw(self, mode):
+		if not self.draw_count:
+			return
+
+		gl.glBindVertexArray(self.vao)
+		gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, self.indirect_command_buffer)
+		gl.glMultiDrawElementsIndirect(mode, gl.GL_UNSIGNED_INT, None, self.draw_count, 0)
+
+	def draw_translucent(self, mode):
+		if not self.translucent_draw_count:
+			return
+
+		gl.glBindVertexArray(self.vao)
+		gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, self.indirect_command_buffer)
+
+		if self.world.options.TRANSLUCENT_SORTING:
+			gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.translucent_ibo)
+
+		gl.glMultiDrawElementsIndirect(mode, gl.GL_UNSIGNED_INT,
+			self.draw_count * COMMAND_WORDS * ctypes.sizeof(gl.GLuint), self.translucent_draw_count, 0)
+
+		if self.world.options.TRANSLUCENT_SORTING:
+			gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.world.ibo)
+
+	def get_memory_usage(self):
+		# used & allocated bytes
+		return self.allocator.used * vertex_format.QUAD_SIZE, self.allocator.capacity * vertex_format.QUAD_SIZE
@@ -0,0 +1,673 @@
+"""Headless benchmarks for the chunk code
+Run with `python3 benchmark.py [name ...]` from the community directory
+None of them need a window or an OpenGL context"""
+
+import sys
+import math
+import itertools
+import time
+import array
+import ctypes
+import random
+import os
+import tracemalloc
+import types
+from concurrent.futures import ThreadPoolExecutor
+from functools import cmp_to_key
+
+import pyglet
+
+pyglet.options["shadow_window"] = False
+
+import glm
+import nbtlib as nbt
+import numpy as np
+
+import chunk
+import culling
+import save
+import block_storage
+import block_type
+import streaming
+import subchunk
+import mesher
+import mesh_layout
+import section_graph
+import translucency
+import world
+import vertex_format
+
+RENDER_DISTANCES = (4, 16)
+SAMPLES = 1000000
+MESHING_BATCH = 64 # roughly the subchunks submitted every tick with the default chunk updates
+CHUNK_UPDATES = 4 # default chunk updates, the subchunks of each chunk submitted every tick
+
+def chunk_count(render_distance):
+	return (2 * render_distance) ** 2
+
+def load_save_blocks(path = "save"):
+	# raw block data of every chunk of the bundled world, in chunk file order
+
+	loader = save.Save(None, path)
+	chunk_files = []
+
+	for x in range(-4, 4):
+		for z in range(-4, 4):
+			try:
+				chunk_files.append(nbt.load(loader.chunk_position_to_path((x, 0, z)))["Level"]["Blocks"].tobytes())
+			except FileNotFoundError:
+				pass
+
+	return chunk_files
+
+def measure(build):
+	tracemalloc.start()
+	result = build()
+	size, _ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return result, size
+
+def bench_storage():
+	"""Memory & access time of each block storage mode compared to the old nested lists"""
+
+	chunk_files = load_save_blocks()
+
+	def build_nested(data):
+		return [[[data[x * chunk.CHUNK_LENGTH * chunk.CHUNK_HEIGHT + z * chunk.CHUNK_HEIGHT + y]
+				for z in range(chunk.CHUNK_LENGTH)]
+				for y in range(chunk.CHUNK_HEIGHT)]
+				for x in range(chunk.CHUNK_WIDTH)]
+
+	def build_layers(data):
+		blocks = bytearray(chunk.CHUNK_WIDTH * chunk.CHUNK_HEIGHT * chunk.CHUNK_LENGTH)
+		layer_size = chunk.CHUNK_WIDTH * chunk.CHUNK_LENGTH
+
+		for y in range(chunk.CHUNK_HEIGHT):
+			blocks[y * layer_size:(y + 1) * layer_size] = data[y::chunk.CHUNK_HEIGHT]
+
+		return blocks
+
+	def build_storage(storage_type):
+		def build(data):
+			blocks = storage_type(chunk.CHUNK_WIDTH * chunk.CHUNK_HEIGHT * chunk.CHUNK_LENGTH)
+			blocks[:] = build_layers(data)
+			return blocks
+
+		return build
+
+	def get_nested(nested_chunk, position):
+		lx, ly, lz = position
+		return nested_chunk.blocks[lx][ly][lz]
+
+	positions = [(random.randrange(chunk.CHUNK_WIDTH), random.randrange(chunk.CHUNK_HEIGHT), random.randrange(chunk.CHUNK_LENGTH))
+			for i in range(SAMPLES)]
+
+	for name, build, get in (
+			("nested", build_nested, get_nested),
+			("flat", build_storage(block_storage.Flat_storage), chunk.Chunk.get_block_number),
+			("palette", build_storage(block_storage.Palette_storage), chunk.Chunk.get_block_number)):
+		chunks, size = measure(lambda: [types.SimpleNamespace(blocks = build(data)) for data in chunk_files])
+		chunk_size = size / len(chunks)
+
+		start = time.perf_counter()
+		for i, position in enumerate(positions):
+			get(chunks[i % len(chunks)], position)
+		access_time = (time.perf_counter() - start) / SAMPLES
+
+		for render_distance in RENDER_DISTANCES:
+			count = chunk_count(render_distance)
+			print(f"{name:8} RD {render_distance:2}: {count:5} chunks, {chunk_size * count / 1048576:9.3f} MiB, "
+				f"{access_time * 1e9:6.1f} ns/access")
+
+def bench_chunk_io():
+	"""Main thread time spent per tick on loading chunk files, when read synchronously vs by the streamer's worker threads"""
+
+	# chunk installation (lighting, OpenGL objects) costs the same in both cases and isn't included
+
+	tick_time = 1 / 60
+	chunk_positions = [(x, 0, z) for x in range(-4, 4) for z in range(-4, 4)]
+
+	for palette_storage in (False, True):
+		loader = save.Save(types.SimpleNamespace(options = types.SimpleNamespace(PALETTE_STORAGE = palette_storage)))
+		name = "palette" if palette_storage else "flat"
+
+		# synchronous: the whole read happens within the tick which loads the chunk
+
+		tick_costs = []
+
+		for chunk_position in chunk_positions:
+			start = time.perf_counter()
+			loader.read_chunk(chunk_position)
+			tick_costs.append(time.perf_counter() - start)
+
+		print(f"{name:8} sync:  {1000 * sum(tick_costs) / len(tick_costs):7.3f} ms/tick avg, {1000 * max(tick_costs):7.3f} ms/tick max")
+
+		# asynchronous: each tick only collects the reads which are done, like 'Chunk_streamer.update'
+
+		executor = ThreadPoolExecutor(streaming.IO_THREADS)
+		pending_reads = [executor.submit(loader.read_chunk, chunk_position) for chunk_position in chunk_positions]
+		tick_costs = []
+
+		while pending_reads:
+			start = time.perf_counter()
+
+			if pending_reads[0].done():
+				pending_reads.pop(0).result()
+
+			tick_costs.append(time.perf_counter() - start)
+			time.sleep(max(tick_time - tick_costs[-1], 0))
+
+		executor.shutdown()
+		print(f"{name:8} async: {1000 * sum(tick_costs) / len(tick_costs):7.3f} ms/tick avg, {1000 * max(tick_costs):7.3f} ms/tick max")
+
+def load_block_types():
+	# block types without any texture manager, only the texture indices matter to the meshers
+	texture_manager = types.SimpleNamespace(textures = [])
+	texture_manager.add_texture = lambda texture: texture in texture_manager.textures or texture_manager.textures.append(texture)
+	return block_type.load_block_types(texture_manager)
+
+def load_block_table():
+	return mesher.get_block_table(types.SimpleNamespace(
+		block_types = load_block_types(),
+		light_blocks = [10, 11, 50, 51, 62, 75]))
+
+def load_chunk_columns():
+	# padded snapshot of the whole column of every chunk of the bundled world, lit by full skylight, by chunk position
+	# as (blocks, light), the same way 'World.get_block_neighbourhood' gives them out
+
+	world_blocks = np.zeros((chunk.CHUNK_HEIGHT + 2, 8 * chunk.CHUNK_WIDTH + 2, 8 * chunk.CHUNK_LENGTH + 2), dtype = np.uint8)
+
+	for x in range(-4, 4):
+		for z in range(-4, 4):
+			data = nbt.load(save.Save(None).chunk_position_to_path((x, 0, z)))["Level"]["Blocks"].tobytes()
+			wx, wz = (x + 4) * chunk.CHUNK_WIDTH + 1, (z + 4) * chunk.CHUNK_LENGTH + 1
+
+			# saves are laid out X, then Z, then Y
+			world_blocks[1:-1, wx:wx + chunk.CHUNK_WIDTH, wz:wz + chunk.CHUNK_LENGTH] = \
+				np.frombuffer(data, np.uint8).reshape(chunk.CHUNK_WIDTH, chunk.CHUNK_LENGTH, chunk.CHUNK_HEIGHT).transpose(2, 0, 1)
+
+	light = bytes((15 << 4,)) * ((chunk.CHUNK_HEIGHT + 2) * (chunk.CHUNK_WIDTH + 2) * (chunk.CHUNK_LENGTH + 2))
+	columns = {}
+
+	for x in range(-4, 4):
+		for z in range(-4, 4):
+			wx, wz = (x + 4) * chunk.CHUNK_WIDTH, (z + 4) * chunk.CHUNK_LENGTH
+			columns[x, z] = (world_blocks[:, wx:wx + chunk.CHUNK_WIDTH + 2, wz:wz + chunk.CHUNK_LENGTH + 2].tobytes(), light)
+
+	return columns
+
+def get_local_positions():
+	return [(sx * subchunk.SUBCHUNK_WIDTH, sy * subchunk.SUBCHUNK_HEIGHT, sz * subchunk.SUBCHUNK_LENGTH) for sx, sy, sz in chunk.SUBCHUNK_POSITIONS]
+
+def load_chunk_snapshots():
+	# padded snapshots of every non-empty subchunk of the bundled world, lit by full skylight, by chunk position
+	chunk_snapshots = {}
+
+	for chunk_position, (blocks, light) in load_chunk_columns().items():
+		snapshots = mesher.cut_snapshots((blocks, light, (0, 0, 0), (chunk.CHUNK_WIDTH, chunk.CHUNK_HEIGHT, chunk.CHUNK_LENGTH), get_local_positions()))
+		chunk_snapshots[chunk_position] = [snapshot for snapshot in snapshots if any(snapshot[0][offset] for offset in mesher.INNER_OFFSETS)]
+
+	return chunk_snapshots
+
+def load_snapshots():
+	return [snapshot for snapshots in load_chunk_snapshots().values() for snapshot in snapshots]
+
+def bench_mesher_pool():
+	"""Subchunk meshing throughput of the mesher pool for each mesher & different numbers of worker processes, next to the main thread,
+	along with the CPU time the main process spends on each subchunk sending the snapshots & getting the meshes back,
+	which is what bounds how much meshing can speed up with more CPU cores
+	Like 'Mesher_pool.flush', each tick sends a snapshot of the box around the next few subchunks to update of every chunk"""
+
+	block_table = load_block_table()
+	chunk_snapshots = load_chunk_snapshots()
+
+	shape = (chunk.CHUNK_HEIGHT + 2, chunk.CHUNK_WIDTH + 2, chunk.CHUNK_LENGTH + 2)
+	columns = {chunk_position: tuple(np.frombuffer(data, np.uint8).reshape(shape) for data in column)
+		for chunk_position, column in load_chunk_columns().items()}
+
+	ticks = []
+
+	for tick in itertools.count():
+		boxes = []
+
+		for chunk_position, snapshots in chunk_snapshots.items():
+			local_positions = [local_position for blocks, light, local_position in
+				snapshots[tick * CHUNK_UPDATES:(tick + 1) * CHUNK_UPDATES]]
+
+			if not local_positions:
+				continue
+
+			# same box as 'Mesher_pool.get_box', cut out of the snapshot of the whole column
+
+			start = tuple(map(min, zip(*local_positions)))
+			end = tuple(map(max, zip(*local_positions)))
+			size = tuple(j - i + extent for i, j, extent in zip(start, end, (subchunk.SUBCHUNK_WIDTH, subchunk.SUBCHUNK_HEIGHT, subchunk.SUBCHUNK_LENGTH)))
+
+			(x, y, z), (width, height, length) = start, size
+			window = (slice(y, y + height + 2), slice(x, x + width + 2), slice(z, z + length + 2))
+
+			blocks, light = columns[chunk_position]
+			boxes.append((blocks[window].tobytes(), light[window].tobytes(), start, size, local_positions))
+
+		if not boxes:
+			break
+
+		ticks.append(boxes)
+
+	subchunk_count = sum(map(len, chunk_snapshots.values()))
+	print(f"{os.cpu_count()} CPU cores, {subchunk_count} subchunks over {len(ticks)} ticks")
+
+	for mesher_type in mesher.MESHERS:
+		for processes in (0,) + tuple(sorted({1, 2, 4, os.cpu_count()})):
+			if processes:
+				executor = mesher.create_executor(processes, mesher_type, block_table)
+				executor.submit(int).result() # don't count the time spent spawning the workers
+			else:
+				subchunk_mesher = mesher.MESHERS[mesher_type](block_table)
+
+			start = time.perf_counter()
+			start_cpu = time.process_time() # of every thread of the main process, but not of the workers
+
+			if processes:
+				futures = [executor.submit(mesher.mesh_boxes_worker, boxes, True) for boxes in ticks]
+
+				for future in futures:
+					future.result()
+			else:
+				for boxes in ticks:
+					subchunk_mesher.mesh_boxes(boxes, True)
+
+			elapsed = time.perf_counter() - start
+			main_cpu = time.process_time() - start_cpu
+
+			if processes:
+				executor.shutdown()
+
+			name = f"{processes} processes" if processes else "main thread"
+			print(f"{mesher_type:7} {name:12}: {subchunk_count / elapsed:8.1f} subchunks/s, "
+				f"{1e6 * main_cpu / subchunk_count:6.1f} us/subchunk on the main process")
+
+def bench_meshers():
+	"""Time taken by each mesher to mesh every subchunk of the bundled world, in batches of subchunk snapshots,
+	and then chunk by chunk out of the snapshot of the whole column, as the mesher pool does when a whole chunk is updated at once,
+	which is what the bitmask mesher builds its bitmasks over"""
+
+	block_table = load_block_table()
+	chunk_snapshots = load_chunk_snapshots()
+	snapshots = [snapshot for snapshots in chunk_snapshots.values() for snapshot in snapshots]
+	python_meshes = {}
+
+	meshers = [(name, mesher_type, False) for name, mesher_type in mesher.MESHERS.items()] + [("greedy", mesher.Numpy_mesher, True)]
+
+	for smooth_lighting in (False, True):
+		for name, mesher_type, greedy_meshing in meshers:
+			subchunk_mesher = mesher_type(block_table, greedy_meshing)
+
+			start = time.perf_counter()
+			meshes = [meshes for i in range(0, len(snapshots), MESHING_BATCH)
+				for meshes in subchunk_mesher.mesh(snapshots[i:i + MESHING_BATCH], smooth_lighting)]
+			mesh_time = time.perf_counter() - start
+
+			python_meshes.setdefault(smooth_lighting, meshes)
+
+			if greedy_meshing:
+				face_count = sum(face_count for mesh, translucent_mesh, face_count in meshes)
+				quad_count = sum(len(mesh) // vertex_format.QUAD_WORDS for mesh, translucent_mesh, face_count in meshes)
+				result = f"{face_count} faces -> {quad_count} quads ({face_count / quad_count:.2f}:1)"
+			else:
+				result = "same meshes as python" if meshes == python_meshes[smooth_lighting] else "DIFFERENT MESHES"
+
+			print(f"{name:8} {'smooth' if smooth_lighting else 'flat  '}: {1e6 * mesh_time / len(snapshots):7.1f} us/subchunk, "
+				f"{len(snapshots) / mesh_time:8.1f} subchunks/s, {result}")
+
+	column_size = (chunk.CHUNK_WIDTH, chunk.CHUNK_HEIGHT, chunk.CHUNK_LENGTH)
+	boxes = [(blocks, light, (0, 0, 0), column_size, [local_position for _, _, local_position in chunk_snapshots[chunk_position]])
+		for chunk_position, (blocks, light) in load_chunk_columns().items()]
+
+	for smooth_lighting in (False, True):
+		for name, mesher_type in mesher.MESHERS.items():
+			subchunk_mesher = mesher_type(block_table)
+
+			start = time.perf_counter()
+			meshes = subchunk_mesher.mesh_boxes(boxes, smooth_lighting)
+			mesh_time = time.perf_counter() - start
+
+			python_meshes.setdefault((smooth_lighting, "columns"), meshes)
+			result = "same meshes as python" if meshes == python_meshes[smooth_lighting, "columns"] else "DIFFERENT MESHES"
+
+			print(f"{name:8} {'smooth' if smooth_lighting else 'flat  '}: {1e6 * mesh_time / len(snapshots):7.1f} us/subchunk, "
+				f"{len(snapshots) / mesh_time:8.1f} subchunks/s, {result} (whole columns)")
+
+def bench_chunk_upload():
+	"""Time & peak memory spent turning the subchunk meshes of each chunk into the buffer handed to 'glBufferSubData'"""
+
+	subchunk_mesher = mesher.Numpy_mesher(load_block_table())
+	chunk_meshes = [[mesh for mesh, translucent_mesh, face_count in subchunk_mesher.mesh(snapshots, True)]
+		for snapshots in load_chunk_snapshots().values()]
+
+	def build_list(meshes):
+		# concatenated into a list of Python ints, which is unpacked into a ctypes array
+		mesh = []
+		for subchunk_mesh in meshes:
+			mesh += subchunk_mesh
+		return (ctypes.c_uint * len(mesh))(*mesh)
+
+	def build_array(meshes):
+		# concatenated into a packed array, which the ctypes array is only a view of
+		mesh = array.array('I')
+		for subchunk_mesh in meshes:
+			mesh.extend(subchunk_mesh)
+		return (ctypes.c_uint * len(mesh)).from_buffer(mesh)
+
+	for name, build in (("list", build_list), ("array", build_array)):
+		start = time.perf_counter()
+		for meshes in chunk_meshes:
+			build(meshes)
+		upload_time = (time.perf_counter() - start) / len(chunk_meshes)
+
+		peak_size = 0
+		tracemalloc.start()
+
+		for meshes in chunk_meshes:
+			tracemalloc.reset_peak()
+			buffer = build(meshes)
+			peak_size = max(peak_size, tracemalloc.get_traced_memory()[1])
+			del buffer
+
+		tracemalloc.stop()
+		print(f"{name:8}: {1000 * upload_time:7.3f} ms/chunk, {peak_size / 1048576:7.3f} MiB peak")
+
+def bench_edit_upload():
+	"""Bytes uploaded & CPU time per block edit, when the whole chunk mesh is uploaded again vs only the range of the edited subchunk"""
+
+	subchunk_mesher = mesher.Numpy_mesher(load_block_table())
+	chunk_meshes = [{snapshot[2]: mesh for snapshot, (mesh, translucent_mesh, face_count) in zip(snapshots, subchunk_mesher.mesh(snapshots, True))}
+		for snapshots in load_chunk_snapshots().values()]
+
+	random.seed(0)
+	edits = []
+
+	for i, meshes in enumerate(chunk_meshes):
+		# each edit adds or removes up to 5 faces to a random subchunk (breaking a block out of the ground exposes 5 of them)
+		for j in range(100):
+			position = random.choice(list(meshes))
+			quad_count = len(meshes[position]) // vertex_format.QUAD_WORDS + random.randint(-5, 5)
+			edits.append((i, position, (meshes[position] * 2)[:max(quad_count, 0) * vertex_format.QUAD_WORDS]))
+
+	def upload_all(meshes, region, position, mesh):
+		meshes[position] = mesh
+		data = array.array('I')
+		for subchunk_mesh in meshes.values():
+			data.extend(subchunk_mesh)
+		return len(data) * 4, 0
+
+	def upload_range(meshes, region, position, mesh):
+		meshes[position] = mesh
+		writes = region.update(position, mesh)
+		if writes is None:
+			return len(region.build(meshes)) * 4, 1
+		return sum(len(data) * 4 for start, data in writes), 0
+
+	for name, upload in (("chunk", upload_all), ("subchunk", upload_range)):
+		all_meshes = [dict(meshes) for meshes in chunk_meshes]
+		regions = [mesh_layout.Mesh_region() for meshes in chunk_meshes]
+
+		for meshes, region in zip(all_meshes, regions):
+			region.build(meshes)
+
+		uploaded = rebuilds = 0
+		start = time.perf_counter()
+
+		for i, position, mesh in edits:
+			size, rebuilt = upload(all_meshes[i], regions[i], position, mesh)
+			uploaded += size
+			rebuilds += rebuilt
+
+		edit_time = (time.perf_counter() - start) / len(edits)
+		print(f"{name:8}: {uploaded / len(edits) / 1024:7.2f} KiB/edit, {1e6 * edit_time:7.1f} us/edit, {rebuilds} full rebuilds out of {len(edits)} edits")
+
+def bench_vertex_memory():
+	"""GPU memory allocated for the vertex data of each chunk, with full-size buffers vs buffers sized to the laid out meshes"""
+
+	subchunk_mesher = mesher.Numpy_mesher(load_block_table())
+	used = allocated = 0
+	chunk_meshes = list(load_chunk_snapshots().values())
+
+	for snapshots in chunk_meshes:
+		meshes = subchunk_mesher.mesh(snapshots, True)
+		used += sum(len(mesh) + len(translucent_mesh) for mesh, translucent_mesh, face_count in meshes) * 4
+
+		for region_meshes in ([mesh for mesh, translucent_mesh, face_count in meshes], [translucent_mesh for mesh, translucent_mesh, face_count in meshes]):
+			region = mesh_layout.Mesh_region()
+			region.build({snapshot[2]: mesh for snapshot, mesh in zip(snapshots, region_meshes)})
+			allocated += region.get_capacity() * vertex_format.QUAD_SIZE
+
+	full_size = chunk.CHUNK_WIDTH * chunk.CHUNK_HEIGHT * chunk.CHUNK_LENGTH * vertex_format.VERTEX_SIZE
+	print(f"used       : {used / len(chunk_meshes) / 1024:8.1f} KiB/chunk")
+
+	for name, size in (("full size", full_size * len(chunk_meshes)), ("right-sized", allocated)):
+		print(f"{name:11}: {size / len(chunk_meshes) / 1024:8.1f} KiB/chunk ({100 * used / size:5.1f}% used), "
+			+ ", ".join(f"{size / len(chunk_meshes) * chunk_count(render_distance) / 1048576:7.1f} MiB at RD {render_distance}" for render_distance in RENDER_DISTANCES))
+
+def bench_index_buffer():
+	"""Time taken to generate the data of the shared index buffer, for as many quads as the old one and as the default one"""
+
+	def build_list(quad_count):
+		indices = []
+		for nquad in range(quad_count):
+			indices += (4 * nquad + 0, 4 * nquad + 1, 4 * nquad + 2, 4 * nquad + 2, 4 * nquad + 3, 4 * nquad + 0)
+		return (ctypes.c_uint * len(indices))(*indices)
+
+	def build_numpy(quad_count):
+		return vertex_format.get_quad_indices(np.arange(quad_count))
+
+	for quad_count in (chunk.CHUNK_WIDTH * chunk.CHUNK_HEIGHT * chunk.CHUNK_LENGTH * 8, world.INDEX_BUFFER_QUADS):
+		for name, build in (("list", build_list), ("numpy", build_numpy)):
+			start = time.perf_counter()
+			build(quad_count)
+			print(f"{name:8} {quad_count:7} quads: {1000 * (time.perf_counter() - start):9.2f} ms, {quad_count * 6 * 4 / 1048576:6.2f} MiB")
+
+def bench_chunk_ring():
+	"""Time per frame spent finding the visible chunks nearest first, when every loaded chunk is culled & the visible ones sorted
+	with 'math.dist' vs when only the chunk ring is culled, the player walking into another chunk every 60 frames"""
+
+	frames = 600
+	matrix = glm.perspective(glm.radians(90), 16 / 9, 0.1, 500) * glm.lookAt(glm.vec3(0, 80, 0), glm.vec3(1, 70, 0.3), glm.vec3(0, 1, 0))
+	planes = culling.get_frustum_planes(matrix)
+
+	def get_center(frame):
+		return glm.ivec3(frame // 60, 0, 0)
+
+	def sort_all(test_world):
+		for frame in range(frames):
+			center = get_center(frame)
+			loaded_chunks = list(test_world.chunks.values())
+			positions = np.fromiter(itertools.chain.from_iterable(test_world.chunks), dtype = np.int32, count = len(test_world.chunks) * 3).reshape(-1, 3)
+
+			in_range = ((positions - center) ** 2).sum(axis = 1) <= test_world.options.RENDER_DISTANCE ** 2
+			indices = np.flatnonzero(in_range)
+			visible, _ = culling.cull_chunks(planes, positions[indices], True)
+
+			visible_chunks = [loaded_chunks[i] for i in indices[visible].tolist()]
+			visible_chunks.sort(key = cmp_to_key(lambda a, b: math.dist(center, a.chunk_position) - math.dist(center, b.chunk_position)))
+
+	def use_ring(test_world):
+		chunk_ring = culling.Chunk_ring(test_world)
+
+		for frame in range(frames):
+			chunk_ring.update(get_center(frame), (get_center(frame), 4))
+			visible, _ = culling.cull_chunks(planes, chunk_ring.positions, True)
+			visible_chunks = [chunk_ring.chunks[i] for i in visible.tolist()]
+
+	for render_distance in RENDER_DISTANCES + (32,):
+		# the streamer keeps a few more chunks loaded than there are in render distance
+		loaded = range(-render_distance - 2, render_distance + 2 + frames // 60)
+
+		test_world = types.SimpleNamespace(options = types.SimpleNamespace(RENDER_DISTANCE = render_distance, CAVE_CULLING = False),
+			chunks = {glm.ivec3(x, 0, z): types.SimpleNamespace(chunk_position = glm.ivec3(x, 0, z)) for x in loaded for z in loaded})
+
+		for name, find_visible in (("sort all", sort_all), ("ring", use_ring)):
+			start = time.perf_counter()
+			find_visible(test_world)
+			print(f"{name:8} render distance {render_distance:2} ({len(test_world.chunks):5} loaded): "
+				f"{1000 * (time.perf_counter() - start) / frames:7.3f} ms per frame")
+
+def bench_cave_culling():
+	"""Time taken to work out the connections of each section of the bundled world, and to walk the sections of the chunk ring
+	from the surface and from underground, with the bundled world tiled over the whole render distance, along with the share
+	of the sections which can be reached, and the time per frame spent walking while the connections of a chunk change every frame"""
+
+	layer_size = chunk.CHUNK_WIDTH * chunk.CHUNK_LENGTH
+	opaque_table = bytes(int(bool(block) and not block.transparent) for block in load_block_types()).ljust(256, b"\0")
+
+	section_connections = []
+	start = time.perf_counter()
+
+	for data in load_save_blocks():
+		blocks = bytearray(len(data))
+
+		for y in range(chunk.CHUNK_HEIGHT):
+			blocks[y * layer_size:(y + 1) * layer_size] = data[y::chunk.CHUNK_HEIGHT]
+
+		section_connections.append([section_graph.get_section_connections(bytes(blocks[section * section_graph.SECTION_SIZE:
+			(section + 1) * section_graph.SECTION_SIZE]).translate(opaque_table)) for section in range(chunk.SECTION_COUNT)])
+
+	section_count = len(section_connections) * chunk.SECTION_COUNT
+	print(f"connections of {section_count} sections: {1000 * (time.perf_counter() - start) / section_count:.3f} ms per section")
+
+	for render_distance in RENDER_DISTANCES + (32,):
+		loaded = range(-render_distance, render_distance + 1)
+
+		test_world = types.SimpleNamespace(options = types.SimpleNamespace(RENDER_DISTANCE = render_distance, CAVE_CULLING = True),
+			chunks = {glm.ivec3(x, 0, z): types.SimpleNamespace(chunk_position = glm.ivec3(x, 0, z),
+				section_connections = section_connections[(x * 7 + z) % len(section_connections)]) for x in loaded for z in loaded})
+
+		chunk_ring = culling.Chunk_ring(test_world)
+
+		for name, section in (("surface", 4), ("underground", 1)):
+			start = time.perf_counter()
+			chunk_ring.update((0, 0, 0), ((0, 0, 0), section))
+			walk_time = time.perf_counter() - start
+
+			print(f"{name:11} render distance {render_distance:2}: {1000 * walk_time:8.2f} ms, "
+				f"{chunk_ring.reachable_section_count:6} / {len(chunk_ring.chunks) * chunk.SECTION_COUNT:6} sections reachable")
+
+		# as when chunks stream in, the camera staying in the same section at the surface
+
+		chunk_ring.update((0, 0, 0), ((0, 0, 0), 4))
+		frame_times = []
+
+		for frame in range(120):
+			chunk_ring.invalidate_sections()
+
+			start = time.perf_counter()
+			chunk_ring.update((0, 0, 0), ((0, 0, 0), 4))
+			frame_times.append(time.perf_counter() - start)
+
+		print(f"{'streaming':11} render distance {render_distance:2}: {1000 * max(frame_times):8.2f} ms worst frame, "
+			f"{1000 * sum(frame_times) / len(frame_times):.2f} ms per frame")
+
+def bench_face_buckets():
+	"""Time taken to split the opaque meshes of every subchunk of the bundled world into face buckets,
+	and share of the opaque quads still drawn once only the face buckets which can face the camera are,
+	with the bundled world tiled over the whole render distance around a camera at the surface"""
+
+	subchunk_mesher = mesher.Numpy_mesher(load_block_table())
+	chunk_snapshots = list(load_chunk_snapshots().values())
+	chunk_meshes = [subchunk_mesher.mesh(snapshots, True) for snapshots in chunk_snapshots]
+
+	start = time.perf_counter()
+	chunk_face_meshes = [mesher.split_faces(meshes) for meshes in chunk_meshes]
+	subchunk_count = sum(map(len, chunk_meshes))
+	print(f"split {subchunk_count} subchunks: {1000 * (time.perf_counter() - start) / subchunk_count:.3f} ms per subchunk")
+
+	# quads of each face bucket in each section of each chunk
+
+	quad_counts = np.zeros((len(chunk_meshes), vertex_format.FACE_BUCKET_COUNT, chunk.SECTION_COUNT), dtype = np.int64)
+
+	for i, (snapshots, face_meshes) in enumerate(zip(chunk_snapshots, chunk_face_meshes)):
+		for (blocks, light, (x, y, z)), (meshes, translucent_mesh, face_count) in zip(snapshots, face_meshes):
+			for bucket, mesh in enumerate(meshes):
+				quad_counts[i, bucket, y // chunk.SECTION_HEIGHT] += len(mesh) // vertex_format.QUAD_WORDS
+
+	camera_position = (0.5, 80, 0.5)
+
+	for render_distance in RENDER_DISTANCES:
+		loaded = range(-render_distance, render_distance + 1)
+		positions = np.array([(x, 0, z) for x in loaded for z in loaded if x * x + z * z <= render_distance ** 2])
+
+		counts = quad_counts[(positions[:, 0] * 7 + positions[:, 2]) % len(quad_counts)]
+		bucket_masks = culling.get_bucket_masks(positions, camera_position)
+		drawn = (counts * (bucket_masks[..., np.newaxis] >> np.arange(chunk.SECTION_COUNT) & 1)).sum(axis = (1, 2))
+
+		distant = np.abs(positions).max(axis = 1) > 1
+
+		for name, chunks in (("all", slice(None)), ("distant", distant)):
+			print(f"render distance {render_distance:2}, {name:7} chunks: {100 * drawn[chunks].sum() / counts[chunks].sum():5.1f}% of opaque quads drawn")
+
+def bench_translucent_sorting():
+	"""Time taken to sort the translucent quads of each chunk of the bundled world from the camera, the first time,
+	again once the camera moved a block, starting from the last order, and with only the sections around the camera visible,
+	along with the bytes of indices uploaded"""
+
+	subchunk_mesher = mesher.Numpy_mesher(load_block_table())
+	quad_sorters = []
+
+	for snapshots in load_chunk_snapshots().values():
+		meshes = {snapshot[2]: translucent_mesh for snapshot, (mesh, translucent_mesh, face_count) in zip(snapshots, subchunk_mesher.mesh(snapshots, True))}
+
+		region = mesh_layout.Mesh_region()
+		region.build(meshes)
+
+		quad_sorter = translucency.Quad_sorter()
+		quad_sorter.update(region, meshes, {position: position[1] * subchunk.SUBCHUNK_HEIGHT // chunk.SECTION_HEIGHT for position in meshes})
+
+		if quad_sorter.get_quad_count():
+			quad_sorters.append(quad_sorter)
+
+	quad_count = sum(quad_sorter.get_quad_count() for quad_sorter in quad_sorters)
+	print(f"{len(quad_sorters)} chunks with {quad_count} translucent quads")
+
+	camera_position = np.array((8.0, 70.0, 8.0))
+
+	camera_section = int(camera_position[1]) // chunk.SECTION_HEIGHT
+	near_sections = 0b111 << camera_section - 1 # the camera's section & those right above & below
+
+	for name, offset, section_mask in (
+			("first sort", 0, chunk.ALL_SECTIONS),
+			("camera moved", translucency.SORT_DISTANCE, chunk.ALL_SECTIONS),
+			("culled", translucency.SORT_DISTANCE, near_sections)):
+
+		start = time.perf_counter()
+
+		for quad_sorter in quad_sorters:
+			quad_sorter.set_section_mask(section_mask)
+			quad_sorter.sort(camera_position + offset)
+
+		index_size = sum(quad_sorter.indices.nbytes for quad_sorter in quad_sorters)
+
+		print(f"{name:12}: {1000 * (time.perf_counter() - start) / len(quad_sorters):6.3f} ms per chunk, "
+			f"{index_size / len(quad_sorters) / 1024:6.1f} KiB of indices per chunk")
+
+BENCHMARKS = {
+	"storage": bench_storage,
+	"chunk_io": bench_chunk_io,
+	"mesher_pool": bench_mesher_pool,
+	"meshers": bench_meshers,
+	"chunk_upload": bench_chunk_upload,
+	"edit_upload": bench_edit_upload,
+	"vertex_memory": bench_vertex_memory,
+	"index_buffer": bench_index_buffer,
+	"chunk_ring": bench_chunk_ring,
+	"cave_culling": bench_cave_culling,
+	"face_buckets": bench_face_buckets,
+	"translucent_sorting": bench_translucent_sorting,
+}
+
+def main():
+	for name in sys.argv[1:] or BENCHMARKS:
+		print(f"# {name}: {BENCHMARKS[name].__doc__}")
+		BENCHMARKS[name]()
+
+if __name__ == "__main__":
+	main()
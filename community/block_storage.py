@@ -0,0 +1,185 @@
+import sys
+
+# block storage backends for chunks
+# both store a flat sequence of block numbers and expose the subset of the bytearray API that the rest of the code uses,
+# so that 'chunk.blocks' can be indexed the same way whatever the storage mode is
+
+SECTION_SIZE = 16 * 16 * 16 # blocks per section (16 layers of a chunk)
+
+# tables used to extract the n-th packed index out of each byte, for each possible bits per index
+
+EXTRACT_TABLES = {
+	bits: [bytes((value >> (i * bits)) & ((1 << bits) - 1) for value in range(256)) for i in range(8 // bits)]
+	for bits in (1, 2, 4)
+}
+
+def get_bits(palette_length):
+	# indices are only ever packed on 1, 2, 4 or 8 bits, so that they never straddle two bytes
+	# uniform sections don't need any index at all
+	for bits in (0, 1, 2, 4):
+		if palette_length <= 1 << bits:
+			return bits
+	return 8
+
+class Flat_storage(bytearray):
+	"""One byte per block, fastest to access"""
+
+	def get_uniform(self, section):
+		# block number the whole section is made of, or None if it isn't uniform
+		start = section * SECTION_SIZE
+		number = self[start]
+
+		if self.count(number, start, start + SECTION_SIZE) == SECTION_SIZE:
+			return number
+
+	def get_memory_usage(self):
+		return sys.getsizeof(self)
+
+class Section:
+	"""16x16x16 blocks, stored as a local palette of block numbers and a bit-packed array of indices into it
+	Uniform sections are stored as their only block number"""
+
+	__slots__ = ("palette", "palette_indices", "bits", "data")
+
+	def __init__(self, blocks = None):
+		self.set_blocks(blocks or bytes(SECTION_SIZE))
+
+	def set_blocks(self, blocks):
+		self.palette = sorted(set(blocks))
+		self.palette_indices = {number: i for i, number in enumerate(self.palette)}
+		self.bits = get_bits(len(self.palette))
+
+		if not self.bits:
+			self.data = bytearray()
+			return
+
+		indices = blocks.translate(bytes(self.palette_indices.get(number, 0) for number in range(256)))
+
+		if self.bits == 8:
+			self.data = bytearray(indices)
+			return
+
+		# pack all the indices at once, relying on the fact no packed index overflows into the next byte
+
+		per_byte = 8 // self.bits
+		packed = 0
+
+		for i in range(per_byte):
+			packed |= int.from_bytes(indices[i::per_byte], "little") << (i * self.bits)
+
+		self.data = bytearray(packed.to_bytes(SECTION_SIZE // per_byte, "little"))
+
+	def get_blocks(self):
+		if not self.bits:
+			return bytearray(self.palette) * SECTION_SIZE
+
+		palette_table = bytes(self.palette) + bytes(256 - len(self.palette))
+
+		if self.bits == 8:
+			return self.data.translate(palette_table)
+
+		per_byte = 8 // self.bits
+		indices = bytearray(SECTION_SIZE)
+
+		for i, table in enumerate(EXTRACT_TABLES[self.bits]):
+			indices[i::per_byte] = self.data.translate(table)
+
+		return indices.translate(palette_table)
+
+	def get(self, index):
+		bits = self.bits
+		if not bits:
+			return self.palette[0]
+
+		shift = (index % (8 // bits)) * bits
+		return self.palette[(self.data[index * bits >> 3] >> shift) & ((1 << bits) - 1)]
+
+	def set(self, index, number):
+		palette_index = self.palette_indices.get(number)
+
+		if not self.bits and palette_index is not None:
+			return # the whole section already is that block
+
+		if palette_index is None:
+			if len(self.palette) == 1 << self.bits:
+				# palette is full, repack the section (dropping unused entries, or growing the indices)
+				blocks = self.get_blocks()
+				blocks[index] = number
+				self.set_blocks(blocks)
+				return
+
+			palette_index = len(self.palette)
+			self.palette.append(number)
+			self.palette_indices[number] = palette_index
+
+		bits = self.bits
+		shift = (index % (8 // bits)) * bits
+		byte_index = index * bits >> 3
+		self.data[byte_index] = self.data[byte_index] & ~(((1 << bits) - 1) << shift) | palette_index << shift
+
+		# collapse sections which became uniform, which is the case when all bytes hold the same index over and over
+
+		first_byte = self.data[0]
+
+		if self.data.count(first_byte) == len(self.data):
+			first_index = first_byte & ((1 << bits) - 1)
+
+			if first_byte == sum(first_index << (i * bits) for i in range(8 // bits)):
+				self.set_blocks(bytes((self.palette[first_index],)) * SECTION_SIZE)
+
+	def get_memory_usage(self):
+		return sys.getsizeof(self) + sys.getsizeof(self.palette) + sys.getsizeof(self.palette_indices) + sys.getsizeof(self.data)
+
+class Palette_storage:
+	"""Compact storage, made out of palette-compressed sections"""
+
+	def __init__(self, size):
+		self.size = size
+		self.sections = [Section() for i in range(size // SECTION_SIZE)]
+
+	def __len__(self):
+		return self.size
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			start, stop, step = index.indices(self.size)
+			first, last = start // SECTION_SIZE, (stop - 1) // SECTION_SIZE
+			blocks = b"".join(section.get_blocks() for section in self.sections[first:last + 1])
+			return blocks[start - first * SECTION_SIZE:stop - first * SECTION_SIZE:step]
+
+		return self.sections[index // SECTION_SIZE].get(index % SECTION_SIZE)
+
+	def __setitem__(self, index, value):
+		if not isinstance(index, slice):
+			self.sections[index // SECTION_SIZE].set(index % SECTION_SIZE, value)
+			return
+
+		# only rebuild the sections covered by the slice
+
+		start, stop, step = index.indices(self.size)
+		first, last = start // SECTION_SIZE, (stop - 1) // SECTION_SIZE
+		blocks = bytearray(b"".join(section.get_blocks() for section in self.sections[first:last + 1]))
+		blocks[start - first * SECTION_SIZE:stop - first * SECTION_SIZE:step] = value
+
+		for i, section in enumerate(self.sections[first:last + 1]):
+			section.set_blocks(blocks[i * SECTION_SIZE:(i + 1) * SECTION_SIZE])
+
+	def find(self, number, start = 0):
+		for i in range(start // SECTION_SIZE, len(self.sections)):
+			section = self.sections[i]
+			if number not in section.palette_indices:
+				continue
+
+			index = section.get_blocks().find(number, max(start - i * SECTION_SIZE, 0))
+			if index != -1:
+				return i * SECTION_SIZE + index
+
+		return -1
+
+	def get_uniform(self, section):
+		section = self.sections[section]
+		if not section.bits:
+			return section.palette[0]
+
+	def get_memory_usage(self):
+		return sys.getsizeof(self) + sys.getsizeof(self.sections) + sum(section.get_memory_usage() for section in self.sections)
@@ -1,5 +1,7 @@
 import collider
+import vertex_format
 
+import models
 import models.cube # default model
 
 class Block_type:
@@ -65,4 +67,71 @@ class Block_type:
 				set_block_face(5, texture_index)
 			
 			else:
-				set_block_face(["right", "left", "top", "bottom", "front", "back"].index(face), texture_index)
\ No newline at end of file
+				set_block_face(["right", "left", "top", "bottom", "front", "back"].index(face), texture_index)
+
+		# per-face vertex templates, 4 packed vertices like in chunk meshes (see 'vertex_format'), relative to the block
+		# texture fetcher & base shading are baked in and light levels are left at 0, so that meshers only have to move them and patch in the light
+
+		self.face_templates = [tuple(word
+				for i in range(4)
+				for word in (
+					vertex_format.pack_position(*vertex_positions[i * 3:i * 3 + 3]),
+					tex_index * 64 + i | vertex_format.pack_shading(shading[i])))
+			for vertex_positions, tex_index, shading in zip(self.vertex_positions, self.tex_indices, self.shading_values)]
+
+def load_block_types(texture_manager, path = "data/blocks.mcpy"):
+	"""Parses the block type data file into a list of block types indexed by block number (None for air)"""
+
+	block_types = [None]
+
+	blocks_data_file = open(path)
+	blocks_data = blocks_data_file.readlines()
+	blocks_data_file.close()
+
+	for block in blocks_data:
+		if block[0] in ['\n', '#']: # skip if empty line or comment
+			continue
+		
+		number, props = block.split(':', 1)
+		number = int(number)
+
+		# default block
+
+		name = "Unknown"
+		model = models.cube
+		texture = {"all": "unknown"}
+
+		# read properties
+
+		for prop in props.split(','):
+			prop = prop.strip()
+			prop = list(filter(None, prop.split(' ', 1)))
+
+			if prop[0] == "sameas":
+				sameas_number = int(prop[1])
+
+				name = block_types[sameas_number].name
+				texture = block_types[sameas_number].block_face_textures
+				model = block_types[sameas_number].model
+			
+			elif prop[0] == "name":
+				name = eval(prop[1])
+			
+			elif prop[0][:7] == "texture":
+				_, side = prop[0].split('.')
+				texture[side] = prop[1].strip()
+
+			elif prop[0] == "model":
+				model = eval(prop[1])
+		
+		# add block type
+
+		_block_type = Block_type(texture_manager, name, texture, model)
+
+		if number < len(block_types):
+			block_types[number] = _block_type
+		
+		else:
+			block_types.append(_block_type)
+
+	return block_types
@@ -1,9 +1,18 @@
 import ctypes
+import array
 from collections import deque
 
 import pyglet.gl as gl
+import glm
+import numpy as np
 
 import subchunk 
+import arena
+import block_storage
+import mesh_layout
+import section_graph
+import translucency
+import vertex_format
 
 import options
 
@@ -11,10 +20,96 @@ CHUNK_WIDTH = 16
 CHUNK_HEIGHT = 128
 CHUNK_LENGTH = 16
 
+SECTION_HEIGHT = block_storage.SECTION_SIZE // (CHUNK_WIDTH * CHUNK_LENGTH)
+SECTION_COUNT = CHUNK_HEIGHT // SECTION_HEIGHT
+ALL_SECTIONS = (1 << SECTION_COUNT) - 1 # section mask of a chunk which is fully visible (see 'culling')
+
+COMMAND_WORDS = 5 # words of each indirect draw command
+
+SUBCHUNK_POSITIONS = tuple((x, y, z)
+	for x in range(CHUNK_WIDTH // subchunk.SUBCHUNK_WIDTH)
+	for y in range(CHUNK_HEIGHT // subchunk.SUBCHUNK_HEIGHT)
+	for z in range(CHUNK_LENGTH // subchunk.SUBCHUNK_LENGTH))
+
+# blocks are stored in a flat buffer, layer by layer (Y, then X, then Z)
+# this keeps 16-high sections contiguous and makes a column a simple strided slice
+
+def get_index_position(index):
+	y, xz = divmod(index, CHUNK_WIDTH * CHUNK_LENGTH)
+	x, z = divmod(xz, CHUNK_LENGTH)
+	return x, y, z
+
+# subchunks on each horizontal side of a chunk, which need to be updated when the chunk on that side changes
+
+BORDER_SUBCHUNK_POSITIONS = {
+	( 1, 0,  0): tuple(position for position in SUBCHUNK_POSITIONS if position[0] == CHUNK_WIDTH // subchunk.SUBCHUNK_WIDTH - 1),
+	(-1, 0,  0): tuple(position for position in SUBCHUNK_POSITIONS if position[0] == 0),
+	( 0, 0,  1): tuple(position for position in SUBCHUNK_POSITIONS if position[2] == CHUNK_LENGTH // subchunk.SUBCHUNK_LENGTH - 1),
+	( 0, 0, -1): tuple(position for position in SUBCHUNK_POSITIONS if position[2] == 0),
+}
+
+def get_outdated_subchunks(changed):
+	"""Which subchunks of an area of whole chunks have a block next to a changed one, including diagonally,
+	as their meshes are built out of the blocks & light around them too
+	'changed' is a mask of the blocks of the area (Y, then X, then Z), and so is the mask returned, with a value per subchunk"""
+
+	# one axis at a time, a subchunk is outdated if any of its blocks changed, or the last block of the one before it, or the first of the one after it
+
+	outdated = changed
+
+	for axis, size in ((1, subchunk.SUBCHUNK_WIDTH), (2, subchunk.SUBCHUNK_LENGTH), (0, subchunk.SUBCHUNK_HEIGHT)):
+		blocks = np.moveaxis(outdated, axis, 0)
+		spread = blocks.reshape(-1, size, *blocks.shape[1:]).any(axis = 1)
+
+		spread[1:] |= blocks[size - 1:-1:size]
+		spread[:-1] |= blocks[size::size]
+		outdated = np.moveaxis(spread, 0, axis)
+
+	return outdated
+
+# offsets of the blocks of a subchunk relative to the index of its first block
+
+SUBCHUNK_OFFSETS = tuple((y * CHUNK_WIDTH + x) * CHUNK_LENGTH + z
+	for y in range(subchunk.SUBCHUNK_HEIGHT)
+	for x in range(subchunk.SUBCHUNK_WIDTH)
+	for z in range(subchunk.SUBCHUNK_LENGTH))
+
+# the lightmap packs block light in the low nibble and skylight in the high nibble of each byte
+# these translation tables replace one of the nibbles with a given level, keeping the other one
+
+BLOCK_LIGHT_TABLES = [bytes((raw & 0xF0) | level for raw in range(256)) for level in range(16)]
+SKY_LIGHT_TABLES = [bytes((raw & 0xF) | (level << 4) for raw in range(256)) for level in range(16)]
+
+# translation table turning block numbers into 1 for anything but air
+NON_AIR_TABLE = bytes(1) + bytes((1,)) * 255
+
+def copy_box(layers, start, end, box):
+	"""Copy the local box [start; end[ of chunk data into 'box', a (Y, X, Z) NumPy view of the same shape
+	'layers' are the layers of the chunk data from start.y on, the whole box is copied at once"""
+
+	sx, sy, sz = start
+	ex, ey, ez = end
+
+	box[...] = np.frombuffer(layers, np.uint8).reshape(ey - sy, CHUNK_WIDTH, CHUNK_LENGTH)[:, sx:ex, sz:ez]
+
+def get_multi_draw_arrays(ranges):
+	# index counts, index offsets & base vertices of an (N, 2) array of ranges of quads, for 'glMultiDrawElementsBaseVertex'
+	# the ctypes arrays share the memory of the NumPy arrays, and keep them alive
+	counts = (ranges[:, 1] * 6).astype(np.int32)
+	base_vertices = (ranges[:, 0] * 4).astype(np.int32)
+
+	return (
+		(gl.GLsizei * len(ranges)).from_buffer(counts),
+		(ctypes.c_void_p * len(ranges))(),
+		(gl.GLint * len(ranges)).from_buffer(base_vertices))
+
+def get_region_meshes(region_subchunk):
+	# meshes of a subchunk for each region of the vertex storage (see 'Chunk.get_regions')
+	return region_subchunk.face_meshes + (region_subchunk.translucent_mesh,)
+
 class Chunk:
-	def __init__(self, world, chunk_position):
+	def __init__(self, world, chunk_position, blocks = None):
 		self.world = world
-		self.shader_chunk_offset_location = self.world.shader.find_uniform(b"u_ChunkPosition")
 		
 		self.modified = False
 		self.chunk_position = chunk_position
@@ -24,30 +119,79 @@ class Chunk:
 			self.chunk_position[1] * CHUNK_HEIGHT,
 			self.chunk_position[2] * CHUNK_LENGTH)
 		
-		self.blocks = [[[0 for z in range(CHUNK_LENGTH)]
-							for y in range(CHUNK_HEIGHT)]
-							for x in range(CHUNK_WIDTH)]
-		# Numpy is really slow there
-		self.lightmap = [[[0 for z in range(CHUNK_LENGTH)]
-							for y in range(CHUNK_HEIGHT)]
-							for x in range(CHUNK_WIDTH)]
+		if blocks is not None: # already decoded (see 'Save.read_chunk')
+			self.blocks = blocks
+		elif self.world.options.PALETTE_STORAGE:
+			self.blocks = block_storage.Palette_storage(CHUNK_WIDTH * CHUNK_HEIGHT * CHUNK_LENGTH)
+		else:
+			self.blocks = block_storage.Flat_storage(CHUNK_WIDTH * CHUNK_HEIGHT * CHUNK_LENGTH)
+
+		# same layout as the blocks
+		self.lightmap = bytearray(CHUNK_WIDTH * CHUNK_HEIGHT * CHUNK_LENGTH)
+
+		# heights of the first block above the highest non-air and highest opaque block of each column (0 if there's none)
+		# indexed like a layer of blocks (X, then Z)
+		self.height_map = bytearray(CHUNK_WIDTH * CHUNK_LENGTH)
+		self.opaque_height_map = bytearray(CHUNK_WIDTH * CHUNK_LENGTH)
 		
+		# subchunks are only created once they might have something to mesh (see 'is_subchunk_elided')
+
 		self.subchunks = {}
 		self.chunk_update_queue = deque()
-		
-		for x in range(int(CHUNK_WIDTH / subchunk.SUBCHUNK_WIDTH)):
-			for y in range(int(CHUNK_HEIGHT / subchunk.SUBCHUNK_HEIGHT)):
-				for z in range(int(CHUNK_LENGTH / subchunk.SUBCHUNK_LENGTH)):
-					self.subchunks[(x, y, z)] = subchunk.Subchunk(self, (x, y, z))
+		self.pending_mesh_count = 0 # subchunks being meshed by the mesher pool
 
 		# mesh variables
 
-		self.mesh = []
-		self.translucent_mesh = []
-
 		self.mesh_quad_count = 0
 		self.translucent_quad_count = 0
+		self.mesh_face_count = 0 # opaque faces before greedy meshing
 
+		# each subchunk mesh has its own range of quads, in a region of the vertex storage of the chunk
+		# so that only the subchunks which changed need to be uploaded again (see 'mesh_layout')
+		# there's a region for each face bucket of the opaque meshes, so that only those which can face the camera are drawn,
+		# followed by the translucent region
+
+		self.mesh_regions = [mesh_layout.Mesh_region(mesh_layout.BUCKET_RANGE_SLACK) for bucket in range(vertex_format.FACE_BUCKET_COUNT)]
+		self.translucent_mesh_region = mesh_layout.Mesh_region()
+		self.updated_subchunks = set() # positions of the subchunks whose mesh changed since the last upload
+
+		# translucent quads can be drawn back to front from their own index buffer instead (see 'translucency')
+
+		self.quad_sorter = translucency.Quad_sorter() if self.world.options.TRANSLUCENT_SORTING else None
+
+		self.storage_size = None # in quads, None until the regions are first laid out
+		self.translucent_base = 0 # first quad of the translucent region
+
+		# only the ranges of each region holding the sections in the view frustum are drawn
+		# ranges are laid out section by section, so that the visible ranges of a chunk usually follow each other
+
+		self.section_mask = ALL_SECTIONS
+		self.bucket_masks = (ALL_SECTIONS,) * vertex_format.FACE_BUCKET_COUNT # sections each face bucket is drawn for
+		self.section_ranges = None # starts, used quad counts, sections & regions of the ranges of all regions, in order
+		self.mesh_section_mask = 0 # sections with anything to draw
+
+		# which faces of each section can be seen from each other, for cave culling (see 'section_graph')
+		# sections are seen through from everywhere until they're worked out, once the chunk gets built
+
+		self.section_connections = [section_graph.ALL_CONNECTIONS] * SECTION_COUNT
+		self.outdated_sections = 0 # mask of the sections whose blocks changed since
+
+		self.draw_ranges = np.zeros((0, 2), dtype = np.int64) # first quad & number of quads of each opaque range drawn, without their slack
+		self.draw_quad_count = 0
+		self.translucent_draw_ranges = np.zeros((0, 2), dtype = np.int64) # a single range of sorted quads with translucent sorting
+		self.translucent_draw_quad_count = 0
+
+		# the vertex storage is either its own VBO, or a range of the geometry arena (see 'arena.py')
+
+		self.arena_start = None
+		self.arena_size = 0 # in quads
+
+		if self.world.arena:
+			self.vao = None
+		else:
+			self.create_buffers()
+
+	def create_buffers(self):
 		# create VAO and VBO's
 
 		self.vao = gl.GLuint(0)
@@ -56,76 +200,160 @@ class Chunk:
 		
 		self.vbo = gl.GLuint(0)
 		gl.glGenBuffers(1, self.vbo)
-		gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
-		gl.glBufferData(gl.GL_ARRAY_BUFFER, ctypes.sizeof(gl.GLfloat * CHUNK_WIDTH * CHUNK_HEIGHT * CHUNK_LENGTH * 7), None, gl.GL_DYNAMIC_DRAW)
+		gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo) # only allocated once the mesh is built (see 'allocate_storage')
 
-		gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, 
-				gl.GL_FALSE, 7 * ctypes.sizeof(gl.GLfloat), 0)
-		gl.glEnableVertexAttribArray(0)
-		gl.glVertexAttribPointer(1, 1, gl.GL_FLOAT, 
-				gl.GL_FALSE, 7 * ctypes.sizeof(gl.GLfloat), 3 * ctypes.sizeof(gl.GLfloat))
-		gl.glEnableVertexAttribArray(1)
-		gl.glVertexAttribPointer(2, 1, gl.GL_FLOAT, 
-				gl.GL_FALSE, 7 * ctypes.sizeof(gl.GLfloat), 4 * ctypes.sizeof(gl.GLfloat))
-		gl.glEnableVertexAttribArray(2)
-		gl.glVertexAttribPointer(3, 1, gl.GL_FLOAT, 
-				gl.GL_FALSE, 7 * ctypes.sizeof(gl.GLfloat), 5 * ctypes.sizeof(gl.GLfloat))
-		gl.glEnableVertexAttribArray(3)
-		gl.glVertexAttribPointer(4, 1, gl.GL_FLOAT, 
-				gl.GL_FALSE, 7 * ctypes.sizeof(gl.GLfloat), 6 * ctypes.sizeof(gl.GLfloat))
-		gl.glEnableVertexAttribArray(4)
-		
+		# vertices are packed into 2 integers, which are unpacked by the vertex shaders (see 'vertex_format')
 
+		gl.glVertexAttribIPointer(0, vertex_format.VERTEX_WORDS, gl.GL_UNSIGNED_INT, vertex_format.VERTEX_SIZE, 0)
+		gl.glEnableVertexAttribArray(0)
 
-		gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, world.ibo)
+		gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.world.ibo)
 		
 		if self.world.options.INDIRECT_RENDERING:
+			# sized to the draw commands (see 'update_draw_commands')
 			self.indirect_command_buffer = gl.GLuint(0)
 			gl.glGenBuffers(1, self.indirect_command_buffer)
-			gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, self.indirect_command_buffer)
-			gl.glBufferData(
-				gl.GL_DRAW_INDIRECT_BUFFER, 
-				ctypes.sizeof(gl.GLuint * 10),
-				None,
-				gl.GL_DYNAMIC_DRAW
-			)	
 
-		self.draw_commands = []
+		if self.quad_sorter:
+			# the same vertices, drawn with the sorted indices of the translucent quads
+			self.translucent_vao = gl.GLuint(0)
+			gl.glGenVertexArrays(1, self.translucent_vao)
+			gl.glBindVertexArray(self.translucent_vao)
 
-		self.occlusion_query = gl.GLuint(0)
-		gl.glGenQueries(1, self.occlusion_query)
-		
+			gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+			gl.glVertexAttribIPointer(0, vertex_format.VERTEX_WORDS, gl.GL_UNSIGNED_INT, vertex_format.VERTEX_SIZE, 0)
+			gl.glEnableVertexAttribArray(0)
+
+			self.translucent_ibo = gl.GLuint(0)
+			gl.glGenBuffers(1, self.translucent_ibo)
+			gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.translucent_ibo)
+
+		self.draw_commands = []
 
 	def __del__(self):
-		gl.glDeleteQueries(1, self.occlusion_query)
+		self.delete()
+
+	def delete(self):
+		# free the GPU objects of the chunk, as soon as it gets unloaded
+		if self.arena_start is not None:
+			self.world.arena.free(self.arena_start, self.arena_size)
+			self.arena_start = None
+
+		if self.vao is None:
+			return
+
 		gl.glDeleteBuffers(1, self.vbo)
 		gl.glDeleteVertexArrays(1, self.vao)
 
+		if self.world.options.INDIRECT_RENDERING:
+			gl.glDeleteBuffers(1, self.indirect_command_buffer)
+
+		if self.quad_sorter:
+			gl.glDeleteBuffers(1, self.translucent_ibo)
+			gl.glDeleteVertexArrays(1, self.translucent_vao)
+
+		self.vao = None
+
 	def get_block_light(self, position):
 		x, y, z = position
-		return self.lightmap[x][y][z] & 0xF
+		return self.lightmap[(y * CHUNK_WIDTH + x) * CHUNK_LENGTH + z] & 0xF
 
 	def set_block_light(self, position, value):
 		x, y, z = position
-		self.lightmap[x][y][z] = (self.lightmap[x][y][z] & 0xF0) | value
+		index = (y * CHUNK_WIDTH + x) * CHUNK_LENGTH + z
+		self.lightmap[index] = (self.lightmap[index] & 0xF0) | value
 
 	def get_sky_light(self, position):
 		x, y, z = position
-		return (self.lightmap[x][y][z] >> 4) & 0xF
+		return self.lightmap[(y * CHUNK_WIDTH + x) * CHUNK_LENGTH + z] >> 4
 
 	def set_sky_light(self, position, value):
 		x, y, z = position
-		self.lightmap[x][y][z] = (self.lightmap[x][y][z] & 0xF) | (value << 4)
+		index = (y * CHUNK_WIDTH + x) * CHUNK_LENGTH + z
+		self.lightmap[index] = (self.lightmap[index] & 0xF) | (value << 4)
 
 	def get_raw_light(self, position):
 		x, y, z = position
-		return self.lightmap[x][y][z]
+		return self.lightmap[(y * CHUNK_WIDTH + x) * CHUNK_LENGTH + z]
+
+	# bulk lightmap accessors
+
+	def get_column_slice(self, lx, lz, start, end):
+		# a column is every CHUNK_WIDTH * CHUNK_LENGTH-th voxel
+		return slice(
+			(start * CHUNK_WIDTH + lx) * CHUNK_LENGTH + lz,
+			(end * CHUNK_WIDTH + lx) * CHUNK_LENGTH + lz,
+			CHUNK_WIDTH * CHUNK_LENGTH)
+
+	def fill_block_light(self, lx, lz, start, end, value):
+		column = self.get_column_slice(lx, lz, start, end)
+		self.lightmap[column] = self.lightmap[column].translate(BLOCK_LIGHT_TABLES[value])
+
+	def fill_sky_light(self, lx, lz, start, end, value):
+		column = self.get_column_slice(lx, lz, start, end)
+		self.lightmap[column] = self.lightmap[column].translate(SKY_LIGHT_TABLES[value])
+
+	def get_light_slab(self, start, end):
+		# raw light of layers [start; end[
+		return self.lightmap[start * CHUNK_WIDTH * CHUNK_LENGTH:end * CHUNK_WIDTH * CHUNK_LENGTH]
+
+	def set_light_slab(self, start, slab):
+		start *= CHUNK_WIDTH * CHUNK_LENGTH
+		self.lightmap[start:start + len(slab)] = slab
+
+	def get_light_box(self, start, end, box):
+		# see 'copy_box'
+		layer_size = CHUNK_WIDTH * CHUNK_LENGTH
+		layers = memoryview(self.lightmap)[start[1] * layer_size:end[1] * layer_size]
+		copy_box(layers, start, end, box)
+
+	def get_block_box(self, start, end, box):
+		# see 'copy_box', the layers are read at once as that's much cheaper than slicing each row with the palette storage
+		layer_size = CHUNK_WIDTH * CHUNK_LENGTH
+		layers = self.blocks[start[1] * layer_size:end[1] * layer_size]
+		copy_box(layers, start, end, box)
 
 	def get_block_number(self, position):
 		lx, ly, lz = position
+		return self.blocks[(ly * CHUNK_WIDTH + lx) * CHUNK_LENGTH + lz]
+
+	def set_block_number(self, position, number):
+		lx, ly, lz = position
+		self.blocks[(ly * CHUNK_WIDTH + lx) * CHUNK_LENGTH + lz] = number
+
+	# height maps
 
-		block_number = self.blocks[lx][ly][lz]
-		return block_number
+	def get_height_maps(self):
+		return ((self.height_map, NON_AIR_TABLE), (self.opaque_height_map, self.world.opaque_table))
+
+	def build_height_maps(self):
+		blocks = self.blocks[:]
+
+		for height_map, table in self.get_height_maps():
+			counted_blocks = blocks.translate(table)
+
+			for column in range(CHUNK_WIDTH * CHUNK_LENGTH):
+				height_map[column] = len(counted_blocks[column::CHUNK_WIDTH * CHUNK_LENGTH].rstrip(b"\0"))
+
+	def update_height_maps(self, position, number):
+		# only ever scans a column when its highest block is removed
+		lx, ly, lz = position
+		column = lx * CHUNK_LENGTH + lz
+
+		for height_map, table in self.get_height_maps():
+			if table[number]:
+				if ly >= height_map[column]:
+					height_map[column] = ly + 1
+
+			elif ly == height_map[column] - 1:
+				below = self.blocks[self.get_column_slice(lx, lz, 0, ly)]
+				height_map[column] = len(below.translate(table).rstrip(b"\0"))
+
+	def get_height(self, lx, lz):
+		return self.height_map[lx * CHUNK_LENGTH + lz]
+
+	def get_opaque_height(self, lx, lz):
+		return self.opaque_height_map[lx * CHUNK_LENGTH + lz]
 
 	def get_transparency(self, position):
 		block_type = self.world.block_types[self.get_block_number(position)]
@@ -146,10 +374,99 @@ class Chunk:
 		
 		return not block_type.transparent
 	
-	def update_subchunk_meshes(self):
-		self.chunk_update_queue.clear()
-		for subchunk in self.subchunks.values():
-			self.chunk_update_queue.append(subchunk)
+	def get_subchunk(self, subchunk_position):
+		if subchunk_position not in self.subchunks:
+			self.subchunks[subchunk_position] = subchunk.Subchunk(self, subchunk_position)
+
+		return self.subchunks[subchunk_position]
+
+	def is_opaque_cube_section(self, chunk_position, section):
+		# whether a section is made out of a single opaque cube block, which hides everything behind it
+		if not 0 <= section < CHUNK_HEIGHT // SECTION_HEIGHT:
+			return False
+
+		section_chunk = self.world.chunks.get(chunk_position, None)
+		if not section_chunk:
+			return False
+
+		number = section_chunk.blocks.get_uniform(section)
+		if not number:
+			return False
+
+		block_type = self.world.block_types[number]
+		return block_type.is_cube and not block_type.transparent
+
+	def is_subchunk_hidden(self, subchunk_position):
+		"""A subchunk is hidden when its section is a uniform opaque cube section
+		and every section it touches is one as well"""
+
+		sx, sy, sz = subchunk_position
+		cx, cy, cz = self.chunk_position
+
+		subchunks_per_section = SECTION_HEIGHT // subchunk.SUBCHUNK_HEIGHT
+		section = sy // subchunks_per_section
+
+		if not self.is_opaque_cube_section(self.chunk_position, section):
+			return False
+
+		neighbours = []
+
+		if sx == 0: neighbours.append(((cx - 1, cy, cz), section))
+		if sx == CHUNK_WIDTH // subchunk.SUBCHUNK_WIDTH - 1: neighbours.append(((cx + 1, cy, cz), section))
+
+		if sy % subchunks_per_section == 0: neighbours.append((self.chunk_position, section - 1))
+		if sy % subchunks_per_section == subchunks_per_section - 1: neighbours.append((self.chunk_position, section + 1))
+
+		if sz == 0: neighbours.append(((cx, cy, cz - 1), section))
+		if sz == CHUNK_LENGTH // subchunk.SUBCHUNK_LENGTH - 1: neighbours.append(((cx, cy, cz + 1), section))
+
+		return all(self.is_opaque_cube_section(glm.ivec3(chunk_position), section) for chunk_position, section in neighbours)
+
+	def is_subchunk_empty(self, subchunk_position):
+		sx, sy, sz = subchunk_position
+		base = ((sy * subchunk.SUBCHUNK_HEIGHT * CHUNK_WIDTH + sx * subchunk.SUBCHUNK_WIDTH) * CHUNK_LENGTH
+				+ sz * subchunk.SUBCHUNK_LENGTH)
+
+		return not any(self.blocks[base + offset] for offset in SUBCHUNK_OFFSETS)
+
+	def is_subchunk_elided(self, subchunk_position):
+		# don't bother with subchunks which can't have any face to render
+
+		section = subchunk_position[1] * subchunk.SUBCHUNK_HEIGHT // SECTION_HEIGHT
+
+		if self.blocks.get_uniform(section) == 0:
+			return True
+
+		return self.is_subchunk_hidden(subchunk_position) or self.is_subchunk_empty(subchunk_position)
+
+	def update_subchunk_meshes(self, subchunk_positions = None):
+		# update all subchunks by default, or only the given ones
+		if subchunk_positions is None:
+			self.chunk_update_queue.clear()
+			subchunk_positions = SUBCHUNK_POSITIONS
+
+		for subchunk_position in subchunk_positions:
+			if not self.is_subchunk_elided(subchunk_position):
+				self.queue_subchunk_update(subchunk_position)
+
+			else:
+				self.outdated_sections |= 1 << subchunk_position[1] * subchunk.SUBCHUNK_HEIGHT // SECTION_HEIGHT
+
+				if subchunk_position in self.subchunks:
+					del self.subchunks[subchunk_position]
+					self.updated_subchunks.add(subchunk_position)
+
+		if not self.chunk_update_queue:
+			self.world.queue_chunk_building(self)
+
+	def queue_subchunk_update(self, subchunk_position):
+		self.outdated_sections |= 1 << subchunk_position[1] * subchunk.SUBCHUNK_HEIGHT // SECTION_HEIGHT
+
+		pending_subchunk = self.get_subchunk(subchunk_position)
+		pending_subchunk.version += 1 # meshes still being built from older snapshots are now outdated
+
+		if pending_subchunk not in self.chunk_update_queue:
+			self.chunk_update_queue.append(pending_subchunk)
 
 	def update_at_position(self, position):
 		x, y, z = position
@@ -164,13 +481,11 @@ class Chunk:
 		sy = cly // subchunk.SUBCHUNK_HEIGHT
 		sz = clz // subchunk.SUBCHUNK_LENGTH
 
-		if self.subchunks[(sx, sy, sz)] not in self.chunk_update_queue:
-			self.chunk_update_queue.append(self.subchunks[(sx, sy, sz)])
+		self.queue_subchunk_update((sx, sy, sz))
 
 		def try_update_subchunk_mesh(subchunk_position):
-			if subchunk_position in self.subchunks:
-				if not self.subchunks[subchunk_position] in self.chunk_update_queue:
-					self.chunk_update_queue.append(self.subchunks[subchunk_position])
+			if subchunk_position in SUBCHUNK_POSITIONS:
+				self.queue_subchunk_update(subchunk_position)
 
 		if lx == subchunk.SUBCHUNK_WIDTH - 1: try_update_subchunk_mesh((sx + 1, sy, sz))
 		if lx == 0: try_update_subchunk_mesh((sx - 1, sy, sz))
@@ -185,183 +500,291 @@ class Chunk:
 		for i in range(self.world.options.CHUNK_UPDATES):
 			if self.chunk_update_queue:
 				subchunk = self.chunk_update_queue.popleft()
+
+				if self.world.mesher_pool:
+					# the chunk gets built once all its meshes are back (see 'Mesher_pool.collect')
+					self.world.mesher_pool.submit(subchunk)
+					continue
+
 				subchunk.update_mesh()
 				self.world.chunk_update_counter += 1
 				if not self.chunk_update_queue:
-					self.world.chunk_building_queue.append(self)
+					self.world.queue_chunk_building(self)
 					return
 
 	def update_mesh(self):
-		# combine all the small subchunk meshes into one big chunk mesh
-		
-		for subchunk in self.subchunks.values():
-			self.mesh += subchunk.mesh
-			self.translucent_mesh += subchunk.translucent_mesh
+		# upload the meshes of the subchunks which changed to their ranges
+		# everything is only laid out again the first time, once a mesh doesn't fit anywhere anymore,
+		# or once most of the storage isn't used anymore, so that it grows & shrinks with the meshes
 
-		# send the full mesh data to the GPU and free the memory used client-side (we don't need it anymore)
-		# don't forget to save the length of 'self.mesh_indices' before freeing
+		if not self.update_mesh_ranges() or any(region.is_sparse() for region in self.get_regions()):
+			self.build_mesh_ranges()
 
-		self.mesh_quad_count = len(self.mesh) // 28 # 28 = 7 (attributes of a vertex) * 4 (number of vertices per quad)
-		self.translucent_quad_count = len(self.translucent_mesh) // 28
+		self.updated_subchunks.clear()
 
-		self.send_mesh_data_to_gpu()
+		self.mesh_quad_count = sum(len(mesh) for subchunk in self.subchunks.values() for mesh in subchunk.face_meshes) // vertex_format.QUAD_WORDS
+		self.translucent_quad_count = sum(len(subchunk.translucent_mesh) for subchunk in self.subchunks.values()) // vertex_format.QUAD_WORDS
+		self.mesh_face_count = sum(subchunk.face_count for subchunk in self.subchunks.values())
 
-		self.mesh = []
-		self.translucent_mesh = []
-	
-	def send_mesh_data_to_gpu(self): # pass mesh data to gpu
-		if not self.mesh_quad_count:
+		self.translucent_base = self.get_region_bases()[-1]
+		self.world.reserve_indices(max(region.get_draw_count() for region in self.get_regions()))
+
+		if self.quad_sorter:
+			self.quad_sorter.update(self.translucent_mesh_region,
+				{position: subchunk.translucent_mesh for position, subchunk in self.subchunks.items()},
+				{position: position[1] * subchunk.SUBCHUNK_HEIGHT // SECTION_HEIGHT for position in self.subchunks})
+
+			self.upload_translucent_indices()
+
+		self.update_section_ranges()
+		self.set_section_masks(self.section_mask, self.bucket_masks)
+		self.update_section_connections()
+
+		# the last occlusion query of the chunk tested the box of its old meshes, it's drawn until it gets tested again
+		if self.world.occlusion_culler:
+			self.world.occlusion_culler.discard(self)
+
+	def get_regions(self):
+		# in the order they're laid out in the vertex storage
+		return self.mesh_regions + [self.translucent_mesh_region]
+
+	def get_region_bases(self):
+		bases = [0]
+
+		for region in self.get_regions()[:-1]:
+			bases.append(bases[-1] + region.get_capacity())
+
+		return bases
+
+	def update_section_connections(self):
+		# only the sections whose blocks changed are flood-filled again
+		if not self.outdated_sections or not self.world.options.CAVE_CULLING:
 			return
 
-		gl.glBindVertexArray(self.vao)
+		old_connections = list(self.section_connections)
+
+		for section in range(SECTION_COUNT):
+			if not self.outdated_sections >> section & 1:
+				continue
+
+			number = self.blocks.get_uniform(section)
+
+			if number is not None:
+				self.section_connections[section] = 0 if self.world.opaque_table[number] else section_graph.ALL_CONNECTIONS
+				continue
+
+			blocks = self.blocks[section * block_storage.SECTION_SIZE:(section + 1) * block_storage.SECTION_SIZE]
+			self.section_connections[section] = section_graph.get_section_connections(blocks.translate(self.world.opaque_table))
+
+		self.outdated_sections = 0
+
+		if self.section_connections != old_connections:
+			self.world.chunk_ring.invalidate_sections()
+
+	def update_section_ranges(self):
+		# regions are numbered in the order they're laid out, the translucent region coming last
+		region_ranges = [(base, region.get_used_ranges()) for region, base in zip(self.get_regions(), self.get_region_bases())]
+
+		starts = np.concatenate([base + starts for base, (positions, starts, counts) in region_ranges])
+		counts = np.concatenate([counts for base, (positions, starts, counts) in region_ranges])
+		sections = np.concatenate([positions[:, 1] for base, (positions, starts, counts) in region_ranges]) * subchunk.SUBCHUNK_HEIGHT // SECTION_HEIGHT
+		regions = np.repeat(np.arange(len(region_ranges)), [len(starts) for base, (positions, starts, counts) in region_ranges])
+
+		self.section_ranges = (starts, counts, sections, regions)
+		self.mesh_section_mask = int(np.bitwise_or.reduce(1 << sections, initial = 0))
+
+	def set_section_masks(self, section_mask, bucket_masks):
+		"""Draw the used quads of the ranges of the visible sections, in each region, ranges which follow each other being drawn at once
+		Face buckets are only drawn for the sections in which their faces can face the camera (see 'culling.get_bucket_masks')"""
+
+		self.section_mask = section_mask
+		self.bucket_masks = bucket_masks
+
+		if self.section_ranges is None: # not built yet
+			return
+
+		starts, counts, sections, regions = self.section_ranges
+
+		masks = np.array(bucket_masks + (section_mask,))[regions]
+		visible = (masks >> sections & 1).astype(bool)
+		translucent = regions == vertex_format.FACE_BUCKET_COUNT
+
+		# opaque regions follow each other, so the ranges of two of them can be drawn at once too
+
+		self.draw_ranges = mesh_layout.merge_ranges(starts[visible & ~translucent], counts[visible & ~translucent])
+		self.draw_quad_count = int(self.draw_ranges[:, 1].sum())
+		self.translucent_draw_ranges = mesh_layout.merge_ranges(starts[visible & translucent], counts[visible & translucent])
+		self.translucent_draw_quad_count = int(self.translucent_draw_ranges[:, 1].sum())
+
+		if self.quad_sorter and self.translucent_draw_quad_count:
+			# sorted quads are drawn at once from the start of their region, only those of the visible sections having indices
+			if self.quad_sorter.set_section_mask(section_mask):
+				self.upload_translucent_indices()
+
+			self.translucent_draw_quad_count = self.quad_sorter.get_drawn_quad_count()
+			self.translucent_draw_ranges = np.array([(self.translucent_base, self.translucent_draw_quad_count)], dtype = np.int64)
+
+		self.update_draw_commands()
+
+	def update_mesh_ranges(self):
+		# returns False if the regions need to be laid out again
+		if self.storage_size is None:
+			return False
+
+		writes = []
+		regions = self.get_regions()
+		bases = self.get_region_bases()
+
+		for subchunk_position in self.updated_subchunks:
+			updated_subchunk = self.subchunks.get(subchunk_position, None) # None if it got elided
+			meshes = get_region_meshes(updated_subchunk) if updated_subchunk else (array.array('I'),) * len(regions)
+
+			for region, base, mesh in zip(regions, bases, meshes):
+				region_writes = region.update(subchunk_position, mesh)
+
+				if region_writes is None:
+					return False
+
+				writes.extend((base + start, data) for start, data in region_writes)
+
+		for start, data in writes:
+			self.send_mesh_data_to_gpu(start, data)
+
+		return True
+
+	def build_mesh_ranges(self):
+		subchunks = sorted(self.subchunks.items(), key = lambda item: item[0][1]) # bottom to top, see 'set_section_masks'
+
+		subchunk_meshes = [(position, get_region_meshes(subchunk)) for position, subchunk in subchunks]
+
+		region_data = [region.build({position: meshes[i] for position, meshes in subchunk_meshes})
+			for i, region in enumerate(self.get_regions())]
+
+		self.allocate_storage(sum(region.get_capacity() for region in self.get_regions()))
+
+		for base, data in zip(self.get_region_bases(), region_data):
+			self.send_mesh_data_to_gpu(base, data)
+
+	def allocate_storage(self, size):
+		# the storage is sized to the laid out regions, which already have room for the meshes to grow
+		self.storage_size = size
+
+		if self.world.arena:
+			if self.arena_start is not None:
+				self.world.arena.free(self.arena_start, self.arena_size)
+
+			self.arena_start = self.world.arena.allocate(size) if size else None
+			self.arena_size = size
+			return
 
 		gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
 		gl.glBufferData(gl.GL_ARRAY_BUFFER, # Orphaning
-			ctypes.sizeof(gl.GLfloat * CHUNK_WIDTH * CHUNK_HEIGHT * CHUNK_LENGTH * 7), 
-			None, 
+			size * vertex_format.QUAD_SIZE,
+			None,
 			gl.GL_DYNAMIC_DRAW
 		)
+	
+	def send_mesh_data_to_gpu(self, start, mesh): # pass mesh data to gpu, from the given quad on
+		if not mesh:
+			return
+
+		if self.world.arena:
+			self.world.arena.upload(self.arena_start + start, (mesh,))
+			return
+
+		# the ctypes arrays passed to OpenGL are views of the meshes, not copies
+
+		gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
 		gl.glBufferSubData(
 			gl.GL_ARRAY_BUFFER,
-			0,
-			ctypes.sizeof(gl.GLfloat * len(self.mesh)),
-			(gl.GLfloat * len(self.mesh)) (*self.mesh)
-		)
-		gl.glBufferSubData(
-			gl.GL_ARRAY_BUFFER,
-			ctypes.sizeof(gl.GLfloat * len(self.mesh)),
-			ctypes.sizeof(gl.GLfloat * len(self.translucent_mesh)),
-			(gl.GLfloat * len(self.translucent_mesh)) (*self.translucent_mesh)
+			start * vertex_format.QUAD_SIZE,
+			ctypes.sizeof(gl.GLuint * len(mesh)),
+			(gl.GLuint * len(mesh)).from_buffer(mesh)
 		)
 
-		if not self.world.options.INDIRECT_RENDERING:
+	def sort_translucent_quads(self, camera_position):
+		self.quad_sorter.sort(np.array(camera_position) - self.position)
+		self.upload_translucent_indices()
+
+	def upload_translucent_indices(self):
+		# the geometry arena uploads the indices of all visible chunks at once instead (see 'arena.py')
+		if self.world.arena:
 			return
-		
-		self.draw_commands = [
-			# Index Count                    Instance Count  Base Index     Base Vertex               Base Instance
-			self.mesh_quad_count        * 6,       1,            0,              0,                        0,     # Opaque mesh commands
-			self.translucent_quad_count * 6,       1,            0,      self.mesh_quad_count * 4,         0      # Translucent mesh commands
-		]
 
-		gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, self.indirect_command_buffer)
-		gl.glBufferSubData(
-			gl.GL_DRAW_INDIRECT_BUFFER,
-			0,
-			ctypes.sizeof(gl.GLuint * len(self.draw_commands)),
-			(gl.GLuint * len(self.draw_commands)) (*self.draw_commands)
-		)
+		indices = self.quad_sorter.indices
 
-	def draw_direct(self, mode):
-		if not self.mesh_quad_count:
+		gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, self.translucent_ibo)
+		gl.glBufferData(gl.GL_COPY_WRITE_BUFFER, indices.nbytes, indices.ctypes.data, gl.GL_DYNAMIC_DRAW)
+
+	def get_translucent_vao(self):
+		return self.translucent_vao if self.quad_sorter else self.vao
+
+	def update_draw_commands(self):
+		if self.world.arena:
 			return
-		gl.glBindVertexArray(self.vao)
-		gl.glUniform2i(self.shader_chunk_offset_location, self.chunk_position[0], self.chunk_position[2])
-		gl.glDrawElements(
-			mode,
-			self.mesh_quad_count * 6,
-			gl.GL_UNSIGNED_INT,
-			None,
-		)
 
-	def draw_indirect(self, mode):
-		if not self.mesh_quad_count:
+		if not self.world.options.INDIRECT_RENDERING:
+			# all opaque ranges are drawn at once, and so are all translucent ranges (see 'draw_direct')
+			self.draw_arrays = get_multi_draw_arrays(self.draw_ranges)
+			self.translucent_draw_arrays = get_multi_draw_arrays(self.translucent_draw_ranges)
 			return
 
-		gl.glBindVertexArray(self.vao)
-		gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, self.indirect_command_buffer)
-		gl.glUniform2i(self.shader_chunk_offset_location, self.chunk_position[0], self.chunk_position[2])
+		# opaque mesh commands come first, then translucent ones
 
-		gl.glDrawElementsIndirect(
-			mode,
-			gl.GL_UNSIGNED_INT,
-			None,
+		self.draw_commands = arena.get_draw_commands(np.concatenate((self.draw_ranges, self.translucent_draw_ranges)))
+
+		gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, self.indirect_command_buffer)
+		gl.glBufferData(
+			gl.GL_DRAW_INDIRECT_BUFFER,
+			self.draw_commands.nbytes,
+			self.draw_commands.ctypes.data,
+			gl.GL_DYNAMIC_DRAW
 		)
 
-	def draw_direct_advanced(self, mode):
-		if not self.mesh_quad_count:
+	def draw_direct(self, mode):
+		if not len(self.draw_ranges):
 			return
-
 		gl.glBindVertexArray(self.vao)
-		gl.glUniform2i(self.shader_chunk_offset_location, self.chunk_position[0], self.chunk_position[2])
-
-		gl.glBeginQuery(gl.GL_ANY_SAMPLES_PASSED, self.occlusion_query)
-		gl.glDrawElements(
-			mode,
-			self.mesh_quad_count * 6,
-			gl.GL_UNSIGNED_INT,
-			None,
-		)
-		gl.glEndQuery(gl.GL_ANY_SAMPLES_PASSED)
+		gl.glVertexAttribI2i(1, self.chunk_position[0], self.chunk_position[2])
 
-		
-		gl.glBeginConditionalRender(self.occlusion_query, gl.GL_QUERY_BY_REGION_WAIT)
-		gl.glDrawElements(
-			mode,
-			self.mesh_quad_count * 6,
-			gl.GL_UNSIGNED_INT,
-			None,
-		)
-		gl.glEndConditionalRender()
+		counts, indices, base_vertices = self.draw_arrays
+		gl.glMultiDrawElementsBaseVertex(mode, counts, gl.GL_UNSIGNED_INT, indices, len(self.draw_ranges), base_vertices)
 
-	def draw_indirect_advanced(self, mode):
-		if not self.mesh_quad_count:
+	def draw_indirect(self, mode):
+		if not len(self.draw_ranges):
 			return
 
 		gl.glBindVertexArray(self.vao)
 		gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, self.indirect_command_buffer)
-		gl.glUniform2i(self.shader_chunk_offset_location, self.chunk_position[0], self.chunk_position[2])
+		gl.glVertexAttribI2i(1, self.chunk_position[0], self.chunk_position[2])
 
-		gl.glBeginQuery(gl.GL_ANY_SAMPLES_PASSED, self.occlusion_query)
-		gl.glDrawElementsIndirect(
-			mode,
-			gl.GL_UNSIGNED_INT,
-			None,
-		)
-		gl.glEndQuery(gl.GL_ANY_SAMPLES_PASSED)
+		gl.glMultiDrawElementsIndirect(mode, gl.GL_UNSIGNED_INT, None, len(self.draw_ranges), 0)
 
-		
-		gl.glBeginConditionalRender(self.occlusion_query, gl.GL_QUERY_BY_REGION_WAIT)
-		gl.glDrawElementsIndirect(
-			mode,
-			gl.GL_UNSIGNED_INT,
-			None,
-		)
-		gl.glEndConditionalRender()
-
-	draw_normal = draw_indirect if options.INDIRECT_RENDERING else draw_direct
-	draw_advanced = draw_indirect_advanced if options.INDIRECT_RENDERING else draw_direct_advanced
-	draw = draw_advanced if options.ADVANCED_OPENGL else draw_normal
+	draw = draw_indirect if options.INDIRECT_RENDERING else draw_direct
 
 	def draw_translucent_direct(self, mode):
-		if not self.mesh_quad_count:
+		if not self.translucent_draw_quad_count:
 			return
 		
-		gl.glBindVertexArray(self.vao)
-		gl.glUniform2i(self.shader_chunk_offset_location, self.chunk_position[0], self.chunk_position[2])
+		gl.glBindVertexArray(self.get_translucent_vao())
+		gl.glVertexAttribI2i(1, self.chunk_position[0], self.chunk_position[2])
 
-		gl.glDrawElementsBaseVertex(
-			mode,
-			self.translucent_quad_count * 6,
-			gl.GL_UNSIGNED_INT,
-			None,
-			self.mesh_quad_count * 4
-		)
+		counts, indices, base_vertices = self.translucent_draw_arrays
+		gl.glMultiDrawElementsBaseVertex(mode, counts, gl.GL_UNSIGNED_INT, indices, len(self.translucent_draw_ranges), base_vertices)
 
 	def draw_translucent_indirect(self, mode):
-		if not self.translucent_quad_count:
+		if not self.translucent_draw_quad_count:
 			return
 		
-		gl.glBindVertexArray(self.vao)
+		gl.glBindVertexArray(self.get_translucent_vao())
 		gl.glBindBuffer(gl.GL_DRAW_INDIRECT_BUFFER, self.indirect_command_buffer)
-		gl.glUniform2i(self.shader_chunk_offset_location, self.chunk_position[0], self.chunk_position[2])
+		gl.glVertexAttribI2i(1, self.chunk_position[0], self.chunk_position[2])
 
 		gl.glMemoryBarrier(gl.GL_COMMAND_BARRIER_BIT)
 
-		gl.glDrawElementsIndirect(
-			mode,
-			gl.GL_UNSIGNED_INT,
-			5 * ctypes.sizeof(gl.GLuint)  # offset pointer to the indirect command buffer pointing to the translucent mesh commands
-		)
+		# the translucent commands come right after the opaque ones
+		gl.glMultiDrawElementsIndirect(mode, gl.GL_UNSIGNED_INT,
+			len(self.draw_ranges) * COMMAND_WORDS * ctypes.sizeof(gl.GLuint), len(self.translucent_draw_ranges), 0)
 
 	draw_translucent = draw_translucent_indirect if options.INDIRECT_RENDERING else draw_translucent_direct
 		
@@ -0,0 +1,260 @@
+from collections import deque
+import itertools
+
+import numpy as np
+
+import chunk
+import section_graph
+import util
+import vertex_format
+
+SECTION_COUNT = chunk.SECTION_COUNT
+CHUNK_SIZE = np.array((chunk.CHUNK_WIDTH, chunk.CHUNK_HEIGHT, chunk.CHUNK_LENGTH))
+CHUNK_EXTENT = CHUNK_SIZE / 2 # half the size of the bounding box of a chunk
+SECTION_EXTENT = np.array((chunk.CHUNK_WIDTH, chunk.SECTION_HEIGHT, chunk.CHUNK_LENGTH)) / 2
+
+# centers of the bounding boxes of the sections of a chunk, relative to the center of its own
+
+SECTION_OFFSETS = np.array([(0, (section + 0.5) * chunk.SECTION_HEIGHT - chunk.CHUNK_HEIGHT / 2, 0)
+	for section in range(SECTION_COUNT)])
+
+SECTION_BITS = 1 << np.arange(SECTION_COUNT)
+
+WALK_STEP = 512 # sections a walk which can wait goes through each frame (see 'Chunk_ring.update')
+BUCKET_MARGIN = 1 # in blocks, face buckets keep being drawn a bit past where they stop facing the camera
+
+FACE_DIRECTIONS = tuple(tuple(direction) for direction in util.DIRECTIONS) # in the same order as the faces of sections
+
+def get_frustum_planes(matrix):
+	"""Left, right, bottom, top, near & far planes of the frustum of a modelviewprojection matrix,
+	as rows of a normal pointing inside and a distance from the origin"""
+
+	rows = np.array(matrix, dtype = np.float64)
+
+	planes = np.array((
+		rows[3] + rows[0], rows[3] - rows[0],
+		rows[3] + rows[1], rows[3] - rows[1],
+		rows[3] + rows[2], rows[3] - rows[2]))
+
+	return planes / np.linalg.norm(planes[:, :3], axis = 1)[:, np.newaxis]
+
+def test_boxes(planes, centers, extent):
+	"""Tests many axis-aligned boxes of the same size against the frustum at once
+	Returns whether each box is at least partly inside the frustum, and whether it's fully inside it
+	A box is outside as soon as its corner furthest along the normal of a plane is behind it,
+	which is the same as testing its 8 corners, but only takes one dot product per plane"""
+
+	distances = centers @ planes[:, :3].T + planes[:, 3]
+	radii = np.abs(planes[:, :3]) @ extent
+
+	return (distances >= -radii).all(axis = 1), (distances >= radii).all(axis = 1)
+
+def cull_chunks(planes, positions, refine_sections, reachable_sections = None):
+	"""Which chunks are at least partly in the frustum, out of an (N, 3) array of chunk positions
+	Returns their indices, in order, and a mask of their 16-high sections which are in the frustum
+	Chunks partly in the frustum only get their sections tested if 'refine_sections' is set, all sections are visible otherwise
+	If given, 'reachable_sections' are section masks of each chunk, and only those sections are kept (see 'Chunk_ring.walk_sections')"""
+
+	centers = positions * CHUNK_SIZE + CHUNK_EXTENT
+	inside, fully_inside = test_boxes(planes, centers, CHUNK_EXTENT)
+
+	indices = np.flatnonzero(inside)
+	section_masks = np.full(len(indices), chunk.ALL_SECTIONS)
+
+	if refine_sections:
+		partial = np.flatnonzero(~fully_inside[inside])
+		section_centers = centers[inside][partial][:, np.newaxis] + SECTION_OFFSETS
+		sections_inside, _ = test_boxes(planes, section_centers.reshape(-1, 3), SECTION_EXTENT)
+
+		section_masks[partial] = sections_inside.reshape(-1, SECTION_COUNT) @ SECTION_BITS
+
+	if reachable_sections is not None:
+		section_masks &= reachable_sections[indices]
+
+	# the box of a chunk can touch the frustum without any of its sections doing so
+	visible = section_masks != 0
+	return indices[visible], section_masks[visible]
+
+def get_bucket_masks(positions, camera_position):
+	"""Sections of each chunk for which each of its face buckets is drawn (see 'vertex_format'), out of an (N, 3) array of chunk positions
+	A face can only face the camera if the camera is in front of its plane: from outside the span of a chunk along an axis,
+	only one of the two buckets along that axis can, and faces facing up or down only can in the sections below or above the camera"""
+
+	camera = np.array(camera_position)
+	starts = positions * CHUNK_SIZE - BUCKET_MARGIN
+	ends = starts + CHUNK_SIZE + 2 * BUCKET_MARGIN
+
+	masks = np.full((len(positions), vertex_format.FACE_BUCKET_COUNT), chunk.ALL_SECTIONS)
+
+	for axis in (0, 2):
+		masks[:, axis * 2] *= camera[axis] > starts[:, axis]
+		masks[:, axis * 2 + 1] *= camera[axis] < ends[:, axis]
+
+	section_starts = starts[:, 1, np.newaxis] + np.arange(SECTION_COUNT) * chunk.SECTION_HEIGHT
+
+	masks[:, 2] = (camera[1] > section_starts) @ SECTION_BITS
+	masks[:, 3] = (camera[1] < section_starts + chunk.SECTION_HEIGHT + 2 * BUCKET_MARGIN) @ SECTION_BITS
+
+	return masks
+
+class Chunk_ring:
+	"""Loaded chunks within render distance of the player, nearest first, and their positions as an array to cull them at once
+	It's only worked out again when the player enters another chunk or when chunks get loaded or unloaded,
+	so that each frame only has to go through it to cull it
+	With cave culling, it also holds the sections which can be seen from the section of the camera (see 'walk_sections')"""
+
+	def __init__(self, world):
+		self.world = world
+
+		self.center = None
+		self.outdated = True
+
+		self.chunks = []
+		self.positions = np.zeros((0, 3), dtype = np.int32)
+		self.neighbours = [] # indices of the chunks next to each chunk of the ring, for each face, or None
+
+		self.camera_section = None
+		self.sections_outdated = True
+		self.walk = None # walk in progress, spread over frames (see 'update')
+		self.reachable_sections = None # section mask of each chunk, None if every section is
+		self.reachable_section_count = 0
+
+	def invalidate(self):
+		# chunks were loaded or unloaded
+		self.outdated = True
+
+	def invalidate_sections(self):
+		# the connections of some sections changed
+		self.sections_outdated = True
+
+	def update(self, center, camera_section):
+		"""Builds the ring again if needed, and walks through its sections again with cave culling
+		When the camera enters another section, what can be seen changes right away, so the walk is done at once
+		When chunks are loaded or their connections change, the sections reached before are kept until a new walk is done,
+		which goes through WALK_STEP sections each frame, and takes in all the changes made before it starts,
+		so that streaming chunks in doesn't redo the whole walk in one frame for each of them"""
+
+		center = tuple(center)
+
+		if center != self.center or self.outdated:
+			self.build(center)
+
+		if not self.world.options.CAVE_CULLING:
+			return
+
+		if camera_section != self.camera_section:
+			self.camera_section = camera_section
+			self.sections_outdated = False
+			self.walk = self.walk_sections()
+			self.continue_walk()
+
+		elif self.walk is not None:
+			self.continue_walk(1)
+
+		elif self.sections_outdated:
+			self.sections_outdated = False
+			self.walk = self.walk_sections()
+			self.continue_walk(1)
+
+	def continue_walk(self, steps = None):
+		# goes through 'steps' more steps of the walk in progress, or through all of it
+
+		for _ in itertools.islice(self.walk, steps):
+			pass
+
+	def build(self, center):
+		self.center = center
+		self.outdated = False
+		self.sections_outdated = True
+		self.walk = None # it walks through the old ring
+
+		# sections reached in the old ring, until a walk through the new one is done
+		# chunks which weren't in it have all their sections drawn, so that none go missing in the meantime
+
+		old_reachable = None
+
+		if self.reachable_sections is not None:
+			old_reachable = dict(zip(map(id, self.chunks), self.reachable_sections.tolist()))
+
+		# squared distances are whole numbers which sort the same way as distances do
+
+		cx, cy, cz = center
+		distance_squared = self.world.options.RENDER_DISTANCE ** 2
+		ring = []
+
+		for (x, y, z), ring_chunk in self.world.chunks.items():
+			key = (x - cx) ** 2 + (y - cy) ** 2 + (z - cz) ** 2
+
+			if key <= distance_squared:
+				ring.append((key, ring_chunk))
+
+		ring.sort(key = lambda item: item[0])
+
+		self.chunks = [ring_chunk for key, ring_chunk in ring]
+		self.positions = np.array([tuple(ring_chunk.chunk_position) for ring_chunk in self.chunks], dtype = np.int32).reshape(-1, 3)
+
+		self.indices = {position: i for i, position in enumerate(map(tuple, self.positions.tolist()))}
+
+		self.neighbours = [tuple(self.indices.get((x + dx, y + dy, z + dz)) for dx, dy, dz in FACE_DIRECTIONS)
+			for x, y, z in self.indices]
+
+		if old_reachable is not None:
+			self.reachable_sections = np.array([old_reachable.get(id(ring_chunk), chunk.ALL_SECTIONS) for ring_chunk in self.chunks], dtype = np.int64)
+
+	def walk_sections(self):
+		"""Breadth-first walk through the sections of the ring, from the section of the camera, like Minecraft's cave culling
+		A section is only left through a face which can be seen from the one the walk came in through,
+		and never in the opposite direction of one the walk went in before, so that it only moves away from the camera
+		Sections it doesn't get to are hidden behind opaque blocks, and don't need to be drawn
+		It's a generator which yields every WALK_STEP sections, and only swaps its result in once it's done"""
+
+		camera_chunk, section = self.camera_section
+		start = self.indices.get(tuple(camera_chunk))
+
+		if start is None:
+			# the camera is above or below the world, or in a chunk which isn't loaded yet
+			self.reachable_sections = None
+			self.walk = None
+			return
+
+		reachable = [0] * len(self.chunks)
+		reachable[start] = 1 << section
+
+		# sections to walk from, with the faces which can be seen from where the walk came in, and the directions it went in
+
+		queue = deque(((start, section, section_graph.ALL_FACES, 0),))
+		steps = 0
+
+		while queue:
+			steps += 1
+
+			if steps % WALK_STEP == 0:
+				yield
+
+			i, section, faces, directions = queue.popleft()
+			neighbours = self.neighbours[i]
+
+			for face in section_graph.MASK_FACES[faces & ~section_graph.OPPOSITE_MASKS[directions]]:
+				j, next_section = i, section
+
+				if face == section_graph.UP:
+					next_section += 1
+				elif face == section_graph.DOWN:
+					next_section -= 1
+
+				if next_section == section or not 0 <= next_section < SECTION_COUNT:
+					j = neighbours[face]
+					next_section %= SECTION_COUNT
+
+				if j is None or reachable[j] >> next_section & 1:
+					continue
+
+				reachable[j] |= 1 << next_section
+				connections = self.chunks[j].section_connections[next_section]
+
+				queue.append((j, next_section,
+					section_graph.get_connected_faces(connections, section_graph.OPPOSITE_FACES[face]), directions | 1 << face))
+
+		self.reachable_sections = np.array(reachable, dtype = np.int64)
+		self.reachable_section_count = sum(bin(mask).count("1") for mask in reachable)
+		self.walk = None
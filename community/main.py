@@ -1,5 +1,4 @@
 import platform
-import ctypes
 import logging
 import random
 import time
@@ -18,6 +17,9 @@ import player
 import texture_manager
 
 import world
+import chunk
+import streaming
+import vertex_format
 
 import options
 import time
@@ -31,13 +33,21 @@ class InternalConfig:
 		self.RENDER_DISTANCE = options.RENDER_DISTANCE
 		self.FOV = options.FOV
 		self.INDIRECT_RENDERING = options.INDIRECT_RENDERING
+		self.GEOMETRY_ARENA = options.GEOMETRY_ARENA
 		self.ADVANCED_OPENGL = options.ADVANCED_OPENGL
+		self.SECTION_CULLING = options.SECTION_CULLING
+		self.CAVE_CULLING = options.CAVE_CULLING
+		self.PALETTE_STORAGE = options.PALETTE_STORAGE
 		self.CHUNK_UPDATES = options.CHUNK_UPDATES
+		self.MESHER = options.MESHER
+		self.GREEDY_MESHING = options.GREEDY_MESHING
+		self.MESHING_PROCESSES = options.MESHING_PROCESSES
 		self.VSYNC = options.VSYNC
 		self.MAX_CPU_AHEAD_FRAMES = options.MAX_CPU_AHEAD_FRAMES
 		self.SMOOTH_FPS = options.SMOOTH_FPS
 		self.SMOOTH_LIGHTING = options.SMOOTH_LIGHTING
 		self.FANCY_TRANSLUCENCY = options.FANCY_TRANSLUCENCY
+		self.TRANSLUCENT_SORTING = options.TRANSLUCENT_SORTING
 		self.MIPMAP_TYPE = options.MIPMAP_TYPE
 		self.COLORED_LIGHTING = options.COLORED_LIGHTING
 		self.ANTIALIASING = options.ANTIALIASING
@@ -50,10 +60,15 @@ class Window(pyglet.window.Window):
 		# Options
 		self.options = InternalConfig(options)
 
-		if self.options.INDIRECT_RENDERING and not gl.gl_info.have_version(4, 2):
+		if self.options.INDIRECT_RENDERING and not gl.gl_info.have_version(4, 3):
 			raise RuntimeError("""Indirect Rendering is not supported on your hardware
-			This feature is only supported on OpenGL 4.2+, but your driver doesnt seem to support it, 
+			This feature is only supported on OpenGL 4.3+, but your driver doesnt seem to support it, 
 			Please disable "INDIRECT_RENDERING" in options.py""")
+
+		if self.options.GEOMETRY_ARENA and not gl.gl_info.have_version(4, 3):
+			raise RuntimeError("""The geometry arena is not supported on your hardware
+			This feature is only supported on OpenGL 4.3+, but your driver doesnt seem to support it, 
+			Please disable "GEOMETRY_ARENA" in options.py""")
 	
 		# F3 Debug Screen
 
@@ -158,6 +173,8 @@ Display: {gl.gl_info.get_renderer()}
 	def on_close(self):
 		logging.info("Deleting media player")
 		self.media_player.delete()
+		self.world.delete()
+
 		for fence in self.fences:
 			gl.glDeleteSync(fence)
 
@@ -171,11 +188,22 @@ Display: {gl.gl_info.get_renderer()}
 		chunk_count = len(self.world.chunks)
 		visible_chunk_count = len(self.world.visible_chunks)
 		quad_count = sum(chunk.mesh_quad_count for chunk in self.world.chunks.values())
+		face_count = sum(chunk.mesh_face_count for chunk in self.world.chunks.values())
 		visible_quad_count = sum(chunk.mesh_quad_count for chunk in self.world.visible_chunks)
+		if self.world.arena:
+			arena_used, arena_size = self.world.arena.get_memory_usage()
+			buffer_info = (f"Geometry Arena {round(arena_used / 1048576, 3)} / {round(arena_size / 1048576, 3)} MiB, "
+				f"{self.world.arena.allocator.allocation_count} ranges, {len(self.world.arena.allocator.free_sizes)} free, "
+				f"{self.world.arena.draw_count} + {self.world.arena.translucent_draw_count} draws")
+		else:
+			buffer_info = chunk_count
+
+		vertex_memory, allocated_vertex_memory = self.world.get_vertex_memory_usage()
+		block_memory = sum(chunk.blocks.get_memory_usage() for chunk in self.world.chunks.values())
 		self.f3.text = \
 f"""
 {round(1 / delta_time)} FPS ({self.world.chunk_update_counter} Chunk Updates) {"inf" if not self.options.VSYNC else "vsync"}{"ao" if self.options.SMOOTH_LIGHTING else ""}
-C: {visible_chunk_count} / {chunk_count} pC: {self.world.pending_chunk_update_count} pU: {len(self.world.chunk_building_queue)} aB: {chunk_count}
+C: {visible_chunk_count} / {chunk_count} pC: {self.world.pending_chunk_update_count} pU: {len(self.world.chunk_building_queue)} aB: {chunk_count}{f" pM: {self.world.mesher_pool.get_pending_count()}" if self.world.mesher_pool else ""}
 Client Singleplayer @{round(delta_time * 1000)} ms tick {round(1 / delta_time)} TPS
 
 XYZ: ( X: {round(self.player.position[0], 3)} / Y: {round(self.player.position[1], 3)} / Z: {round(self.player.position[2], 3)} )
@@ -185,10 +213,18 @@ Light: {max(self.world.get_light(self.player.rounded_position), self.world.get_s
 
 {self.system_info}
 
-Renderer: {"OpenGL 3.3 VAOs" if not self.options.INDIRECT_RENDERING else "OpenGL 4.0 VAOs Indirect"} {"Conditional" if self.options.ADVANCED_OPENGL else ""}
-Buffers: {chunk_count}
-Vertex Data: {round(quad_count * 28 * ctypes.sizeof(gl.GLfloat) / 1048576, 3)} MiB ({quad_count} Quads)
+Renderer: {"OpenGL 4.3 Multi-Draw Indirect" if self.options.GEOMETRY_ARENA else "OpenGL 3.3 VAOs" if not self.options.INDIRECT_RENDERING else "OpenGL 4.3 VAOs Multi-Draw Indirect"} {"Occlusion Queries" if self.options.ADVANCED_OPENGL else ""}
+Buffers: {buffer_info}
+Streaming: {len(self.world.chunk_streamer.load_queue)} chunks queued, {len(self.world.chunk_streamer.pending_reads)} reading (RD {self.options.RENDER_DISTANCE}, unload past {self.options.RENDER_DISTANCE + streaming.UNLOAD_MARGIN})
+Block Storage: {"Palette" if self.options.PALETTE_STORAGE else "Flat"} {round(block_memory / 1048576, 3)} MiB ({round(block_memory / chunk_count / 1024, 1) if chunk_count else 0} KiB/chunk)
+Vertex Data: {round(quad_count * vertex_format.QUAD_SIZE / 1048576, 3)} MiB ({quad_count} Quads, {vertex_format.VERTEX_SIZE} bytes/vertex)
+GPU Memory: {round(vertex_memory / 1048576, 3)} / {round(allocated_vertex_memory / 1048576, 3)} MiB vertices ({round(100 * vertex_memory / allocated_vertex_memory) if allocated_vertex_memory else 100}% used), {round(self.world.index_buffer_size / 1048576, 3)} MiB indices
 Visible Quads: {visible_quad_count}
+Culling: {round(self.world.culling_time * 1000, 3)} ms ({visible_chunk_count} / {len(self.world.chunk_ring.chunks)} chunks{f", {self.world.visible_section_count} / {visible_chunk_count * chunk.SECTION_COUNT} sections" if self.options.SECTION_CULLING or self.options.CAVE_CULLING else ""})
+Occlusion Culling: {f"{len(self.world.occlusion_culler.occluded_chunks)} chunks occluded, {self.world.occlusion_culler.saved_draw_count} draws saved, {self.world.occlusion_culler.query_count} queries issued, {len(self.world.occlusion_culler.pending_queries)} pending" if self.world.occlusion_culler else "Off"}
+Cave Culling: {"Off" if not self.options.CAVE_CULLING else "Camera outside the world" if self.world.chunk_ring.reachable_sections is None else f"{self.world.chunk_ring.reachable_section_count} / {len(self.world.chunk_ring.chunks) * chunk.SECTION_COUNT} sections reachable"}
+Translucent Sorting: {f"{self.world.translucent_sort_count} chunks sorted" if self.options.TRANSLUCENT_SORTING else "Off"}
+Greedy Meshing: {"On" if self.options.GREEDY_MESHING and self.options.MESHER == "numpy" else "Off"} {face_count} Faces -> {quad_count} Quads ({round(face_count / quad_count, 2) if quad_count else 1}:1)
 Buffer Uploading: Direct (glBufferSubData)
 """
 
@@ -0,0 +1,112 @@
+import array
+
+import numpy as np
+
+import arena
+import vertex_format
+
+RANGE_SLACK = 4 # extra quads at the end of each subchunk range, so that most block edits don't need to move it
+BUCKET_RANGE_SLACK = 1 # same for the face bucket regions, as a subchunk has a range in each of them, and block edits only add a face or two to each
+REGION_SLACK = 8 # a region has 1 / REGION_SLACK more room than its ranges need, where ranges which overflow get moved
+SHRINK_RATIO = 2 # regions are laid out again once less than 1 / SHRINK_RATIO of them is used
+MIN_SHRINK_CAPACITY = 256 # in quads, smaller regions are never worth shrinking
+
+def get_padding(quad_count):
+	# zeroed quads, for the room left at the end of ranges
+	return array.array('I', bytes(quad_count * vertex_format.QUAD_SIZE))
+
+def merge_ranges(starts, counts):
+	"""Merges ranges of quads which follow each other, out of NumPy arrays of their starts & quad counts, in order
+	Returns an (N, 2) array of the start & quad count of the merged ranges"""
+
+	if not len(starts):
+		return np.zeros((0, 2), dtype = np.int64)
+
+	ends = starts + counts
+	breaks = np.flatnonzero(starts[1:] != ends[:-1]) + 1
+
+	merged_starts = starts[np.concatenate(((0,), breaks))]
+	merged_ends = ends[np.concatenate((breaks - 1, (len(starts) - 1,)))]
+
+	return np.stack((merged_starts, merged_ends - merged_starts), axis = 1)
+
+class Mesh_region:
+	"""Opaque or translucent part of the vertex storage of a chunk, in which each subchunk mesh has its own range of quads
+	When a subchunk gets updated, only its range needs to be uploaded again, unless it got too big for it and has to be moved
+	Only the quads used by the meshes are drawn, the slack at the end of each range is left out (see 'get_used_ranges')"""
+
+	def __init__(self, range_slack = RANGE_SLACK):
+		self.range_slack = range_slack
+		self.ranges = {} # subchunk position: (start, size) in quads
+		self.quad_counts = {} # subchunk position: quads of its range used by its mesh
+		self.allocator = arena.Allocator(0)
+
+	def build(self, meshes):
+		"""Lays out the given meshes one after the other, returning the data of the whole region
+		'meshes' maps subchunk positions to packed meshes"""
+
+		self.quad_counts = {position: len(mesh) // vertex_format.QUAD_WORDS for position, mesh in meshes.items() if mesh}
+		ranges = {position: quad_count + self.range_slack for position, quad_count in self.quad_counts.items()}
+		used = sum(ranges.values())
+
+		self.allocator = arena.Allocator(used + used // REGION_SLACK)
+		self.ranges = {position: (self.allocator.allocate(size), size) for position, size in ranges.items()}
+
+		data = array.array('I')
+
+		for position in ranges:
+			data.extend(meshes[position])
+			data.extend(get_padding(self.range_slack))
+
+		return data
+
+	def update(self, position, mesh):
+		"""Puts the new mesh of a subchunk in its range, moving it to a new range if it doesn't fit anymore
+		Returns the (start, data) pairs to upload, or None if there's no room left and the region needs to be built again"""
+
+		# the quads past the end of a mesh aren't drawn, so they don't need to be cleared
+
+		quad_count = len(mesh) // vertex_format.QUAD_WORDS
+		start, size = self.ranges.get(position, (None, 0))
+
+		if start is not None and 0 < quad_count <= size:
+			self.quad_counts[position] = quad_count
+			return [(start, mesh)]
+
+		if start is not None:
+			# the old range can now be reused by other meshes
+			self.allocator.free(start, size)
+			del self.ranges[position]
+			del self.quad_counts[position]
+
+		if not quad_count:
+			return []
+
+		size = quad_count + self.range_slack
+		start = self.allocator.allocate(size)
+
+		if start is None:
+			return None
+
+		self.ranges[position] = (start, size)
+		self.quad_counts[position] = quad_count
+		return [(start, mesh)]
+
+	def is_sparse(self):
+		# whether most of the region isn't used anymore, since meshes got smaller or moved
+		return self.allocator.capacity > MIN_SHRINK_CAPACITY and self.allocator.used * SHRINK_RATIO < self.allocator.capacity
+
+	def get_capacity(self):
+		return self.allocator.capacity
+
+	def get_draw_count(self):
+		# number of quads up to the end of the last range, which no draw goes past
+		return self.allocator.capacity - self.allocator.get_free_end()
+
+	def get_used_ranges(self):
+		# positions, starts & used quad counts of the ranges, in order, as NumPy arrays
+		positions = sorted(self.ranges, key = lambda position: self.ranges[position][0])
+
+		return (np.array(positions, dtype = np.int64).reshape(-1, 3),
+			np.array([self.ranges[position][0] for position in positions], dtype = np.int64),
+			np.array([self.quad_counts[position] for position in positions], dtype = np.int64))
@@ -0,0 +1,687 @@
+import array
+import functools
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+
+import glm
+import numpy as np
+
+import models.cube
+import subchunk
+from vertex_format import *
+from subchunk import SUBCHUNK_WIDTH, SUBCHUNK_HEIGHT, SUBCHUNK_LENGTH
+
+# subchunk meshes can be built out of a snapshot of the blocks & light of the subchunk, padded with one voxel on every side,
+# so that they can be built by other processes without any access to the world
+# snapshots are flat, layer by layer (Y, then X, then Z), like 'World.get_light_neighbourhood'
+
+SNAPSHOT_WIDTH = SUBCHUNK_WIDTH + 2
+SNAPSHOT_HEIGHT = SUBCHUNK_HEIGHT + 2
+SNAPSHOT_LENGTH = SUBCHUNK_LENGTH + 2
+
+def get_offset(position):
+	x, y, z = position
+	return (y * SNAPSHOT_WIDTH + x) * SNAPSHOT_LENGTH + z
+
+FACE_OFFSETS = tuple(get_offset(direction) for direction in subchunk.DIRECTIONS)
+
+# offsets of the blocks of a subchunk within its snapshot, in the order their faces are added to meshes (X, then Y, then Z)
+
+INNER_OFFSETS = [get_offset((x, y, z))
+	for x in range(1, SUBCHUNK_WIDTH + 1)
+	for y in range(1, SUBCHUNK_HEIGHT + 1)
+	for z in range(1, SUBCHUNK_LENGTH + 1)]
+
+# faces of each face mask, with the offsets of their neighbours
+
+MASK_FACES = [[(face, offset) for face, offset in enumerate(FACE_OFFSETS) if mask >> face & 1] for mask in range(1 << len(FACE_OFFSETS))]
+
+# offsets of the 8 voxels around the neighbouring voxel of each face, in the order 'Subchunk.get_neighbour_voxels' gives them
+
+NEIGHBOUR_OFFSETS = tuple(
+	tuple(get_offset(position) for position in subchunk.Subchunk.get_neighbour_voxels(None, glm.ivec3(0), face))
+	for face in range(len(FACE_OFFSETS)))
+
+def cut_snapshots(box):
+	"""Cuts the snapshot of each subchunk out of the snapshot of a box of a chunk around them, padded the same way
+	'box' is (blocks, light, local position of the box, size of the box, local positions of the subchunks)
+	Returns the (blocks, light, local position) snapshots of the subchunks"""
+
+	blocks, light, box_position, (width, height, length), local_positions = box
+	shape = (height + 2, width + 2, length + 2)
+
+	blocks = np.frombuffer(blocks, np.uint8).reshape(shape)
+	light = np.frombuffer(light, np.uint8).reshape(shape)
+
+	snapshots = []
+
+	for local_position in local_positions:
+		x, y, z = (i - j for i, j in zip(local_position, box_position))
+		window = (slice(y, y + SNAPSHOT_HEIGHT), slice(x, x + SNAPSHOT_WIDTH), slice(z, z + SNAPSHOT_LENGTH))
+		snapshots.append((blocks[window].tobytes(), light[window].tobytes(), local_position))
+
+	return snapshots
+
+def get_block_table(world):
+	# picklable subset of the block types, indexed by block number (None for air)
+	return [(block_type.is_cube, block_type.transparent, block_type.glass, block_type.model.translucent,
+			block_type.vertex_positions, block_type.face_templates, block_type.shading_values, number in world.light_blocks)
+		if block_type else None for number, block_type in enumerate(world.block_types)]
+
+def get_opaque_table(block_table):
+	# whether each of the 256 block numbers is opaque
+	return [bool(entry) and not entry[1] for entry in block_table] + [False] * (256 - len(block_table))
+
+def mesh_subchunk(block_table, opaque, blocks, light, local_position, smooth_lighting, voxels = None):
+	"""Builds the opaque and translucent meshes of a subchunk out of its snapshot
+	'opaque' is the opaque table of the block table (see 'get_opaque_table'), which meshers only build once
+	'voxels' optionally gives the (snapshot index, face mask) of the only voxels to go through, in the same order,
+	with the visible faces of cubes already worked out, one bit per face (see 'Bitmask_mesher')
+	Used by 'Subchunk.update_mesh', and by the other meshers which give out exactly the same vertices"""
+
+	mesh = array.array('I')
+	translucent_mesh = array.array('I')
+
+	local_x, local_y, local_z = local_position
+
+	def add_face(face, index, neighbour_index, entry, target):
+		is_cube, _, _, _, _, face_templates, shading_values, is_light = entry
+		t = face_templates[face]
+		offset = get_position_offset(*local_position_of(index))
+
+		if not smooth_lighting:
+			lights = (pack_raw_light(light[index if neighbour_index is None else neighbour_index]),) * 4
+
+		elif neighbour_index is None or is_light:
+			lights = (pack_raw_light(light[index]),) * 4
+
+		else:
+			neighbours = [neighbour_index + offset for offset in NEIGHBOUR_OFFSETS[face]]
+			raw_lights = [light[neighbour_index]] + [light[i] for i in neighbours]
+
+			block_lights = [raw_light & 0xF for raw_light in raw_lights]
+			sky_lights = [raw_light >> 4 for raw_light in raw_lights]
+
+			lights = [pack_light(*levels) for levels in zip(
+				subchunk.Subchunk.get_smooth_face_light(None, *block_lights),
+				subchunk.Subchunk.get_smooth_face_light(None, *sky_lights))]
+
+			if is_cube:
+				face_ao = subchunk.Subchunk.get_face_ao(None, *(opaque[blocks[i]] for i in neighbours))
+
+				shading = [pack_shading(ao * base_shading) for ao, base_shading in zip(face_ao, shading_values[face])]
+
+				# ambient occlusion darkens the base shading of the template
+				t = (
+					t[0], t[1] & FETCHER_MASK | shading[0],
+					t[2], t[3] & FETCHER_MASK | shading[1],
+					t[4], t[5] & FETCHER_MASK | shading[2],
+					t[6], t[7] & FETCHER_MASK | shading[3])
+
+		# move the template to the block and patch in its lighting
+
+		target.extend((
+			t[0] + offset, t[1] | lights[0],
+			t[2] + offset, t[3] | lights[1],
+			t[4] + offset, t[5] | lights[2],
+			t[6] + offset, t[7] | lights[3]))
+
+	def local_position_of(index):
+		y, xz = divmod(index, SNAPSHOT_WIDTH * SNAPSHOT_LENGTH)
+		x, z = divmod(xz, SNAPSHOT_LENGTH)
+		return local_x + x - 1, local_y + y - 1, local_z + z - 1
+
+	for index, face_mask in zip(INNER_OFFSETS, itertools.repeat(None)) if voxels is None else voxels:
+		number = blocks[index]
+
+		if not number:
+			continue
+
+		entry = block_table[number]
+		target = translucent_mesh if entry[3] else mesh
+
+		# if block is cube, we want it to check neighbouring blocks so that we don't uselessly render faces
+		# if block isn't a cube, we just want to render all faces, regardless of neighbouring blocks
+		# since the vast majority of blocks are probably anyway going to be cubes, this won't impact performance all that much; the amount of useless faces drawn is going to be minimal
+
+		if not entry[0]:
+			for face in range(len(entry[5])):
+				add_face(face, index, None, entry, target)
+
+			continue
+
+		if voxels is not None:
+			for face, offset in MASK_FACES[face_mask]:
+				add_face(face, index, index + offset, entry, target)
+
+			continue
+
+		for face, offset in enumerate(FACE_OFFSETS):
+			neighbour_number = blocks[index + offset]
+
+			if opaque[neighbour_number] or (entry[2] and neighbour_number == number):
+				continue
+
+			add_face(face, index, index + offset, entry, target)
+
+	return mesh, translucent_mesh
+
+# positions of the blocks of a subchunk within its snapshot, in the same order as 'INNER_OFFSETS'
+
+INNER_POSITIONS = np.array([(x, y, z)
+	for x in range(SUBCHUNK_WIDTH)
+	for y in range(SUBCHUNK_HEIGHT)
+	for z in range(SUBCHUNK_LENGTH)])
+
+INNER_INDICES = np.array(INNER_OFFSETS)
+
+# indices into (neighbour voxel, 8 voxels around it) of the 4 light levels averaged for each vertex (see 'Subchunk.get_smooth_face_light')
+SMOOTH_LIGHT_INDICES = np.array([(0, 2, 4, 1), (0, 4, 7, 6), (0, 5, 7, 8), (0, 2, 5, 3)])
+
+# indices into the 8 voxels around the neighbour voxel of the side, side & corner voxels of each vertex (see 'Subchunk.get_face_ao')
+AO_INDICES = np.array([(1, 3, 0), (3, 6, 5), (4, 6, 7), (1, 4, 2)])
+
+# axes of each cube face, as (depth, U, V), U going from the 2nd to the 3rd vertex and V from the 2nd to the 1st (see 'texture_UV' in the vertex shaders)
+
+CUBE_VERTEX_POSITIONS = np.array(models.cube.vertex_positions).reshape(len(FACE_OFFSETS), 4, 3)
+
+FACE_AXES = np.array([
+	(3 - u - v, u, v) for u, v in (
+		(np.abs(face[2] - face[1]).argmax(), np.abs(face[0] - face[1]).argmax())
+		for face in CUBE_VERTEX_POSITIONS)])
+
+def get_array(vertices):
+	# meshes are handed out as arrays of packed vertices, whatever the mesher
+	# vertices are copied straight from the NumPy array, without going through an intermediate bytes object
+	mesh = array.array('I')
+	if len(vertices):
+		mesh.frombytes(memoryview(vertices).cast('B'))
+	return mesh
+
+def split_faces(meshes):
+	"""Splits the opaque mesh of each (mesh, translucent mesh, face count) into its face buckets (see 'vertex_format'),
+	working out the direction each quad faces out of the cross product of its first two edges, for all the meshes at once
+	Returns (face bucket meshes, translucent mesh, face count) for each of them"""
+
+	quad_counts = [len(mesh) // QUAD_WORDS for mesh, translucent_mesh, face_count in meshes]
+	vertices = np.frombuffer(b"".join(mesh for mesh, translucent_mesh, face_count in meshes), np.uint32).reshape(-1, 4, VERTEX_WORDS)
+
+	positions = unpack_positions(vertices[:, :3, 0])
+	normals = np.cross(positions[:, 1] - positions[:, 0], positions[:, 2] - positions[:, 0])
+
+	# quads along an axis face one way or the other along it, like 'util.DIRECTIONS'
+
+	axes = np.abs(normals).argmax(axis = 1)
+	aligned = (normals != 0).sum(axis = 1) == 1
+	buckets = np.where(aligned, axes * 2 + (normals[np.arange(len(normals)), axes] < 0), OTHER_FACES)
+
+	# sort the quads of each mesh by bucket, and split them back
+
+	quad_meshes = np.repeat(np.arange(len(meshes)), quad_counts)
+	keys = quad_meshes * FACE_BUCKET_COUNT + buckets
+	order = np.argsort(keys, kind = "stable")
+	vertices = vertices[order]
+
+	bounds = np.searchsorted(keys[order], np.arange(len(meshes) * FACE_BUCKET_COUNT + 1))
+	face_meshes = [get_array(vertices[bounds[i]:bounds[i + 1]]) for i in range(len(meshes) * FACE_BUCKET_COUNT)]
+
+	return [(tuple(face_meshes[i * FACE_BUCKET_COUNT:(i + 1) * FACE_BUCKET_COUNT]), translucent_mesh, face_count)
+		for i, (mesh, translucent_mesh, face_count) in enumerate(meshes)]
+
+class Python_mesher:
+	"""Meshes subchunk snapshots one block at a time"""
+
+	def __init__(self, block_table, greedy_meshing = False):
+		self.block_table = block_table
+		self.opaque_table = get_opaque_table(block_table)
+		self.greedy_meshing = greedy_meshing # only supported by the NumPy mesher
+
+	def mesh(self, snapshots, smooth_lighting):
+		# list of (mesh, translucent mesh, opaque faces before greedy meshing) for each (blocks, light, local position) snapshot
+		return [(mesh, translucent_mesh, len(mesh) // QUAD_WORDS)
+			for mesh, translucent_mesh in (mesh_subchunk(self.block_table, self.opaque_table, blocks, light, local_position, smooth_lighting)
+				for blocks, light, local_position in snapshots)]
+
+	def mesh_face_buckets(self, snapshots, smooth_lighting):
+		# same, with the opaque meshes split into face buckets, which is what subchunks hold
+		return split_faces(self.mesh(snapshots, smooth_lighting))
+
+	def mesh_boxes(self, boxes, smooth_lighting):
+		# same, for the subchunks of each box snapshot in order (see 'cut_snapshots')
+		return self.mesh_face_buckets([snapshot for box in boxes for snapshot in cut_snapshots(box)], smooth_lighting)
+
+class Numpy_mesher(Python_mesher):
+	"""Meshes whole batches of subchunk snapshots at once with array operations
+	Only handles cubes: subchunks with any other model fall back to the Python mesher, so that the output stays exactly the same"""
+
+	def __init__(self, block_table, greedy_meshing = False):
+		super().__init__(block_table, greedy_meshing)
+
+		entries = block_table + [None] * (256 - len(block_table))
+		cubes = [entry if entry and entry[0] and len(entry[5]) == len(FACE_OFFSETS) else None for entry in entries]
+
+		self.non_cube = np.array([bool(entry) and not cube for entry, cube in zip(entries, cubes)])
+		self.opaque = np.array([bool(entry) and not entry[1] for entry in entries])
+		self.glass = np.array([bool(cube) and bool(cube[2]) for cube in cubes])
+		self.translucent = np.array([bool(cube) and bool(cube[3]) for cube in cubes])
+		self.is_light = np.array([bool(cube) and cube[7] for cube in cubes])
+		self.full_cube = np.array([bool(cube) and not cube[1] and cube[4] == models.cube.vertex_positions for cube in cubes])
+
+		no_cube = ([(0,) * QUAD_WORDS] * len(FACE_OFFSETS), [(0.0,) * 4] * len(FACE_OFFSETS))
+
+		self.face_templates = np.array([cube[5] if cube else no_cube[0] for cube in cubes], dtype = np.uint32).reshape(256, len(FACE_OFFSETS), 4, VERTEX_WORDS)
+		self.shading_values = np.array([cube[6] if cube else no_cube[1] for cube in cubes], dtype = np.float64)
+		self.block_shifts = np.array(BLOCK_SHIFTS, dtype = np.uint32)
+
+		self.face_offsets = np.array(FACE_OFFSETS)
+		self.neighbour_offsets = np.array(NEIGHBOUR_OFFSETS)
+
+	def mesh(self, snapshots, smooth_lighting):
+		if not snapshots:
+			return []
+
+		blocks = np.frombuffer(b"".join(blocks for blocks, light, local_position in snapshots), np.uint8).reshape(len(snapshots), -1)
+		inner_blocks = blocks[:, INNER_INDICES]
+
+		# subchunks with non-cube models are left to the Python mesher
+
+		fast = ~self.non_cube[inner_blocks].any(axis = 1)
+		meshes = [None] * len(snapshots)
+
+		for i in np.flatnonzero(~fast):
+			meshes[i] = super().mesh([snapshots[i]], smooth_lighting)[0]
+
+		fast_indices = np.flatnonzero(fast)
+		if not len(fast_indices):
+			return meshes
+
+		blocks = blocks[fast_indices]
+		inner_blocks = inner_blocks[fast_indices]
+		light = np.frombuffer(b"".join(snapshots[i][1] for i in fast_indices), np.uint8).reshape(len(fast_indices), -1)
+		local_positions = np.array([snapshots[i][2] for i in fast_indices])
+
+		# find the visible faces, by comparing each block with each of its neighbours
+		# nonzero gives them out subchunk by subchunk, in the same order as the Python mesher
+
+		numbers = inner_blocks[:, :, None]
+		neighbours = blocks[:, INNER_INDICES[:, None] + self.face_offsets]
+
+		visible = (numbers != 0) & ~self.opaque[neighbours] & ~(self.glass[numbers] & (neighbours == numbers))
+		subchunks, voxels, faces = np.nonzero(visible)
+
+		numbers = inner_blocks[subchunks, voxels]
+		voxel_indices = INNER_INDICES[voxels]
+		neighbour_indices = voxel_indices + self.face_offsets[faces]
+
+		# build the vertices of all the faces at once, out of the face templates of their block types
+
+		vertices = self.face_templates[numbers, faces]
+		vertices[:, :, 0] += ((local_positions[subchunks] + INNER_POSITIONS[voxels]).astype(np.uint32) << self.block_shifts).sum(axis = 1)[:, None]
+
+		if not smooth_lighting:
+			vertices[:, :, 1] |= pack_raw_light(light[subchunks, neighbour_indices][:, None].astype(np.uint32))
+
+		else:
+			around_indices = neighbour_indices[:, None] + self.neighbour_offsets[faces]
+			raw_lights = np.concatenate((light[subchunks, neighbour_indices][:, None], light[subchunks[:, None], around_indices]), axis = 1)
+
+			# ambient occlusion
+
+			around_opaque = self.opaque[blocks[subchunks[:, None], around_indices]][:, AO_INDICES].astype(np.int64)
+			side1, side2, corner = around_opaque[:, :, 0], around_opaque[:, :, 1], around_opaque[:, :, 2]
+			face_ao = np.where(side1 & side2, 0.25, 1 - (side1 + side2 + corner) / 4)
+
+			# light blocks aren't smoothed nor occluded, they just use their own light
+
+			is_light = self.is_light[numbers][:, None]
+			own_light = light[subchunks, voxel_indices][:, None].astype(np.uint32)
+
+			shading = self.shading_values[numbers, faces]
+			shading = np.where(is_light, shading, face_ao * shading)
+
+			lights = np.where(is_light, (own_light & 0xF) * 4, self.smooth(raw_lights & 0xF))
+			skylights = np.where(is_light, (own_light >> 4) * 4, self.smooth(raw_lights >> 4))
+
+			vertices[:, :, 1] = (vertices[:, :, 1] & FETCHER_MASK | np.rint(shading * 63).astype(np.uint32) << SHADING_SHIFT
+				| lights.astype(np.uint32) << LIGHT_SHIFT | skylights.astype(np.uint32) << SKYLIGHT_SHIFT)
+
+		translucent = self.translucent[numbers]
+		face_counts = np.bincount(subchunks[~translucent], minlength = len(fast_indices))
+
+		if self.greedy_meshing:
+			subchunks, vertices, translucent = self.merge_faces(subchunks, voxels, faces, numbers, vertices, translucent)
+
+		# split the faces back into the meshes of each subchunk
+
+		split_meshes = []
+
+		for mask in (~translucent, translucent):
+			mask_vertices = vertices[mask]
+			bounds = np.searchsorted(subchunks[mask], np.arange(len(fast_indices) + 1))
+			split_meshes.append([get_array(mask_vertices[bounds[i]:bounds[i + 1]]) for i in range(len(fast_indices))])
+
+		for subchunk_index, subchunk_mesh, translucent_mesh, face_count in zip(fast_indices, *split_meshes, face_counts):
+			meshes[subchunk_index] = (subchunk_mesh, translucent_mesh, int(face_count))
+
+		return meshes
+
+	def merge_faces(self, subchunks, voxels, faces, numbers, vertices, translucent):
+		"""Greedy meshing: merges neighbouring coplanar faces of opaque full cubes which look the same
+		Faces are first merged into rows along their U axis, and then rows of the same extent are merged along their V axis
+		Only faces with the same shading & light on all 4 vertices are merged, so that merged quads look exactly like the faces they replace"""
+
+		attributes = vertices[:, :, 1] >> SHADING_SHIFT # shading & light
+		mergeable = self.full_cube[numbers] & ~translucent & (attributes == attributes[:, :1]).all(axis = 1)
+
+		if not mergeable.any():
+			return subchunks, vertices, translucent
+
+		merge_subchunks = subchunks[mergeable]
+		merge_faces = faces[mergeable]
+		merge_vertices = vertices[mergeable]
+
+		keys = np.unique(np.column_stack((numbers[mergeable], attributes[mergeable, 0])), axis = 0, return_inverse = True)[1].reshape(-1)
+		depth, u, v = np.take_along_axis(INNER_POSITIONS[voxels[mergeable]], FACE_AXES[merge_faces], axis = 1).T
+
+		# merge faces into rows, and then rows into rectangles
+
+		row_starts, row_lengths = get_runs((merge_subchunks, merge_faces, keys, depth, v), u)
+		quad_starts, quad_heights = get_runs(tuple(group[row_starts] for group in (merge_subchunks, merge_faces, keys, depth, u)) + (row_lengths,), v[row_starts])
+
+		first_faces = row_starts[quad_starts]
+		quad_widths = row_lengths[quad_starts]
+
+		# stretch the first face of each quad over the whole quad
+
+		quad_faces = merge_faces[first_faces]
+		quad_vertices = merge_vertices[first_faces]
+
+		columns = np.arange(4)
+
+		for axis, extent in ((FACE_AXES[quad_faces, 1], quad_widths), (FACE_AXES[quad_faces, 2], quad_heights)):
+			far_side = CUBE_VERTEX_POSITIONS[quad_faces[:, None], columns, axis[:, None]] > 0
+			quad_vertices[:, :, 0] += (far_side * (extent - 1)[:, None]).astype(np.uint32) << self.block_shifts[axis][:, None]
+
+		quad_vertices[:, :, 1] += ((quad_heights - 1) * 16 + (quad_widths - 1) * 4).astype(np.uint32)[:, None]
+
+		# put the quads back with the rest of the faces, subchunk by subchunk
+
+		subchunks = np.concatenate((subchunks[~mergeable], merge_subchunks[first_faces]))
+		vertices = np.concatenate((vertices[~mergeable], quad_vertices))
+		translucent = np.concatenate((translucent[~mergeable], np.zeros(len(first_faces), bool)))
+
+		order = np.argsort(subchunks, kind = "stable")
+		return subchunks[order], vertices[order], translucent[order]
+
+	def smooth(self, levels):
+		# same as 'subchunk.smooth', for the 4 vertices of every face at once, but 4 times as big so that they stay integers
+		# voxels with no light take the lowest non-zero light level around them, so that light doesn't fade into opaque blocks
+
+		levels = levels[:, SMOOTH_LIGHT_INDICES]
+		lowest = np.minimum(levels[:, :, 0], np.where(levels[:, :, 1:] > 0, levels[:, :, 1:], 255).min(axis = 2))
+
+		return np.maximum(levels, lowest[:, :, None]).sum(axis = 2)
+
+def get_runs(groups, positions):
+	"""Finds runs of consecutive positions within groups of elements which have the same value in every one of 'groups'
+	Returns the indices of the first element of each run, with the lowest position, and the length of each run"""
+
+	order = np.lexsort((positions,) + groups[::-1])
+
+	continued = positions[order][1:] == positions[order][:-1] + 1
+	for group in groups:
+		continued &= group[order][1:] == group[order][:-1]
+
+	starts = np.concatenate(([True], ~continued))
+	return order[starts], np.diff(np.append(np.flatnonzero(starts), len(order)))
+
+# occupancy bitmasks of boxes, one integer per row of voxels along an axis, with a bit for each voxel of the row
+# rows are NumPy arrays, of 64-bit integers for short rows, and of Python integers for longer ones, such as the whole height of a chunk,
+# so that shifts & masks go through all the rows at once either way
+
+ROW_WORD_SIZE = 7 # bytes of the rows which fit in 64-bit integers, leaving the sign bit alone
+
+def get_rows(bits, axis):
+	# rows of a boolean array along the given axis, the first voxel of each row in its lowest bit
+	rows = np.packbits(np.moveaxis(bits, axis, -1), axis = -1, bitorder = "little")
+	row_size = rows.shape[-1]
+
+	if row_size <= ROW_WORD_SIZE:
+		words = np.zeros(rows.shape[:-1] + (8,), dtype = np.uint8)
+		words[..., :row_size] = rows
+		return words.view("<i8")[..., 0]
+
+	data = rows.tobytes()
+	return np.array([int.from_bytes(data[i:i + row_size], "little") for i in range(0, len(data), row_size)], dtype = object).reshape(rows.shape[:-1])
+
+def get_bits(rows, length, axis):
+	# boolean array out of its rows of the given length along the given axis, the other way around from 'get_rows'
+	row_size = (length + 7) // 8
+
+	if rows.dtype == object:
+		data = np.frombuffer(b"".join(row.to_bytes(row_size, "little") for row in rows.reshape(-1).tolist()), np.uint8)
+	else:
+		data = rows.astype("<i8").view(np.uint8).reshape(-1, 8)[:, :row_size]
+
+	bits = np.unpackbits(data.reshape(-1, row_size), axis = 1, count = length, bitorder = "little")
+	return np.moveaxis(bits.reshape(rows.shape + (length,)), -1, axis)
+
+OTHER_BLOCK = 1 << len(FACE_OFFSETS) # face mask bit of blocks which aren't cubes, whose faces are all drawn
+
+@functools.lru_cache()
+def get_box_offsets(box_width, box_length):
+	# offsets of the blocks of a subchunk within a box of the given padded width & length, in the same order as 'INNER_OFFSETS'
+	x, y, z = (INNER_POSITIONS + 1).T
+	return (y * box_width + x) * box_length + z
+
+class Bitmask_mesher(Python_mesher):
+	"""Finds the visible faces of cubes with shifts & masks over occupancy bitmasks, one integer per row of blocks along each axis,
+	instead of checking the 6 neighbours of each block one by one, and then builds them like the Python mesher
+	The bitmasks span the whole box of the chunk column each batch comes with (see 'Mesher_pool.get_box'),
+	so that each row is shared by all the subchunks it goes through, and boxes of the same size are gone through together"""
+
+	def __init__(self, block_table, greedy_meshing = False):
+		super().__init__(block_table, greedy_meshing)
+
+		entries = block_table + [None] * (256 - len(block_table))
+
+		self.cube = np.array([bool(entry) and bool(entry[0]) for entry in entries])
+		self.other = np.array([bool(entry) and not entry[0] for entry in entries])
+		self.opaque = np.array([bool(entry) and not entry[1] for entry in entries])
+		self.glass = np.array([bool(entry) and bool(entry[0]) and bool(entry[2]) for entry in entries])
+
+	def get_face_masks(self, blocks):
+		"""Visible faces of each voxel of an array of (Y, X, Z) boxes of block numbers, one bit per face, in the order of 'FACE_OFFSETS'
+		Along each axis, the faces a row of cubes shows towards the next voxels are 'cubes & ~(opaque >> 1)', and 'cubes & ~(opaque << 1)'
+		towards the previous ones, except between two of the same glass blocks, which have their own rows for each glass block type"""
+
+		face_masks = np.where(self.other[blocks], OTHER_BLOCK, 0).astype(np.uint8)
+		glass_numbers = np.unique(blocks[self.glass[blocks]]).tolist()
+
+		# faces towards +X & -X come first, then +Y & -Y, then +Z & -Z
+
+		for face, axis in ((0, -2), (2, -3), (4, -1)):
+			cubes = get_rows(self.cube[blocks], axis)
+			opaque = get_rows(self.opaque[blocks], axis)
+
+			forward = cubes & ~(opaque >> 1)
+			backward = cubes & ~(opaque << 1)
+
+			for number in glass_numbers:
+				glass = get_rows(blocks == number, axis)
+
+				forward &= ~(glass & glass >> 1)
+				backward &= ~(glass & glass << 1)
+
+			face_masks |= get_bits(forward, blocks.shape[axis], axis) << np.uint8(face)
+			face_masks |= get_bits(backward, blocks.shape[axis], axis) << np.uint8(face + 1)
+
+		return face_masks
+
+	def mesh_box(self, box, face_masks, smooth_lighting):
+		# (mesh, translucent mesh, face count) of each subchunk of a box snapshot (see 'cut_snapshots'), out of its face masks
+
+		_, _, box_position, _, local_positions = box
+		_, box_width, box_length = face_masks.shape
+
+		# face masks of the blocks of every subchunk, and the ones with anything to draw, in the order 'mesh_subchunk' goes through them
+
+		x, y, z = (np.array(local_positions) - box_position).T
+		masks = face_masks.reshape(-1)[((y * box_width + x) * box_length + z)[:, None] + get_box_offsets(box_width, box_length)]
+
+		subchunks, voxels = np.nonzero(masks)
+		bounds = np.searchsorted(subchunks, np.arange(len(local_positions) + 1)).tolist()
+
+		indices = INNER_INDICES[voxels].tolist()
+		masks = masks[subchunks, voxels].tolist()
+
+		meshes = []
+
+		for i, (blocks, light, local_position) in enumerate(cut_snapshots(box)):
+			start, end = bounds[i], bounds[i + 1]
+
+			mesh, translucent_mesh = mesh_subchunk(self.block_table, self.opaque_table, blocks, light, local_position, smooth_lighting,
+				zip(indices[start:end], masks[start:end]))
+
+			meshes.append((mesh, translucent_mesh, len(mesh) // QUAD_WORDS))
+
+		return meshes
+
+	def mesh_box_batch(self, boxes, smooth_lighting):
+		# meshes of the subchunks of each box, in order
+
+		face_masks = [None] * len(boxes)
+		sizes = {}
+
+		for i, box in enumerate(boxes):
+			sizes.setdefault(box[3], []).append(i)
+
+		for (width, height, length), indices in sizes.items():
+			blocks = np.frombuffer(b"".join(boxes[i][0] for i in indices), np.uint8).reshape(len(indices), height + 2, width + 2, length + 2)
+
+			for i, masks in zip(indices, self.get_face_masks(blocks)):
+				face_masks[i] = masks
+
+		return [meshes for box, masks in zip(boxes, face_masks) for meshes in self.mesh_box(box, masks, smooth_lighting)]
+
+	def mesh(self, snapshots, smooth_lighting):
+		# each snapshot is a box of its own
+		return self.mesh_box_batch([(blocks, light, local_position, (SUBCHUNK_WIDTH, SUBCHUNK_HEIGHT, SUBCHUNK_LENGTH), [local_position])
+			for blocks, light, local_position in snapshots], smooth_lighting)
+
+	def mesh_boxes(self, boxes, smooth_lighting):
+		return split_faces(self.mesh_box_batch(boxes, smooth_lighting))
+
+MESHERS = {
+	"python": Python_mesher,
+	"numpy": Numpy_mesher,
+	"bitmask": Bitmask_mesher,
+}
+
+# worker processes get their mesher once, when they start
+
+worker_mesher = None
+
+def init_worker(mesher_type, block_table, greedy_meshing):
+	global worker_mesher
+	worker_mesher = MESHERS[mesher_type](block_table, greedy_meshing)
+
+def mesh_boxes_worker(boxes, smooth_lighting):
+	return worker_mesher.mesh_boxes(boxes, smooth_lighting)
+
+def create_executor(processes, mesher_type, block_table, greedy_meshing = False):
+	# spawn rather than fork, as the main process has OpenGL state and other threads
+	return ProcessPoolExecutor(processes, multiprocessing.get_context("spawn"),
+		initializer = init_worker, initargs = (mesher_type, block_table, greedy_meshing))
+
+class Mesher_pool:
+	"""Builds subchunk meshes in worker processes, or in batches on the main thread if there are none
+	Each subchunk has a version which is bumped every time it is queued for an update,
+	meshes built from a snapshot older than the latest version are dropped"""
+
+	def __init__(self, world, processes):
+		self.world = world
+
+		if processes:
+			self.mesher = None
+			self.executor = create_executor(processes, self.world.options.MESHER, self.world.block_table, self.world.options.GREEDY_MESHING)
+		else:
+			self.mesher = MESHERS[self.world.options.MESHER](self.world.block_table, self.world.options.GREEDY_MESHING)
+			self.executor = None
+
+		# subchunks submitted during a tick are sent to the workers at once, as sending each of them separately costs more than meshing it
+		# the subchunks of each chunk are sent as a single snapshot of the box around them, which is much cheaper to take than one for each
+
+		self.batch = {} # chunk: [(subchunk, version), ...]
+		self.pending_batches = [] # ([(subchunk, version), ...], future)
+
+	def delete(self):
+		# waiting for the batches being meshed lets the executor close its pipes before the interpreter exits
+		if self.executor:
+			self.executor.shutdown(cancel_futures = True)
+
+	def get_pending_count(self):
+		return sum(map(len, self.batch.values())) + sum(len(subchunks) for subchunks, future in self.pending_batches)
+
+	def submit(self, pending_subchunk):
+		self.batch.setdefault(pending_subchunk.parent, []).append((pending_subchunk, pending_subchunk.version))
+		pending_subchunk.parent.pending_mesh_count += 1
+
+	def get_box(self, batch_chunk, subchunks):
+		# snapshot of the box around the given subchunks of a chunk (see 'cut_snapshots')
+
+		local_positions = [pending_subchunk.local_position for pending_subchunk, version in subchunks]
+		start = tuple(map(min, zip(*local_positions)))
+		end = tuple(map(max, zip(*local_positions)))
+
+		size = tuple(j - i + extent for i, j, extent in zip(start, end, (SUBCHUNK_WIDTH, SUBCHUNK_HEIGHT, SUBCHUNK_LENGTH)))
+		position = tuple(i + j for i, j in zip(batch_chunk.position, start))
+
+		return (self.world.get_block_neighbourhood(position, size), self.world.get_light_neighbourhood(position, size),
+			start, size, local_positions)
+
+	def flush(self):
+		if not self.batch:
+			return
+
+		boxes = [self.get_box(batch_chunk, subchunks) for batch_chunk, subchunks in self.batch.items()]
+
+		if self.executor:
+			future = self.executor.submit(mesh_boxes_worker, boxes, self.world.options.SMOOTH_LIGHTING)
+		else:
+			future = Future()
+			future.set_result(self.mesher.mesh_boxes(boxes, self.world.options.SMOOTH_LIGHTING))
+
+		self.pending_batches.append(([item for subchunks in self.batch.values() for item in subchunks], future))
+		self.batch = {}
+
+		if not self.executor:
+			self.collect()
+
+	def collect(self):
+		# install the meshes which are done, and queue the chunks which aren't waiting for any other mesh for building
+
+		pending_batches = []
+
+		for subchunks, future in self.pending_batches:
+			if not future.done():
+				pending_batches.append((subchunks, future))
+				continue
+
+			for (pending_subchunk, version), meshes in zip(subchunks, future.result()):
+				parent = pending_subchunk.parent
+				parent.pending_mesh_count -= 1
+
+				if self.world.chunks.get(parent.chunk_position, None) is not parent:
+					continue # chunk was unloaded
+
+				if version == pending_subchunk.version and parent.subchunks.get(pending_subchunk.subchunk_position, None) is pending_subchunk:
+					pending_subchunk.face_meshes, pending_subchunk.translucent_mesh, pending_subchunk.face_count = meshes
+					parent.updated_subchunks.add(pending_subchunk.subchunk_position)
+					self.world.chunk_update_counter += 1
+
+				if not parent.pending_mesh_count and not parent.chunk_update_queue:
+					self.world.queue_chunk_building(parent)
+
+		self.pending_batches = pending_batches
@@ -0,0 +1,206 @@
+import ctypes
+from collections import deque
+
+import pyglet.gl as gl
+import glm
+
+import chunk
+import shader
+
+BOX_MARGIN = 0.25 # blocks added around each bounding box, so that it's never hidden behind the faces of its own chunk
+CAMERA_MARGIN = 1 # chunks whose box is closer than this to the camera can't be tested, as their box gets clipped by the near plane
+QUERY_BATCH = 64 # queries are generated in batches
+
+# corners of a unit cube and its 12 triangles, all of its faces being drawn
+
+CUBE_VERTICES = (
+	0, 0, 0,  1, 0, 0,  1, 1, 0,  0, 1, 0,
+	0, 0, 1,  1, 0, 1,  1, 1, 1,  0, 1, 1)
+
+CUBE_INDICES = (
+	0, 1, 2,  2, 3, 0,
+	4, 5, 6,  6, 7, 4,
+	0, 1, 5,  5, 4, 0,
+	3, 2, 6,  6, 7, 3,
+	0, 3, 7,  7, 4, 0,
+	1, 2, 6,  6, 5, 1)
+
+class Occlusion_culler:
+	"""Hides chunks which were behind other chunks in the frames before, using hardware occlusion queries
+	After the opaque meshes are drawn, the bounding box of each chunk in the view frustum is drawn without writing anything,
+	in a query telling whether any of it passed the depth test
+	Results are only read once the GPU has them, usually one or two frames later, so that the CPU never waits on it
+	Until then, chunks keep the result of their last query"""
+
+	def __init__(self, world):
+		self.world = world
+
+		self.shader = shader.Shader("shaders/occlusion/vert.glsl", "shaders/occlusion/frag.glsl")
+		self.mvp_matrix_location = self.shader.find_uniform(b"u_MVPMatrix")
+		self.box_position_location = self.shader.find_uniform(b"u_BoxPosition")
+		self.box_size_location = self.shader.find_uniform(b"u_BoxSize")
+
+		self.vao = gl.GLuint(0)
+		gl.glGenVertexArrays(1, self.vao)
+		gl.glBindVertexArray(self.vao)
+
+		self.vbo = gl.GLuint(0)
+		gl.glGenBuffers(1, self.vbo)
+		gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vbo)
+		gl.glBufferData(gl.GL_ARRAY_BUFFER, ctypes.sizeof(gl.GLfloat * len(CUBE_VERTICES)),
+			(gl.GLfloat * len(CUBE_VERTICES))(*CUBE_VERTICES), gl.GL_STATIC_DRAW)
+
+		gl.glVertexAttribPointer(0, 3, gl.GL_FLOAT, gl.GL_FALSE, 0, 0)
+		gl.glEnableVertexAttribArray(0)
+
+		self.ibo = gl.GLuint(0)
+		gl.glGenBuffers(1, self.ibo)
+		gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ibo)
+		gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, ctypes.sizeof(gl.GLuint * len(CUBE_INDICES)),
+			(gl.GLuint * len(CUBE_INDICES))(*CUBE_INDICES), gl.GL_STATIC_DRAW)
+
+		self.free_queries = []
+		self.pending_queries = deque() # (chunk, query) pairs, in the order they were issued
+		self.chunk_queries = {} # query pending for each chunk
+
+		self.occluded_chunks = set()
+
+		self.saved_draw_count = 0 # draws skipped this frame
+		self.query_count = 0 # queries issued this frame
+
+	def delete(self):
+		queries = self.free_queries + [query for _, query in self.pending_queries]
+
+		if queries:
+			gl.glDeleteQueries(len(queries), (gl.GLuint * len(queries))(*queries))
+
+		self.free_queries = []
+		self.pending_queries.clear()
+		self.chunk_queries.clear()
+
+		gl.glDeleteBuffers(1, self.vbo)
+		gl.glDeleteBuffers(1, self.ibo)
+		gl.glDeleteVertexArrays(1, self.vao)
+
+		del self.shader # its program is deleted along with it
+
+	def get_query(self):
+		if not self.free_queries:
+			queries = (gl.GLuint * QUERY_BATCH)()
+			gl.glGenQueries(QUERY_BATCH, queries)
+			self.free_queries.extend(queries)
+
+		return self.free_queries.pop()
+
+	def discard(self, old_chunk):
+		# forget about a chunk which got unloaded or whose meshes changed, its pending query is just ignored once its result is available
+		self.occluded_chunks.discard(old_chunk)
+		self.chunk_queries.pop(old_chunk, None)
+
+	def collect(self):
+		# read the results of the queries the GPU is done with, which finishes them in the order they were issued
+		available = gl.GLuint(0)
+		result = gl.GLuint(0)
+
+		while self.pending_queries:
+			query_chunk, query = self.pending_queries[0]
+			gl.glGetQueryObjectuiv(query, gl.GL_QUERY_RESULT_AVAILABLE, ctypes.byref(available))
+
+			if not available.value:
+				break
+
+			self.pending_queries.popleft()
+			self.free_queries.append(query)
+
+			if self.chunk_queries.get(query_chunk) != query:
+				continue
+
+			del self.chunk_queries[query_chunk]
+			gl.glGetQueryObjectuiv(query, gl.GL_QUERY_RESULT, ctypes.byref(result))
+
+			if result.value:
+				self.occluded_chunks.discard(query_chunk)
+			else:
+				self.occluded_chunks.add(query_chunk)
+
+	def cull(self, visible_chunks):
+		# the chunks which weren't hidden last time they were tested
+		self.saved_draw_count = 0
+
+		if not self.occluded_chunks:
+			return visible_chunks
+
+		unoccluded_chunks = []
+
+		for render_chunk in visible_chunks:
+			if render_chunk in self.occluded_chunks:
+				self.saved_draw_count += len(render_chunk.draw_ranges) + len(render_chunk.translucent_draw_ranges)
+			else:
+				unoccluded_chunks.append(render_chunk)
+
+		return unoccluded_chunks
+
+	def get_box(self, render_chunk):
+		# bounding box of the sections of the chunk being drawn, or None if nothing of it is
+		section_mask = render_chunk.section_mask & render_chunk.mesh_section_mask
+
+		if not section_mask:
+			return None
+
+		first_section = (section_mask & -section_mask).bit_length() - 1
+		last_section = section_mask.bit_length()
+
+		x, y, z = render_chunk.position
+		position = glm.vec3(x, y + first_section * chunk.SECTION_HEIGHT, z) - BOX_MARGIN
+		size = glm.vec3(chunk.CHUNK_WIDTH, (last_section - first_section) * chunk.SECTION_HEIGHT, chunk.CHUNK_LENGTH) + 2 * BOX_MARGIN
+
+		return position, size
+
+	def draw_proxies(self, frustum_chunks, mvp_matrix, camera_position):
+		"""Issue queries for the chunks in the view frustum which don't have one pending, once the opaque meshes are drawn
+		Chunks around the camera are never hidden, as their box can't be tested"""
+
+		self.query_count = 0
+
+		self.shader.use()
+		self.shader.uniform_matrix(self.mvp_matrix_location, mvp_matrix)
+		gl.glBindVertexArray(self.vao)
+
+		gl.glColorMask(gl.GL_FALSE, gl.GL_FALSE, gl.GL_FALSE, gl.GL_FALSE)
+		gl.glDepthMask(gl.GL_FALSE)
+		gl.glDisable(gl.GL_CULL_FACE)
+
+		for render_chunk in frustum_chunks:
+			if render_chunk in self.chunk_queries:
+				continue
+
+			box = self.get_box(render_chunk)
+
+			if box is None:
+				self.occluded_chunks.discard(render_chunk)
+				continue
+
+			position, size = box
+
+			if glm.all(glm.greaterThan(camera_position, position - CAMERA_MARGIN)) and \
+					glm.all(glm.lessThan(camera_position, position + size + CAMERA_MARGIN)):
+				self.occluded_chunks.discard(render_chunk)
+				continue
+
+			query = self.get_query()
+			self.chunk_queries[render_chunk] = query
+			self.pending_queries.append((render_chunk, query))
+			self.query_count += 1
+
+			gl.glUniform3f(self.box_position_location, *position)
+			gl.glUniform3f(self.box_size_location, *size)
+
+			gl.glBeginQuery(gl.GL_ANY_SAMPLES_PASSED, query)
+			gl.glDrawElements(gl.GL_TRIANGLES, len(CUBE_INDICES), gl.GL_UNSIGNED_INT, None)
+			gl.glEndQuery(gl.GL_ANY_SAMPLES_PASSED)
+
+		gl.glEnable(gl.GL_CULL_FACE)
+		gl.glDepthMask(gl.GL_TRUE)
+		gl.glColorMask(gl.GL_TRUE, gl.GL_TRUE, gl.GL_TRUE, gl.GL_TRUE)
+
+		self.world.shader.use()
@@ -10,17 +10,58 @@ FOV = 90
 # --------------------------------- Performance --------------------------------- 
 
 # Indirect Rendering
-INDIRECT_RENDERING = False # Requires OpenGL 4.2+. Disable if having issues.
+INDIRECT_RENDERING = False # Requires OpenGL 4.3+. Disable if having issues.
                            # Indirect rendering caches the draw command parameters in a seperate indirect command buffer,
                            # thus reducing the amount of data needed to supply the draw call
 
-# Conditional Rendering with Occlusion queries
-ADVANCED_OPENGL = False # Not recommended unless using NVIDIA cards. 
-                        # Might cause more slowdowns that speedups.
-                        # Do not expect any concrete framerate improvement.
+# Geometry Arena
+GEOMETRY_ARENA = False # Requires OpenGL 4.3+. Disable if having issues.
+                       # Stores the meshes of all chunks in one big vertex buffer, instead of one full-size buffer per chunk,
+                       # and draws all visible chunks with a single multi-draw indirect call, without any state change in between
+                       # Uses much less video memory. Conditional rendering (Advanced OpenGL) is not used with it
+
+# Occlusion Culling with Occlusion queries
+ADVANCED_OPENGL = False # Chunks hidden behind others aren't drawn, as told by testing their bounding boxes against the depth buffer
+                        # The results are read without waiting on the GPU, one or two frames later,
+                        # so chunks coming into view from behind others can show up a frame or two late
+# Section Culling
+SECTION_CULLING = True # Chunks partly in the view frustum have each of their 16-high sections tested against it too,
+                       # and only the part of their mesh holding the visible ones gets drawn
+                       # Mostly helps when looking up or down
+
+# Cave Culling
+CAVE_CULLING = True # Sections are only drawn when they can be seen from the section of the camera through blocks which aren't opaque,
+                    # walking from section to section like Minecraft's "advanced cave culling"
+                    # Mostly helps underground and indoors
+
+# Palette Block Storage
+PALETTE_STORAGE = False # Stores the blocks of each chunk as 16x16x16 sections, each with its own palette of block numbers
+                        # and indices bit-packed on as few bits as the palette allows, like modern Minecraft does
+                        # Uses several times less memory, allowing to keep far more chunks loaded,
+                        # but block accesses are slower, so chunk building and lighting take longer
+
 # Max number of chunk updates per chunk every tick
 CHUNK_UPDATES = 4
 
+# Chunk mesher
+MESHER = "numpy" # "python" builds subchunk meshes one block at a time
+                 # "bitmask" finds the visible faces of cubes with shifts & masks over occupancy bitmasks of the chunk column,
+                 # one integer per row of blocks along each axis, and builds them like the Python mesher, which it's a bit faster than
+                 # "numpy" builds the faces of cube blocks of many subchunks at once with NumPy array operations,
+                 # falling back to the Python mesher for subchunks with other models. All of them give out the same meshes
+
+# Greedy meshing
+GREEDY_MESHING = False # Merges neighbouring faces of opaque cubes which look the same into bigger quads (NumPy mesher only)
+                       # Greatly reduces the number of quads to draw and upload for flat terrain, at the cost of slower chunk updates
+
+# Chunk meshing processes
+MESHING_PROCESSES = 0 # Number of worker processes building subchunk meshes in the background, 0 builds them on the main thread
+                      # Workers get a snapshot of the blocks & light around the subchunks to update of each chunk every tick,
+                      # but the main thread still takes the snapshots and gets the meshes back, so meshing can only get faster
+                      # by up to about 1.5x with the NumPy mesher, and about 5x with the Python mesher (see 'benchmark.py mesher_pool')
+                      # Worth it with the Python mesher and at least 2 spare CPU cores, one worker for each of them
+                      # Meshes take a few ticks longer to show up, and with no spare core it's slower than the main thread
+
 # Vertical Sync
 VSYNC = False
 
@@ -46,6 +87,11 @@ SMOOTH_LIGHTING = True # Smooth Lighting smoothes the light of each vertex to ac
 # Better Translucency blending
 FANCY_TRANSLUCENCY = True
 
+# Translucent Sorting
+TRANSLUCENT_SORTING = True # Sorts the translucent quads of each chunk back to front into an index buffer of their own,
+                           # which blends them right in a single pass, instead of the two passes of Fancy Translucency
+                           # Quads are only sorted again once the camera moves a block away from where they were sorted from
+
 # Minification Filter
 MIPMAP_TYPE = gl.GL_NEAREST # Linear filtering samples the texture in a bilinear way in the distance, 
                             # however its effect is negligible and should not be used.
@@ -2,23 +2,11 @@ import math
 import entity
 import glm
 import options
-import chunk
+import culling
 
 WALKING_SPEED = 4.317
 SPRINTING_SPEED = 7 # faster than in Minecraft, feels better
 
-class Frustum:
-	left = glm.vec4(1.0)
-	right = glm.vec4(1.0)
-	top = glm.vec4(1.0)
-	bottom = glm.vec4(1.0)
-	near = glm.vec4(1.0)
-	far = glm.vec4(1.0)
-
-def normalize(plane):
-	return plane / glm.length(plane.xyz)
-
-
 class Player(entity.Entity):
 	def __init__(self, world, shader, width, height):
 		super().__init__(world)
@@ -50,6 +38,8 @@ class Player(entity.Entity):
 		self.rounded_position = self.position
 		self.view_ray = glm.vec3(1.0)
 
+		self.frustum_planes = culling.get_frustum_planes(glm.mat4()) # see 'culling.cull_chunks'
+
 	def update(self, delta_time):
 		# process input
 
@@ -87,77 +77,6 @@ class Player(entity.Entity):
 		self.interpolated_position = glm.mix(glm.vec3(self.position), glm.vec3(self.old_position), self.step)
 		self.step -= delta_time
 
-	def update_frustum(self, mat):
-		mat = glm.transpose(mat)
-		for i in range(4): 
-			Frustum.left[i]      = mat[3][i] + mat[0][i]
-			Frustum.right[i]     = mat[3][i] - mat[0][i]
-			Frustum.bottom[i]    = mat[3][i] + mat[1][i]
-			Frustum.top[i]       = mat[3][i] - mat[1][i]
-			Frustum.near[i]      = mat[3][i] + mat[2][i]
-			Frustum.far[i]       = mat[3][i] - mat[2][i]
-			
-		Frustum.left = normalize(Frustum.left)
-		Frustum.right = normalize(Frustum.right)
-		Frustum.bottom = normalize(Frustum.bottom)
-		Frustum.top = normalize(Frustum.top)
-		Frustum.near = normalize(Frustum.near)
-		Frustum.far = normalize(Frustum.far)
-		
-	def check_in_frustum(self, chunk_pos):
-		"""Frustum check of each chunk. If the chunk is not in the view frustum, it is discarded"""
-		planes = (Frustum.left, Frustum.right, Frustum.bottom, Frustum.top, Frustum.near, Frustum.far)
-		result = 2
-		center = glm.vec3(chunk_pos * glm.ivec3(chunk.CHUNK_WIDTH, 0, chunk.CHUNK_LENGTH)
-									+ glm.ivec3(chunk.CHUNK_WIDTH / 2, 
-												chunk.CHUNK_HEIGHT / 2,
-												chunk.CHUNK_LENGTH / 2))
-
-
-		for plane in planes:
-			_in = 0
-			_out = 0
-			normal = plane.xyz
-			w = plane.w
-			if glm.dot(normal, center + glm.vec3(chunk.CHUNK_WIDTH / 2, chunk.CHUNK_HEIGHT / 2, chunk.CHUNK_LENGTH / 2)) + w < 0:
-				_out += 1
-			else:
-				_in += 1
-			if glm.dot(normal, center + glm.vec3(-chunk.CHUNK_WIDTH / 2, chunk.CHUNK_HEIGHT / 2, chunk.CHUNK_LENGTH / 2)) + w < 0:
-				_out += 1
-			else:
-				_in += 1
-			if glm.dot(normal, center + glm.vec3(chunk.CHUNK_WIDTH / 2, chunk.CHUNK_HEIGHT / 2, -chunk.CHUNK_LENGTH / 2)) + w < 0:
-				_out += 1
-			else:
-				_in += 1
-			if glm.dot(normal, center + glm.vec3(-chunk.CHUNK_WIDTH / 2, chunk.CHUNK_HEIGHT / 2, -chunk.CHUNK_LENGTH / 2)) + w < 0:
-				_out += 1
-			else:
-				_in += 1
-			if glm.dot(normal, center + glm.vec3(chunk.CHUNK_WIDTH / 2, -chunk.CHUNK_HEIGHT / 2, chunk.CHUNK_LENGTH / 2)) + w < 0:
-				_out += 1
-			else:
-				_in += 1
-			if glm.dot(normal, center + glm.vec3(-chunk.CHUNK_WIDTH / 2, -chunk.CHUNK_HEIGHT / 2, chunk.CHUNK_LENGTH / 2)) + w < 0:
-				_out += 1
-			else:
-				_in += 1
-			if glm.dot(normal, center + glm.vec3(chunk.CHUNK_WIDTH / 2, -chunk.CHUNK_HEIGHT / 2, -chunk.CHUNK_LENGTH / 2)) + w < 0:
-				_out += 1
-			else:
-				_in += 1
-			if glm.dot(normal, center + glm.vec3(-chunk.CHUNK_WIDTH / 2, -chunk.CHUNK_HEIGHT / 2, -chunk.CHUNK_LENGTH / 2)) + w < 0:
-				_out += 1
-			else:
-				_in += 1
-			
-			if not _in:
-				return 0
-			elif _out:
-				result = 1
-		return result
-
 	def update_matrices(self):
 		# create projection matrix
 		
@@ -176,4 +95,4 @@ class Player(entity.Entity):
 		# modelviewprojection matrix
 
 		self.shader.uniform_matrix(self.mvp_matrix_location, self.p_matrix * self.mv_matrix)
-		self.update_frustum(self.p_matrix * self.mv_matrix)
\ No newline at end of file
+		self.frustum_planes = culling.get_frustum_planes(self.p_matrix * self.mv_matrix)
\ No newline at end of file
@@ -3,6 +3,7 @@ import base36
 import logging
 
 import chunk
+import block_storage
 import glm
 
 class Save:
@@ -19,29 +20,55 @@ class Save:
 		
 		return chunk_path
 
-	def load_chunk(self, chunk_position):
-		logging.debug(f"Loading chunk at position {chunk_position}")
+	def read_chunk(self, chunk_position):
+		"""Reads and decodes a chunk file into a ready to install block storage, or returns None if there's no such file
+		Doesn't touch the world nor OpenGL, so it is safe to call from a worker thread"""
+
+		logging.debug(f"Reading chunk at position {chunk_position}")
 		# load the chunk file
 		
 		chunk_path = self.chunk_position_to_path(chunk_position)
 
 		try:
-			chunk_blocks = nbt.load(chunk_path)["Level"]["Blocks"]
+			chunk_blocks = nbt.load(chunk_path)["Level"]["Blocks"].tobytes()
 		
 		except FileNotFoundError:
-			return
+			return None
+
+		# chunk files store blocks column by column (X, then Z, then Y), so every layer is a strided slice of it
+
+		blocks = bytearray(len(chunk_blocks))
+		layer_size = chunk.CHUNK_WIDTH * chunk.CHUNK_LENGTH
+
+		for y in range(chunk.CHUNK_HEIGHT):
+			blocks[y * layer_size:(y + 1) * layer_size] = chunk_blocks[y::chunk.CHUNK_HEIGHT]
+
+		if self.world.options.PALETTE_STORAGE:
+			storage = block_storage.Palette_storage(len(blocks))
+			storage[:] = blocks
+			return storage
+
+		return block_storage.Flat_storage(blocks)
 
-		# create chunk and fill it with the blocks from our chunk file
+	def install_chunk(self, chunk_position, blocks):
+		"""Creates a chunk out of blocks returned by 'read_chunk' and adds it to the world
+		This creates OpenGL objects, so it must be called from the main thread"""
 
-		self.world.chunks[glm.ivec3(chunk_position)] = chunk.Chunk(self.world, glm.ivec3(chunk_position))
+		logging.debug(f"Loading chunk at position {chunk_position}")
+
+		loaded_chunk = chunk.Chunk(self.world, glm.ivec3(chunk_position), blocks)
+		loaded_chunk.build_height_maps()
+		self.world.chunks[glm.ivec3(chunk_position)] = loaded_chunk
+		self.world.chunk_ring.invalidate()
+		return loaded_chunk
+
+	def load_chunk(self, chunk_position):
+		blocks = self.read_chunk(chunk_position)
 
-		for x in range(chunk.CHUNK_WIDTH):
-			for y in range(chunk.CHUNK_HEIGHT):
-				for z in range(chunk.CHUNK_LENGTH):
-					self.world.chunks[glm.ivec3(chunk_position)].blocks[x][y][z] = chunk_blocks[
-						x * chunk.CHUNK_LENGTH * chunk.CHUNK_HEIGHT +
-						z * chunk.CHUNK_HEIGHT +
-						y]
+		if blocks is None:
+			return None
+
+		return self.install_chunk(chunk_position, blocks)
 
 	def save_chunk(self, chunk_position):
 		logging.debug(f"Saving chunk at position {chunk_position}")
@@ -63,47 +90,31 @@ class Save:
 
 		# fill the chunk file with the blocks from our chunk
 
-		chunk_blocks = nbt.ByteArray([0] * (chunk.CHUNK_WIDTH * chunk.CHUNK_HEIGHT * chunk.CHUNK_LENGTH))
+		chunk_blocks = bytearray(chunk.CHUNK_WIDTH * chunk.CHUNK_HEIGHT * chunk.CHUNK_LENGTH)
+		blocks = self.world.chunks[chunk_position].blocks[:]
+		layer_size = chunk.CHUNK_WIDTH * chunk.CHUNK_LENGTH
 
-		for x in range(chunk.CHUNK_WIDTH):
-			for y in range(chunk.CHUNK_HEIGHT):
-				for z in range(chunk.CHUNK_LENGTH):
-					chunk_blocks[
-						x * chunk.CHUNK_LENGTH * chunk.CHUNK_HEIGHT +
-						z * chunk.CHUNK_HEIGHT +
-						y] = self.world.chunks[chunk_position].blocks[x][y][z]
+		for y in range(chunk.CHUNK_HEIGHT):
+			chunk_blocks[y::chunk.CHUNK_HEIGHT] = blocks[y * layer_size:(y + 1) * layer_size]
 		
 		# save the chunk file
 
-		chunk_data["Level"]["Blocks"] = chunk_blocks
+		chunk_data["Level"]["Blocks"] = nbt.ByteArray(memoryview(chunk_blocks).cast('b'))
 		chunk_data.save(chunk_path, gzipped = True)
 
 	def load(self):
 		logging.info("Loading world")
 
-		# for x in range(-1, 15):
-		# 	for y in range(-15, 1):
-		# 		self.load_chunk((x, 0, y))
-
-		for x in range(-4, 4):
-			for y in range(-4, 4):
-				self.load_chunk((x, 0, y))
-
-		# for x in range(-1, 1):
-		#  	for y in range(-1, 1):
-		#  		self.load_chunk((x, 0, y))
-
-		for chunk_position, unlit_chunk in self.world.chunks.items():
-			for x in range(chunk.CHUNK_WIDTH):
-				for y in range(chunk.CHUNK_HEIGHT):
-					for z in range(chunk.CHUNK_LENGTH):
-						if unlit_chunk.blocks[x][y][z] in self.world.light_blocks:
-							world_pos = glm.ivec3(
-								chunk_position[0] * chunk.CHUNK_WIDTH + x,
-								chunk_position[1] * chunk.CHUNK_HEIGHT + y,
-								chunk_position[2] * chunk.CHUNK_LENGTH + z
-							)
-							self.world.increase_light(world_pos, 15, False)
+		# load all the chunks within render distance of the spawn point at once
+		# the chunk streamer then loads & unloads chunks as the player moves
+
+		self.world.chunk_streamer.set_center((0, 0, 0))
+
+		for chunk_position in self.world.chunk_streamer.load_pending():
+			self.load_chunk(chunk_position)
+
+		for unlit_chunk in self.world.chunks.values():
+			self.world.init_block_light(unlit_chunk)
 
 	def save(self):
 		logging.info("Saving world")
@@ -0,0 +1,85 @@
+import numpy as np
+
+# which faces of a 16x16x16 section can be seen from each other, through the blocks which aren't opaque
+# this is what cave culling walks through (see 'culling.Chunk_ring.walk_sections')
+
+SECTION_SHAPE = (16, 16, 16) # same layout as chunk blocks (Y, then X, then Z)
+SECTION_SIZE = 16 * 16 * 16
+
+# faces are in the same order as 'util.DIRECTIONS': east, west, up, down, south, north
+
+FACE_COUNT = 6
+EAST, WEST, UP, DOWN, SOUTH, NORTH = range(FACE_COUNT)
+OPPOSITE_FACES = (WEST, EAST, DOWN, UP, NORTH, SOUTH)
+ALL_FACES = (1 << FACE_COUNT) - 1
+
+# lookup tables indexed by masks of faces: faces in each mask, and the opposites of the faces in each mask
+
+MASK_FACES = tuple(tuple(face for face in range(FACE_COUNT) if mask >> face & 1) for mask in range(ALL_FACES + 1))
+OPPOSITE_MASKS = tuple(sum(1 << OPPOSITE_FACES[face] for face in MASK_FACES[mask]) for mask in range(ALL_FACES + 1))
+
+# connections of a section are a bitfield, where bit 'a * FACE_COUNT + b' is set when face b can be seen from face a
+
+ALL_CONNECTIONS = (1 << FACE_COUNT ** 2) - 1
+
+FACE_SLICES = (
+	(slice(None), -1), (slice(None), 0),
+	(-1,), (0,),
+	(Ellipsis, -1), (Ellipsis, 0))
+
+def get_connected_faces(connections, face):
+	# faces which can be seen from a given one
+	return connections >> face * FACE_COUNT & ALL_FACES
+
+def get_section_connections(opaque):
+	"""Connections of a section, given its blocks translated by 'World.opaque_table'
+	Its other blocks are flood-filled with NumPy: each one takes the smallest label next to it, and then the label of that label,
+	until the labels stop changing, at which point every connected area has one label"""
+
+	passable = np.frombuffer(opaque, dtype = np.uint8).reshape(SECTION_SHAPE) == 0
+
+	if not passable.any():
+		return 0
+
+	if passable.all():
+		return ALL_CONNECTIONS
+
+	# labels are the index of a block of the same area, opaque blocks are labelled past the end
+
+	labels = np.where(passable, np.arange(SECTION_SIZE).reshape(SECTION_SHAPE), SECTION_SIZE)
+
+	while True:
+		spread = labels.copy()
+
+		np.minimum(spread[1:], labels[:-1], out = spread[1:])
+		np.minimum(spread[:-1], labels[1:], out = spread[:-1])
+		np.minimum(spread[:, 1:], labels[:, :-1], out = spread[:, 1:])
+		np.minimum(spread[:, :-1], labels[:, 1:], out = spread[:, :-1])
+		np.minimum(spread[..., 1:], labels[..., :-1], out = spread[..., 1:])
+		np.minimum(spread[..., :-1], labels[..., 1:], out = spread[..., :-1])
+
+		spread[~passable] = SECTION_SIZE
+		spread[passable] = spread.ravel()[spread[passable]]
+
+		if np.array_equal(spread, labels):
+			break
+
+		labels = spread
+
+	# faces touched by each area
+
+	area_faces = {}
+
+	for face, face_slice in enumerate(FACE_SLICES):
+		for label in np.unique(labels[face_slice]).tolist():
+			if label != SECTION_SIZE:
+				area_faces[label] = area_faces.get(label, 0) | 1 << face
+
+	connections = 0
+
+	for faces in area_faces.values():
+		for face in range(FACE_COUNT):
+			if faces >> face & 1:
+				connections |= faces << face * FACE_COUNT
+
+	return connections
@@ -3,15 +3,11 @@
 #define CHUNK_WIDTH 16
 #define CHUNK_LENGTH 16
 
-uniform ivec2 u_ChunkPosition;
 uniform mat4 u_MVPMatrix;
 uniform float u_Daylight;
 
-layout(location = 0) in vec3 a_LocalPosition;
-layout(location = 1) in float a_TextureFetcher;
-layout(location = 2) in float a_Shading;
-layout(location = 3) in float a_Light;
-layout(location = 4) in float a_Skylight;
+layout(location = 0) in uvec2 a_Vertex; // packed vertex, see 'vertex_format.py' for the layout
+layout(location = 1) in ivec2 a_ChunkPosition; // same for the whole chunk, or one per instance with the geometry arena
 
 out vec3 v_Position;
 out vec3 v_TexCoords;
@@ -25,17 +21,26 @@ const vec2 texture_UV[4] = vec2[4](
 );
 
 void main(void) {
-	v_Position = vec3(u_ChunkPosition.x * CHUNK_WIDTH + a_LocalPosition.x, 
-						a_LocalPosition.y, 
-						u_ChunkPosition.y * CHUNK_LENGTH + a_LocalPosition.z);
-	v_TexCoords = vec3(texture_UV[int(a_TextureFetcher) & 3], int(a_TextureFetcher) >> 2);
+	vec3 localPosition = vec3(a_Vertex.x & 1023u, a_Vertex.x >> 20u, (a_Vertex.x >> 10u) & 1023u) / vec3(32.0, 16.0, 32.0) - 1.0;
+	float shading = float((a_Vertex.y >> 14u) & 63u) / 63.0;
+	float light = float((a_Vertex.y >> 20u) & 63u) / 4.0;
+	float skylight = float(a_Vertex.y >> 26u) / 4.0;
 
-	float blocklightMultiplier = pow(0.8, 15.0 - a_Light);
-	float skylightMultiplier = pow(0.8, 15.0 - a_Skylight * u_Daylight);
+	v_Position = vec3(a_ChunkPosition.x * CHUNK_WIDTH + localPosition.x, 
+						localPosition.y, 
+						a_ChunkPosition.y * CHUNK_LENGTH + localPosition.z);
+	// texture fetcher: texture layer << 6 | (quad height - 1) << 4 | (quad width - 1) << 2 | vertex index
+	// quads merged by greedy meshing span several blocks, so their texture is repeated over them
+	int fetcher = int(a_Vertex.y & 16383u);
+	vec2 quad_size = vec2(((fetcher >> 2) & 3) + 1, ((fetcher >> 4) & 3) + 1);
+	v_TexCoords = vec3(texture_UV[fetcher & 3] * quad_size, fetcher >> 6);
 
+	float blocklightMultiplier = pow(0.8, 15.0 - light);
+	float skylightMultiplier = pow(0.8, 15.0 - skylight * u_Daylight);
 
 
-	v_Light = max(blocklightMultiplier, skylightMultiplier) * a_Shading; 
+
+	v_Light = max(blocklightMultiplier, skylightMultiplier) * shading; 
 
 	gl_Position = u_MVPMatrix * vec4(v_Position, 1.0);
 }
\ No newline at end of file
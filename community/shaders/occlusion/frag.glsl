@@ -0,0 +1,8 @@
+#version 330
+
+out vec4 fragColor;
+
+void main(void) {
+	// nothing is written, only whether any fragment passes the depth test matters (see 'occlusion.py')
+	fragColor = vec4(1.0);
+}
@@ -0,0 +1,11 @@
+#version 330
+
+uniform mat4 u_MVPMatrix;
+uniform vec3 u_BoxPosition;
+uniform vec3 u_BoxSize;
+
+layout(location = 0) in vec3 a_Position; // corner of a unit cube, scaled to the bounding box being tested
+
+void main(void) {
+	gl_Position = u_MVPMatrix * vec4(u_BoxPosition + a_Position * u_BoxSize, 1.0);
+}
@@ -0,0 +1,125 @@
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import glm
+
+UNLOAD_MARGIN = 2 # chunks are only unloaded once they're this many chunks further than the render distance
+CHUNK_LOADS = 1 # max number of chunks installed every tick
+IO_THREADS = 2 # worker threads reading & decoding chunk files
+MAX_PENDING_READS = 8 # max number of chunk files being read at once
+
+def get_distance_squared(a, b):
+	# chunks all are on the same vertical level, so only the X and Z axes matter
+	return (a[0] - b[0]) ** 2 + (a[2] - b[2]) ** 2
+
+class Chunk_streamer:
+	"""Loads the chunks within render distance of the player, nearest first,
+	and unloads the ones which got further than the render distance plus some margin,
+	so that memory usage depends on the render distance and not on the size of the world"""
+
+	def __init__(self, world):
+		self.world = world
+
+		self.center = None
+		self.load_queue = deque()
+		self.requested = set() # positions which were either loaded, are being read or were found to not have any chunk file
+
+		# chunk files are read & decoded by worker threads (gzip decompression and file I/O release the GIL),
+		# only adding the decoded chunks to the world and creating their OpenGL objects is left to the main thread
+
+		self.executor = ThreadPoolExecutor(IO_THREADS, thread_name_prefix = "chunk_io")
+		self.pending_reads = deque() # (chunk position, future) pairs, nearest first
+
+	def delete(self):
+		self.executor.shutdown(wait = False, cancel_futures = True)
+
+	def get_positions_in_range(self, center, distance):
+		cx, _, cz = center
+		radius = int(distance)
+
+		positions = [(x, 0, z)
+			for x in range(cx - radius, cx + radius + 1)
+			for z in range(cz - radius, cz + radius + 1)
+			if get_distance_squared(center, (x, 0, z)) <= distance ** 2]
+
+		positions.sort(key = lambda position: get_distance_squared(center, position))
+		return positions
+
+	def set_center(self, position):
+		center = tuple(self.world.get_chunk_position(position))
+
+		if center == self.center:
+			return
+
+		self.center = center
+		render_distance = self.world.options.RENDER_DISTANCE
+		unload_distance_squared = (render_distance + UNLOAD_MARGIN) ** 2
+
+		# unload the chunks which got too far
+
+		for chunk_position in list(self.world.chunks):
+			if get_distance_squared(center, chunk_position) > unload_distance_squared:
+				self.world.remove_chunk(chunk_position)
+
+		self.requested = {position for position in self.requested
+			if get_distance_squared(center, position) <= unload_distance_squared}
+
+		# drop the reads of chunks which got out of render distance before being installed
+
+		pending_reads = deque()
+
+		for chunk_position, read in self.pending_reads:
+			if get_distance_squared(center, chunk_position) <= render_distance ** 2:
+				pending_reads.append((chunk_position, read))
+				continue
+
+			read.cancel()
+			self.requested.discard(chunk_position)
+
+		self.pending_reads = pending_reads
+
+		# queue the missing chunks, nearest first
+
+		self.load_queue = deque(position for position in self.get_positions_in_range(center, render_distance)
+			if position not in self.requested)
+
+	def load_pending(self, count = None):
+		loaded = 0
+
+		while self.load_queue and (count is None or loaded < count):
+			chunk_position = self.load_queue.popleft()
+			self.requested.add(chunk_position)
+
+			if glm.ivec3(chunk_position) in self.world.chunks: # chunks can also be created by placing a block
+				continue
+
+			logging.debug(f"Streaming in chunk at position {chunk_position}")
+			yield chunk_position
+			loaded += 1
+
+	def update(self, position):
+		self.set_center(position)
+
+		# keep the workers busy
+
+		for chunk_position in self.load_pending(MAX_PENDING_READS - len(self.pending_reads)):
+			self.pending_reads.append((chunk_position, self.executor.submit(self.world.save.read_chunk, chunk_position)))
+
+		# install the chunks which finished decoding, in order
+
+		installed = 0
+
+		while self.pending_reads and installed < CHUNK_LOADS:
+			chunk_position, read = self.pending_reads[0]
+			if not read.done():
+				break
+
+			self.pending_reads.popleft()
+			blocks = read.result()
+
+			if blocks is None or glm.ivec3(chunk_position) in self.world.chunks:
+				continue
+
+			self.world.add_chunk(chunk_position, blocks)
+			installed += 1
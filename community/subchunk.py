@@ -1,5 +1,6 @@
 from util import *
-import glm
+import array
+import vertex_format
 from functools import lru_cache as cache
 
 SUBCHUNK_WIDTH  = 4
@@ -42,25 +43,20 @@ class Subchunk:
 
 		# mesh variables
 
-		self.mesh = []
-		self.mesh_array = None
-	
-		self.translucent_mesh = []
-		self.translucent_mesh_array = None
+		self.version = 0 # bumped every time the subchunk is queued for an update (see 'mesher.Mesher_pool')
 
-	def get_raw_light(self, pos, npos):
-		if not npos:
-			light_levels = self.world.get_light(pos)
-		else:
-			light_levels = self.world.get_light(npos)
-		return [light_levels] * 4
+		# packed vertices (see 'vertex_format'), the opaque ones being split by the direction their faces face
 
-	def get_raw_skylight(self, pos, npos):
-		if not npos:
-			light_levels = self.world.get_skylight(pos)
-		else:
-			light_levels = self.world.get_skylight(npos)
-		return [light_levels] * 4
+		self.face_meshes = (array.array('I'),) * vertex_format.FACE_BUCKET_COUNT
+
+		self.translucent_mesh = array.array('I')
+
+		self.face_count = 0 # opaque faces before greedy meshing
+
+	def get_snapshot(self):
+		# blocks & light of the subchunk, padded with one voxel on every side (see 'mesher.mesh_subchunk')
+		size = (SUBCHUNK_WIDTH, SUBCHUNK_HEIGHT, SUBCHUNK_LENGTH)
+		return self.world.get_block_neighbourhood(self.position, size), self.world.get_light_neighbourhood(self.position, size)
 
 	def get_face_ao(self, s1, s2, s3,
 						  s4,     s5,
@@ -121,114 +117,20 @@ class Subchunk:
 			return []
 		return neighbours
 
+	def update_mesh(self):
+		self.parent.updated_subchunks.add(self.subchunk_position)
 
+		self.face_meshes = (array.array('I'),) * vertex_format.FACE_BUCKET_COUNT
+		self.translucent_mesh = array.array('I')
+		self.face_count = 0
 
-	def get_light_smooth(self, block, face, pos, npos):
-		if not npos or block in self.world.light_blocks:
-			return [self.world.get_light(pos)] * 4
-
-		neighbours = self.get_neighbour_voxels(npos, face)
-
-		nlights = (self.world.get_light(neighbour_pos) for neighbour_pos in neighbours)
-
-		return self.get_smooth_face_light(self.world.get_light(npos), *nlights)
-
-	def get_skylight_smooth(self, block, face, pos, npos):
-		if not npos or block in self.world.light_blocks:
-			return [self.world.get_skylight(pos)] * 4
-
-		neighbours = self.get_neighbour_voxels(npos, face)
-		
-		nlights = (self.world.get_skylight(neighbour_pos) for neighbour_pos in neighbours)
-
-		return self.get_smooth_face_light(self.world.get_skylight(npos), *nlights)
-
-	def get_ambient(self, block, block_type, face, npos):
-		raw_shading = block_type.shading_values[face]
-		if not block_type.is_cube or block in self.world.light_blocks:
-			return raw_shading
-
-		neighbours = self.get_neighbour_voxels(npos, face)
-		
-		neighbour_opacity = (self.world.is_opaque_block(neighbour_pos) for neighbour_pos in neighbours)
-
-		face_ao = self.get_face_ao(*neighbour_opacity)
-		
-		return [a * b for a, b in zip(face_ao, raw_shading)]
-
-	def get_shading(self, block, block_type, face, npos):
-		return self.get_ambient(block, block_type, face, npos) if self.world.options.SMOOTH_LIGHTING else block_type.shading_values[face]
-
-	def get_light(self, block, face, pos, npos):
-		return self.get_light_smooth(block, face, pos, npos) if self.world.options.SMOOTH_LIGHTING else self.get_raw_light(pos, npos)
-
-	def get_skylight(self, block, face, pos, npos):
-		return self.get_skylight_smooth(block, face, pos, npos) if self.world.options.SMOOTH_LIGHTING else self.get_raw_skylight(pos, npos)
-
+		if self.parent.is_subchunk_hidden(self.subchunk_position):
+			return
 
-	def add_face(self, face, pos, lpos, block, block_type, npos=None):
-		lx, ly, lz = lpos
-		vertex_positions = block_type.vertex_positions[face]
-		tex_index = block_type.tex_indices[face]
-		shading = self.get_shading(block, block_type, face, npos)
-		lights = self.get_light(block, face, pos, npos)
-		skylights = self.get_skylight(block, face, pos, npos)
+		# the whole mesh is built out of a single snapshot of the blocks & light around the subchunk,
+		# rather than going through the world for each face (see 'mesher.mesh_subchunk')
 
-		if block_type.model.translucent:
-			mesh = self.translucent_mesh
-		else:
-			mesh = self.mesh
-		
-		for i in range(4):
-			mesh += [vertex_positions[i * 3 + 0] + lx, 
-					 vertex_positions[i * 3 + 1] + ly, 
-					 vertex_positions[i * 3 + 2] + lz,
-					 tex_index * 4 + i,
-					 shading[i],
-					 lights[i],
-					 skylights[i]]
-					 
-
-	def can_render_face(self, block_type, block_number, position):
-		return not (self.world.is_opaque_block(position)
-			or (block_type.glass and self.world.get_block_number(position) == block_number))
-			
-
-	def update_mesh(self):
-		self.mesh = []
-		self.translucent_mesh = []
-
-		for local_x in range(SUBCHUNK_WIDTH):
-			for local_y in range(SUBCHUNK_HEIGHT):
-				for local_z in range(SUBCHUNK_LENGTH):
-					parent_lx = self.local_position[0] + local_x
-					parent_ly = self.local_position[1] + local_y
-					parent_lz = self.local_position[2] + local_z
-
-					block_number = self.parent.blocks[parent_lx][parent_ly][parent_lz]
-
-					parent_lpos = glm.ivec3(parent_lx, parent_ly, parent_lz)
-
-					if block_number:
-						block_type = self.world.block_types[block_number]
-
-						x, y, z = pos = glm.ivec3(
-							self.position[0] + local_x,
-							self.position[1] + local_y,
-							self.position[2] + local_z)
-						
-
-						# if block is cube, we want it to check neighbouring blocks so that we don't uselessly render faces
-						# if block isn't a cube, we just want to render all faces, regardless of neighbouring blocks
-						# since the vast majority of blocks are probably anyway going to be cubes, this won't impact performance all that much; the amount of useless faces drawn is going to be minimal
-
-						if block_type.is_cube:
-							for face, direction in enumerate(DIRECTIONS):
-								npos = pos + direction
-								if self.can_render_face(block_type, block_number, npos):
-									self.add_face(face, pos, parent_lpos, block_number, block_type, npos)
-														
-						else:
-							for i in range(len(block_type.vertex_positions)):
-								self.add_face(i, pos, parent_lpos, block_number, block_type)
+		blocks, light = self.get_snapshot()
 
+		(self.face_meshes, self.translucent_mesh, self.face_count), = self.world.subchunk_mesher.mesh_face_buckets(
+			[(blocks, light, self.local_position)], self.world.options.SMOOTH_LIGHTING)
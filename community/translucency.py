@@ -0,0 +1,80 @@
+import numpy as np
+
+import vertex_format
+
+SORT_DISTANCE = 1 # in blocks, translucent quads are sorted again once the camera moved this far from where they last were
+MAX_SORTS = 4 # chunks sorted again every frame because the camera moved, nearest first, the others wait for the next frames
+
+class Quad_sorter:
+	"""Translucent quads of a chunk, sorted back to front from the camera, as the indices of their triangles
+	Quads are sorted by the distance from the camera to their center, which is right as long as they don't cross each other,
+	so that they can be drawn in one pass, instead of drawing back faces before front faces (see 'World.draw_translucent_fancy')
+	Each sort starts from the order of the last one, which is usually almost right already, and sorting it again only has to merge a few runs
+	Only the quads of the visible sections get indices, still back to front, so that sections culled away aren't drawn (see 'set_section_mask')"""
+
+	def __init__(self):
+		self.quads = np.zeros(0, dtype = np.int64) # quad number of each translucent quad in the vertex storage of the chunk
+		self.sections = np.zeros(0, dtype = np.int64) # section each quad is in
+		self.centers = np.zeros((0, 3))
+		self.order = np.zeros(0, dtype = np.int64) # back to front
+
+		self.section_mask = -1 # every section is visible
+		self.indices = vertex_format.get_quad_indices(self.quads)
+		self.camera_position = None # where the quads were last sorted from, None if they need to be
+
+	def get_quad_count(self):
+		return len(self.quads)
+
+	def get_drawn_quad_count(self):
+		# quads of the visible sections
+		return len(self.indices) // 6
+
+	def update(self, region, meshes, sections):
+		"""Finds the translucent quads again once they changed, out of the ranges of their region of the vertex storage
+		'meshes' maps subchunk positions to packed translucent meshes, and 'sections' to the section they're in"""
+
+		quads = []
+		quad_sections = []
+		centers = []
+
+		for position, (start, size) in region.ranges.items():
+			mesh = np.frombuffer(meshes[position], dtype = np.uint32).reshape(-1, 4, vertex_format.VERTEX_WORDS)
+
+			quads.append(np.arange(start, start + len(mesh)))
+			quad_sections.append(np.full(len(mesh), sections[position]))
+			centers.append(vertex_format.unpack_positions(mesh[:, :, 0]).mean(axis = 1))
+
+		self.quads = np.concatenate(quads) if quads else np.zeros(0, dtype = np.int64)
+		self.sections = np.concatenate(quad_sections) if quad_sections else np.zeros(0, dtype = np.int64)
+		self.centers = np.concatenate(centers) if centers else np.zeros((0, 3))
+		self.order = np.arange(len(self.quads))
+
+		self.update_indices()
+		self.camera_position = None
+
+	def set_section_mask(self, section_mask):
+		# returns whether the indices changed
+		if section_mask == self.section_mask:
+			return False
+
+		self.section_mask = section_mask
+		self.update_indices()
+
+		return True
+
+	def update_indices(self):
+		quads = self.quads[self.order]
+		visible = (self.section_mask >> self.sections[self.order]) & 1
+		self.indices = vertex_format.get_quad_indices(quads[visible.astype(bool)])
+
+	def is_outdated(self, camera_position):
+		return self.camera_position is None or np.linalg.norm(self.camera_position - camera_position) > SORT_DISTANCE
+
+	def sort(self, camera_position):
+		# 'camera_position' is local to the chunk, like the quads
+		self.camera_position = camera_position
+
+		distances = ((self.centers[self.order] - camera_position) ** 2).sum(axis = 1)
+		self.order = self.order[np.argsort(-distances, kind = "stable")]
+
+		self.update_indices()
@@ -0,0 +1,64 @@
+# chunk mesh vertices are packed into 2 32-bit unsigned integers (see the vertex shaders, which unpack them)
+#
+# word 0: local position within the chunk, as fixed point numbers offset by 1 so that they're never negative
+#	bits  0-9:  (x + 1) * 32 (models use 1/16 steps, and sqrt(2) / 4 for plants, which is only off by 0.01 at 1/32)
+#	bits 10-19: (z + 1) * 32
+#	bits 20-31: (y + 1) * 16
+# word 1:
+#	bits  0-13: texture fetcher (texture layer << 6 | (quad height - 1) << 4 | (quad width - 1) << 2 | vertex index)
+#	bits 14-19: shading * 63
+#	bits 20-25: block light * 4 (smooth lighting averages 4 light levels, so they're always multiples of 1/4)
+#	bits 26-31: skylight * 4
+
+import numpy as np
+
+VERTEX_WORDS = 2
+QUAD_WORDS = VERTEX_WORDS * 4
+VERTEX_SIZE = VERTEX_WORDS * 4 # in bytes
+QUAD_SIZE = VERTEX_SIZE * 4
+
+QUAD_INDICES = np.array((0, 1, 2, 2, 3, 0), dtype = np.uint32) # each quad is drawn as 2 triangles
+
+# opaque quads are split into buckets by the direction they face, in the order of 'util.DIRECTIONS' (east, west, up, down, south, north)
+# quads facing any other direction, like those of plants, go in the last one
+
+FACE_BUCKET_COUNT = 7
+OTHER_FACES = 6
+
+POSITION_SCALES = (32, 16, 32) # X, Y, Z
+POSITION_SHIFTS = (0, 20, 10)
+POSITION_MASKS = (0x3FF, 0xFFF, 0x3FF)
+BLOCK_SHIFTS = (5, 24, 15) # shift of a whole block along each axis, in packed positions
+
+FETCHER_MASK = (1 << 14) - 1
+SHADING_SHIFT = 14
+LIGHT_SHIFT = 20
+SKYLIGHT_SHIFT = 26
+
+def pack_position(x, y, z):
+	return (round((x + 1) * POSITION_SCALES[0]) << POSITION_SHIFTS[0]
+		| round((y + 1) * POSITION_SCALES[1]) << POSITION_SHIFTS[1]
+		| round((z + 1) * POSITION_SCALES[2]) << POSITION_SHIFTS[2])
+
+def unpack_positions(words):
+	# local positions out of a NumPy array of the first words of vertices, with an extra axis for X, Y & Z
+	return np.stack([(words >> shift & mask) / scale
+		for shift, mask, scale in zip(POSITION_SHIFTS, POSITION_MASKS, POSITION_SCALES)], axis = -1) - 1
+
+def get_quad_indices(quads):
+	# indices of the triangles of each quad out of a NumPy array of quad numbers
+	return (quads.astype(np.uint32)[:, np.newaxis] * 4 + QUAD_INDICES).ravel()
+
+def get_position_offset(x, y, z):
+	# moves a packed position by a whole number of blocks, by adding it to it
+	return x << BLOCK_SHIFTS[0] | y << BLOCK_SHIFTS[1] | z << BLOCK_SHIFTS[2]
+
+def pack_shading(shading):
+	return round(shading * 63) << SHADING_SHIFT
+
+def pack_light(light, skylight):
+	return round(light * 4) << LIGHT_SHIFT | round(skylight * 4) << SKYLIGHT_SHIFT
+
+def pack_raw_light(raw_light):
+	# light & skylight out of a lightmap byte (works on NumPy arrays too)
+	return (raw_light & 0xF) << (LIGHT_SHIFT + 2) | (raw_light >> 4) << (SKYLIGHT_SHIFT + 2)
@@ -1,19 +1,26 @@
 import chunk
 import subchunk
 import ctypes
-import math
+import time
 import logging
 import glm
+import numpy as np
 import options
 
-from functools import cmp_to_key
 from collections import deque
 
 import pyglet.gl as gl
 
+import arena
 import block_type
+import culling
 import models
 import save
+import streaming
+import mesher
+import occlusion
+import translucency
+import vertex_format
 from util import DIRECTIONS
 
 def get_chunk_position(position):
@@ -34,13 +41,14 @@ def get_local_position(position):
 		int(z % chunk.CHUNK_LENGTH))
 
 
+INDEX_BUFFER_QUADS = 4096 # quads the shared index buffer is first created for, it's doubled whenever a bigger mesh comes up
+
 class World:
 	def __init__(self, shader, player, texture_manager, options):
 		self.options = options
 		self.shader = shader
 		self.player = player
 		self.texture_manager = texture_manager
-		self.block_types = [None]
 
 		self.shader_daylight_location = shader.find_uniform(b"u_Daylight")
 		self.daylight = 1800
@@ -52,92 +60,59 @@ class World:
 		self.get_chunk_position = get_chunk_position
 		self.get_local_position = get_local_position
 
-		# parse block type data file
-
-		blocks_data_file = open("data/blocks.mcpy")
-		blocks_data = blocks_data_file.readlines()
-		blocks_data_file.close()
-
 		logging.info("Loading block models")
-		for block in blocks_data:
-			if block[0] in ['\n', '#']: # skip if empty line or comment
-				continue
-			
-			number, props = block.split(':', 1)
-			number = int(number)
-
-			# default block
+		self.block_types = block_type.load_block_types(self.texture_manager)
 
-			name = "Unknown"
-			model = models.cube
-			texture = {"all": "unknown"}
-
-			# read properties
-
-			for prop in props.split(','):
-				prop = prop.strip()
-				prop = list(filter(None, prop.split(' ', 1)))
+		self.light_blocks = [10, 11, 50, 51, 62, 75]
 
-				if prop[0] == "sameas":
-					sameas_number = int(prop[1])
+		# translation table turning block numbers into 1 for opaque blocks and 0 for the rest
+		self.opaque_table = bytes(int(bool(block_type) and not block_type.transparent)
+			for block_type in self.block_types).ljust(256, b"\0")
 
-					name = self.block_types[sameas_number].name
-					texture = self.block_types[sameas_number].block_face_textures
-					model = self.block_types[sameas_number].model
-				
-				elif prop[0] == "name":
-					name = eval(prop[1])
-				
-				elif prop[0][:7] == "texture":
-					_, side = prop[0].split('.')
-					texture[side] = prop[1].strip()
+		self.texture_manager.generate_mipmaps()
 
-				elif prop[0] == "model":
-					model = eval(prop[1])
-			
-			# add block type
+		# the Python mesher can mesh subchunks one at a time, as they get updated (see 'Subchunk.update_mesh')
+		# the others are much faster when given many subchunks at once
 
-			_block_type = block_type.Block_type(self.texture_manager, name, texture, model)
+		self.block_table = mesher.get_block_table(self)
+		self.subchunk_mesher = mesher.Python_mesher(self.block_table)
 
-			if number < len(self.block_types):
-				self.block_types[number] = _block_type
-			
-			else:
-				self.block_types.append(_block_type)
+		if self.options.MESHING_PROCESSES or self.options.MESHER != "python":
+			self.mesher_pool = mesher.Mesher_pool(self, self.options.MESHING_PROCESSES)
+		else:
+			self.mesher_pool = None
 
-		self.light_blocks = [10, 11, 50, 51, 62, 75]
+		# every quad is drawn with the same 2 triangles, so one index buffer is shared by all meshes (see 'reserve_indices')
 
-		self.texture_manager.generate_mipmaps()
+		self.ibo = gl.GLuint(0)
+		gl.glGenBuffers(1, self.ibo)
 
-		indices = []
+		self.index_quad_count = 0
+		self.index_buffer_size = 0 # in bytes
+		self.reserve_indices(INDEX_BUFFER_QUADS)
 
-		for nquad in range(chunk.CHUNK_WIDTH * chunk.CHUNK_HEIGHT * chunk.CHUNK_LENGTH * 8):
-			indices.append(4 * nquad + 0)
-			indices.append(4 * nquad + 1)
-			indices.append(4 * nquad + 2)
-			indices.append(4 * nquad + 2)
-			indices.append(4 * nquad + 3)
-			indices.append(4 * nquad + 0)
+		if self.options.GEOMETRY_ARENA:
+			self.arena = arena.Geometry_arena(self)
+		else:
+			self.arena = None
 
+		# chunks hidden behind others are skipped, as told by occlusion queries from the frames before (see 'occlusion.py')
 
-		self.ibo = gl.GLuint(0)
-		gl.glGenBuffers(1, self.ibo)
-		gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.ibo)
-		gl.glBufferData(
-			gl.GL_ELEMENT_ARRAY_BUFFER,
-			ctypes.sizeof(gl.GLuint * len(indices)),
-			(gl.GLuint * len(indices))(*indices),
-			gl.GL_STATIC_DRAW)
-		gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
-
-		logging.debug("Created Shared Index Buffer")
+		if self.options.ADVANCED_OPENGL:
+			self.occlusion_culler = occlusion.Occlusion_culler(self)
+		else:
+			self.occlusion_culler = None
 
 		# load the world
 
 		self.save = save.Save(self)
+		self.chunk_streamer = streaming.Chunk_streamer(self)
 
 		self.chunks = {}
+		self.chunk_ring = culling.Chunk_ring(self)
 		self.sorted_chunks = []
+		self.visible_chunks = []
+		self.frustum_chunks = [] # visible chunks before occlusion culling
 
 		# light update queue
 
@@ -157,17 +132,55 @@ class World:
 		for world_chunk in self.chunks.values():
 			world_chunk.update_subchunk_meshes()
 
-		del indices
-		self.visible_chunks = []
-
 		# Debug variables
 
 		self.pending_chunk_update_count = 0
 		self.chunk_update_counter = 0
+		self.culling_time = 0
+		self.visible_section_count = 0
+		self.translucent_sort_count = 0 # chunks whose translucent quads were sorted this frame
 
 	def __del__(self):
 		gl.glDeleteBuffers(1, ctypes.byref(self.ibo))
 
+	def delete(self):
+		# stop the worker threads & processes and free the shared GPU objects, once the game closes
+		self.chunk_streamer.delete()
+
+		if self.mesher_pool:
+			self.mesher_pool.delete()
+
+		if self.arena:
+			self.arena.delete()
+
+		if self.occlusion_culler:
+			self.occlusion_culler.delete()
+
+	def reserve_indices(self, quad_count):
+		"""Grows the shared index buffer so that it can draw meshes of up to 'quad_count' quads
+		Buffer objects keep their name when their data changes, so the VAOs using it don't need to be updated"""
+
+		if quad_count <= self.index_quad_count:
+			return
+
+		capacity = max(self.index_quad_count, INDEX_BUFFER_QUADS)
+
+		while capacity < quad_count:
+			capacity *= 2
+
+		start = time.perf_counter()
+		indices = vertex_format.get_quad_indices(np.arange(capacity))
+
+		# not bound as an element array buffer, which would change the binding of whatever VAO is bound
+
+		gl.glBindBuffer(gl.GL_COPY_WRITE_BUFFER, self.ibo)
+		gl.glBufferData(gl.GL_COPY_WRITE_BUFFER, indices.nbytes, indices.ctypes.data, gl.GL_STATIC_DRAW)
+
+		self.index_quad_count = capacity
+		self.index_buffer_size = indices.nbytes
+
+		logging.info(f"Created shared index buffer for {capacity} quads ({indices.nbytes // 1024} KiB) in {1000 * (time.perf_counter() - start):.2f} ms")
+
 	################ LIGHTING ENGINE ################
 
 
@@ -208,36 +221,80 @@ class World:
 					if light_update:
 						chunk.update_at_position(neighbour_pos)
 
+	def init_block_light(self, pending_chunk):
+		"""Propagates the light of all the light sources of a chunk"""
+
+		for light_block in self.light_blocks:
+			index = pending_chunk.blocks.find(light_block)
+
+			while index != -1:
+				x, y, z = chunk.get_index_position(index)
+				world_pos = glm.ivec3(
+					pending_chunk.position[0] + x,
+					pending_chunk.position[1] + y,
+					pending_chunk.position[2] + z
+				)
+				self.increase_light(world_pos, 15, False)
+				index = pending_chunk.blocks.find(light_block, index + 1)
+
+	def pull_border_light(self, pending_chunk):
+		"""Propagates the light of already lit neighbouring chunks into a newly loaded chunk
+		Only the border voxels which are brighter than the voxel next to them in the new chunk are queued"""
+
+		for direction in chunk.BORDER_SUBCHUNK_POSITIONS:
+			neighbour = self.chunks.get(pending_chunk.chunk_position + glm.ivec3(direction), None)
+			if not neighbour:
+				continue
+
+			dx, _, dz = direction
+
+			for ly in range(chunk.CHUNK_HEIGHT):
+				for i in range(chunk.CHUNK_WIDTH if dz else chunk.CHUNK_LENGTH):
+					# voxel of the new chunk on that side, and the neighbouring voxel right next to it
+					lx, lz = (i, (chunk.CHUNK_LENGTH - 1) * (dz > 0)) if dz else ((chunk.CHUNK_WIDTH - 1) * (dx > 0), i)
+					nx, nz = (lx, (lz + dz) % chunk.CHUNK_LENGTH) if dz else ((lx + dx) % chunk.CHUNK_WIDTH, lz)
+
+					raw_light = pending_chunk.get_raw_light((lx, ly, lz))
+					neighbour_light = neighbour.get_raw_light((nx, ly, nz))
+
+					if neighbour_light == raw_light:
+						continue
+
+					neighbour_pos = glm.ivec3(neighbour.position[0] + nx, ly, neighbour.position[2] + nz)
+
+					if (neighbour_light & 0xF) > (raw_light & 0xF) + 1:
+						self.light_increase_queue.append((neighbour_pos, neighbour_light & 0xF))
+
+					if (neighbour_light >> 4) > (raw_light >> 4) + 1:
+						self.skylight_increase_queue.append((neighbour_pos, neighbour_light >> 4))
+
+		self.propagate_increase(False)
+		self.propagate_skylight_increase(False)
+
 	def init_skylight(self, pending_chunk):
 		""" Initializes the skylight of each chunks
 		To avoid unsufferable lag from propagating from the top of the chunks when
-		most of the heights would be air, it instead runs a simple algorithm
-		to check where the highest point of the chunk is and propagates skylight from
+		most of the heights would be air, it instead uses the height map of the chunk
+		to know where the highest point of each column is and propagates skylight from
 		this height"""
 
 		chunk_pos = pending_chunk.chunk_position
 
-		# Retrieve the highest chunk point
-		height = 0
+		# Initialize skylight to 15 until the highest point of each column and then queue a skylight propagation increase
+		# from that point up to the highest point of the neighbouring columns, which might have overhangs or caves on this side
 		for lx in range(chunk.CHUNK_WIDTH):
 			for lz in range(chunk.CHUNK_LENGTH):
-				for ly in range(chunk.CHUNK_HEIGHT-1, -1, -1):
-					if pending_chunk.blocks[lx][ly][lz]:
-						break
-				if ly > height:
-					height = ly
+				height = pending_chunk.get_height(lx, lz)
+				pending_chunk.fill_sky_light(lx, lz, height, chunk.CHUNK_HEIGHT, 15)
 
-		# Initialize skylight to 15 until that point and then queue a skylight propagation increase
-		for lx in range(chunk.CHUNK_WIDTH):
-			for lz in range(chunk.CHUNK_LENGTH):
-				for ly in range(chunk.CHUNK_HEIGHT - 1, height, -1):
-					pending_chunk.set_sky_light(glm.ivec3(lx, ly, lz), 15)
+				x = chunk.CHUNK_WIDTH * chunk_pos[0] + lx
+				z = chunk.CHUNK_LENGTH * chunk_pos[2] + lz
 
-				pos = glm.ivec3(chunk.CHUNK_WIDTH * chunk_pos[0] + lx,
-						ly,
-						chunk.CHUNK_LENGTH * chunk_pos[2] + lz
-				)
-				self.skylight_increase_queue.append((pos, 15))
+				top = max(self.get_height(x + 1, z), self.get_height(x - 1, z),
+						self.get_height(x, z + 1), self.get_height(x, z - 1), height + 1)
+
+				for y in range(min(height, chunk.CHUNK_HEIGHT - 1), min(top, chunk.CHUNK_HEIGHT)):
+					self.skylight_increase_queue.append((glm.ivec3(x, y, z), 15))
 
 		self.propagate_skylight_increase(False)
 		
@@ -272,6 +329,16 @@ class World:
 						self.skylight_increase_queue.append((neighbour_pos, newlight - 1))
 			
 	
+	def increase_skylight(self, world_pos, newlight, light_update=True):
+		chunk = self.chunks[get_chunk_position(world_pos)]
+		local_pos = get_local_position(world_pos)
+
+		chunk.set_sky_light(local_pos, newlight)
+
+		self.skylight_increase_queue.append((world_pos, newlight))
+
+		self.propagate_skylight_increase(light_update)
+
 	def decrease_light(self, world_pos):
 		chunk = self.chunks[get_chunk_position(world_pos)]
 		local_pos = get_local_position(world_pos)
@@ -379,6 +446,48 @@ class World:
 		return chunk.get_sky_light(local_position)
 
 	
+	def get_neighbourhood(self, position, size, default, get_box):
+		"""Data of the box of the given size at the given position, padded with one voxel on every side
+		The box is flat bytes, layer by layer (Y, then X, then Z), spanning neighbouring chunks if needed
+		Voxels outside of any loaded chunk are set to 'default', 'get_box' copies the data of a chunk (see 'chunk.copy_box')"""
+
+		width, height, length = (i + 2 for i in size)
+		start = glm.ivec3(position) - 1
+		end = start + glm.ivec3(width, height, length)
+
+		box = np.full((height, width, length), default, dtype = np.uint8)
+
+		first_chunk = get_chunk_position(start)
+		last_chunk = get_chunk_position(end - 1)
+
+		for cx in range(first_chunk.x, last_chunk.x + 1):
+			for cy in range(first_chunk.y, last_chunk.y + 1):
+				for cz in range(first_chunk.z, last_chunk.z + 1):
+					box_chunk = self.chunks.get(glm.ivec3(cx, cy, cz), None)
+					if not box_chunk:
+						continue
+
+					chunk_start = glm.ivec3(box_chunk.position)
+					chunk_end = chunk_start + glm.ivec3(chunk.CHUNK_WIDTH, chunk.CHUNK_HEIGHT, chunk.CHUNK_LENGTH)
+
+					lo = glm.max(start, chunk_start)
+					hi = glm.min(end, chunk_end)
+					offset = lo - start
+					extent = hi - lo
+
+					get_box(box_chunk, lo - chunk_start, hi - chunk_start,
+						box[offset.y:offset.y + extent.y, offset.x:offset.x + extent.x, offset.z:offset.z + extent.z])
+
+		return box.tobytes()
+
+	def get_light_neighbourhood(self, position, size):
+		# voxels outside of any loaded chunk have full skylight, like with 'get_raw_light'
+		return self.get_neighbourhood(position, size, 15 << 4, chunk.Chunk.get_light_box)
+
+	def get_block_neighbourhood(self, position, size):
+		# voxels outside of any loaded chunk are air, like with 'get_block_number'
+		return self.get_neighbourhood(position, size, 0, chunk.Chunk.get_block_box)
+
 	def set_light(self, position, light):
 		chunk = self.chunks.get(get_chunk_position(position), None)
 		local_position = get_local_position(position)
@@ -399,12 +508,25 @@ class World:
 		if not chunk_position in self.chunks:
 			return 0
 		
-		lx, ly, lz = get_local_position(position)
-
-		block_number = self.chunks[chunk_position].blocks[lx][ly][lz]
-		return block_number
+		return self.chunks[chunk_position].get_block_number(get_local_position(position))
 
 	
+	def get_height(self, x, z):
+		"""Height of the first block above the highest non-air block at these coordinates (0 if there's none)"""
+		height_chunk = self.chunks.get(get_chunk_position((x, 0, z)), None)
+		if not height_chunk:
+			return 0
+		lx, _, lz = get_local_position((x, 0, z))
+		return height_chunk.get_height(lx, lz)
+
+	def get_opaque_height(self, x, z):
+		"""Height of the first block above the highest opaque block at these coordinates (0 if there's none)"""
+		height_chunk = self.chunks.get(get_chunk_position((x, 0, z)), None)
+		if not height_chunk:
+			return 0
+		lx, _, lz = get_local_position((x, 0, z))
+		return height_chunk.get_opaque_height(lx, lz)
+
 	def get_transparency(self, position):
 		block_type = self.block_types[self.get_block_number(position)]
 
@@ -425,8 +547,95 @@ class World:
 		
 		return not block_type.transparent
 	
+	def add_chunk(self, chunk_position, blocks):
+		"""Adds a chunk read by 'Save.read_chunk' while the game is running, lights it and updates the meshes of the chunks next to it"""
+
+		new_chunk = self.save.install_chunk(chunk_position, blocks)
+
+		# light spreads into the chunks around without updating their meshes, block by block,
+		# so their lightmaps are compared once it's done instead, and the subchunks next to any change are updated at once
+
+		old_lightmaps = {}
+
+		for dx in (-1, 0, 1):
+			for dz in (-1, 0, 1):
+				neighbour = self.chunks.get(new_chunk.chunk_position + glm.ivec3(dx, 0, dz), None)
+
+				if neighbour and neighbour is not new_chunk:
+					old_lightmaps[neighbour] = bytes(neighbour.lightmap)
+
+		self.init_block_light(new_chunk)
+		self.init_skylight(new_chunk)
+		self.pull_border_light(new_chunk)
+
+		new_chunk.update_subchunk_meshes()
+
+		# light can't spread further than the chunks right next to the new one,
+		# but meshes of the chunks right next to those can still be built out of blocks which changed
+
+		radius = 2
+		side = 2 * radius + 1
+		changed = np.zeros((chunk.CHUNK_HEIGHT, side * chunk.CHUNK_WIDTH, side * chunk.CHUNK_LENGTH), dtype = bool)
+
+		def get_area(dx, dz):
+			x, z = (dx + radius) * chunk.CHUNK_WIDTH, (dz + radius) * chunk.CHUNK_LENGTH
+			return slice(None), slice(x, x + chunk.CHUNK_WIDTH), slice(z, z + chunk.CHUNK_LENGTH)
+
+		changed[get_area(0, 0)] = True # all of its blocks are new
+
+		for neighbour, old_lightmap in old_lightmaps.items():
+			dx, _, dz = neighbour.chunk_position - new_chunk.chunk_position
+			changed[get_area(dx, dz)] = (np.frombuffer(neighbour.lightmap, dtype = np.uint8)
+				!= np.frombuffer(old_lightmap, dtype = np.uint8)).reshape(chunk.CHUNK_HEIGHT, chunk.CHUNK_WIDTH, chunk.CHUNK_LENGTH)
+
+		outdated = chunk.get_outdated_subchunks(changed)
+
+		for dx in range(-radius, radius + 1):
+			for dz in range(-radius, radius + 1):
+				neighbour = self.chunks.get(new_chunk.chunk_position + glm.ivec3(dx, 0, dz), None)
+
+				if not neighbour or neighbour is new_chunk:
+					continue
+
+				sx, sz = (dx + radius) * chunk.CHUNK_WIDTH // subchunk.SUBCHUNK_WIDTH, (dz + radius) * chunk.CHUNK_LENGTH // subchunk.SUBCHUNK_LENGTH
+				subchunk_mask = outdated[:, sx:sx + chunk.CHUNK_WIDTH // subchunk.SUBCHUNK_WIDTH, sz:sz + chunk.CHUNK_LENGTH // subchunk.SUBCHUNK_LENGTH]
+
+				if subchunk_mask.any():
+					neighbour.update_subchunk_meshes([(x, y, z) for y, x, z in np.argwhere(subchunk_mask).tolist()])
+
+	def remove_chunk(self, chunk_position):
+		"""Unloads a chunk, saving it first if it was modified
+		Chunks are only unloaded once they're out of render distance, so there's no need to update their neighbours"""
+
+		old_chunk = self.chunks[chunk_position]
+
+		if old_chunk.modified:
+			self.save.save_chunk(chunk_position)
+
+		del self.chunks[chunk_position]
+		self.chunk_ring.invalidate()
+		old_chunk.delete()
+
+		# the chunk ring only forgets about it next frame
+		old_chunk.chunk_update_queue.clear()
+
+		if old_chunk in self.visible_chunks:
+			self.visible_chunks.remove(old_chunk)
+
+		if old_chunk in self.frustum_chunks:
+			self.frustum_chunks.remove(old_chunk)
+
+		if self.occlusion_culler:
+			self.occlusion_culler.discard(old_chunk)
+
+		if old_chunk in self.chunk_building_queue:
+			self.chunk_building_queue.remove(old_chunk)
+
+		self.sorted_chunks = tuple(render_chunk for render_chunk in self.sorted_chunks if render_chunk is not old_chunk)
+
 	def create_chunk(self, chunk_position):
 		self.chunks[chunk_position] = chunk.Chunk(self, chunk_position)
+		self.chunk_ring.invalidate()
 		self.init_skylight(self.chunks[chunk_position])
 	
 	def set_block(self, position, number): # set number to 0 (air) to remove block
@@ -445,7 +654,8 @@ class World:
 		
 		lx, ly, lz = get_local_position(position)
 
-		self.chunks[chunk_position].blocks[lx][ly][lz] = number
+		self.chunks[chunk_position].set_block_number((lx, ly, lz), number)
+		self.chunks[chunk_position].update_height_maps((lx, ly, lz), number)
 		self.chunks[chunk_position].modified = True
 
 		self.chunks[chunk_position].update_at_position((x, y, z))
@@ -460,7 +670,12 @@ class World:
 		
 		elif not number:
 			self.decrease_light(position)
-			self.decrease_skylight(position)
+
+			if ly >= self.chunks[chunk_position].get_height(lx, lz):
+				# the highest block of the column was removed, so the sky is right above
+				self.increase_skylight(glm.ivec3(position), 15)
+			else:
+				self.decrease_skylight(position)
 
 		cx, cy, cz = chunk_position
 
@@ -492,6 +707,19 @@ class World:
 		
 		self.set_block(position, number)
 
+	def get_vertex_memory_usage(self):
+		"""Bytes of vertex data of the chunk meshes, and bytes of GPU memory allocated for them
+		The difference is the room left for meshes to grow (see 'mesh_layout'), and the free space of the arena"""
+
+		used = sum(render_chunk.mesh_quad_count + render_chunk.translucent_quad_count for render_chunk in self.chunks.values())
+
+		if self.arena:
+			allocated = self.arena.get_memory_usage()[1]
+		else:
+			allocated = sum(render_chunk.storage_size or 0 for render_chunk in self.chunks.values()) * vertex_format.QUAD_SIZE
+
+		return used * vertex_format.QUAD_SIZE, allocated
+
 	def toggle_AO(self):
 		self.options.SMOOTH_LIGHTING = not self.options.SMOOTH_LIGHTING
 		for chunk in self.chunks.values():
@@ -503,27 +731,80 @@ class World:
 		if self.daylight >= 1800:
 			self.incrementer = -1
 	
-	def can_render_chunk(self, chunk_position):
-		return self.player.check_in_frustum(chunk_position) and math.dist(self.get_chunk_position(self.player.position), chunk_position) <= self.options.RENDER_DISTANCE
-
 	def prepare_rendering(self):
-		self.visible_chunks = [self.chunks[chunk_position]
-				for chunk_position in self.chunks if self.can_render_chunk(chunk_position)]
-		self.sort_chunks()
-	
-	def sort_chunks(self):
-		player_chunk_pos = self.get_chunk_position(self.player.position)
-		self.visible_chunks.sort(key = cmp_to_key(lambda a, b: math.dist(player_chunk_pos, a.chunk_position) 
-				- math.dist(player_chunk_pos, b.chunk_position)))
-		self.sorted_chunks = tuple(reversed(self.visible_chunks))
+		# the chunks in render distance are all culled at once (see 'culling.cull_chunks'), and are already sorted nearest first
+		start = time.perf_counter()
+
+		# cave culling walks from the section the camera is in (see 'Chunk_ring.walk_sections')
+		self.camera_position = glm.vec3(*self.player.interpolated_position) + glm.vec3(0, self.player.eyelevel, 0)
+		camera_section = (tuple(self.get_chunk_position(self.camera_position)), self.get_local_position(self.camera_position)[1] // chunk.SECTION_HEIGHT)
+
+		self.chunk_ring.update(self.get_chunk_position(self.player.position), camera_section)
+		indices, section_masks = culling.cull_chunks(self.player.frustum_planes, self.chunk_ring.positions,
+			self.options.SECTION_CULLING, self.chunk_ring.reachable_sections)
+
+		# only the face buckets which can face the camera are drawn, in the visible sections
+
+		bucket_masks = culling.get_bucket_masks(self.chunk_ring.positions[indices], self.camera_position) & section_masks[:, np.newaxis]
+
+		self.visible_chunks = []
+		self.visible_section_count = 0
+
+		for i, section_mask, chunk_bucket_masks in zip(indices.tolist(), section_masks.tolist(), map(tuple, bucket_masks.tolist())):
+			render_chunk = self.chunk_ring.chunks[i]
+			self.visible_chunks.append(render_chunk)
+			self.visible_section_count += bin(section_mask).count("1")
+
+			if section_mask != render_chunk.section_mask or chunk_bucket_masks != render_chunk.bucket_masks:
+				render_chunk.set_section_masks(section_mask, chunk_bucket_masks)
+
+		self.frustum_chunks = self.visible_chunks
+
+		if self.occlusion_culler:
+			self.occlusion_culler.collect()
+			self.visible_chunks = self.occlusion_culler.cull(self.frustum_chunks)
+
+		self.sorted_chunks = tuple(reversed(self.visible_chunks)) # furthest first, for translucency
+
+		if self.options.TRANSLUCENT_SORTING:
+			self.sort_translucent_quads()
+
+		self.culling_time = time.perf_counter() - start
+
+	def sort_translucent_quads(self):
+		"""Sorts the translucent quads of the visible chunks again once the camera moved far enough from where they were sorted from
+		Chunks whose translucent quads changed always are, as their old indices don't match them anymore,
+		while the others are sorted a few at a time, nearest first, as the order of far away quads hardly changes"""
+
+		self.translucent_sort_count = 0
+		camera_position = np.array(self.camera_position)
+
+		for render_chunk in self.visible_chunks:
+			quad_sorter = render_chunk.quad_sorter
+
+			if not render_chunk.translucent_draw_quad_count or not quad_sorter.is_outdated(camera_position - render_chunk.position):
+				continue
+
+			if quad_sorter.camera_position is not None and self.translucent_sort_count >= translucency.MAX_SORTS:
+				continue
+
+			render_chunk.sort_translucent_quads(camera_position)
+			self.translucent_sort_count += 1
 	
+	def draw_translucent_meshes(self):
+		if self.arena:
+			self.arena.draw_translucent(gl.GL_TRIANGLES)
+			return
+
+		for render_chunk in self.sorted_chunks:
+			render_chunk.draw_translucent(gl.GL_TRIANGLES)
+
 	def draw_translucent_fast(self):
 		gl.glEnable(gl.GL_BLEND)
 		gl.glDisable(gl.GL_CULL_FACE)
 		gl.glDepthMask(gl.GL_FALSE)
 
-		for render_chunk in self.sorted_chunks:
-			render_chunk.draw_translucent(gl.GL_TRIANGLES)
+		self.draw_translucent_meshes()
 
 		gl.glDepthMask(gl.GL_TRUE)
 		gl.glEnable(gl.GL_CULL_FACE)
@@ -534,18 +815,18 @@ class World:
 		gl.glFrontFace(gl.GL_CW)
 		gl.glEnable(gl.GL_BLEND)
 
-		for render_chunk in self.sorted_chunks:
-			render_chunk.draw_translucent(gl.GL_TRIANGLES)
+		self.draw_translucent_meshes()
 		
 		gl.glFrontFace(gl.GL_CCW)
 		
-		for render_chunk in self.sorted_chunks:
-			render_chunk.draw_translucent(gl.GL_TRIANGLES)
+		self.draw_translucent_meshes()
 
 		gl.glDisable(gl.GL_BLEND)
 		gl.glDepthMask(gl.GL_TRUE)
 
-	draw_translucent = draw_translucent_fancy if options.FANCY_TRANSLUCENCY else draw_translucent_fast
+	# sorted translucent quads already are drawn back to front, in a single pass
+
+	draw_translucent = draw_translucent_fancy if options.FANCY_TRANSLUCENCY and not options.TRANSLUCENT_SORTING else draw_translucent_fast
 	
 	def draw(self):
 		self.c = 0
@@ -555,8 +836,16 @@ class World:
 				(daylight_multiplier - 0.26) * 1.36, 1.0)
 		gl.glUniform1f(self.shader_daylight_location, daylight_multiplier)
 
-		for render_chunk in self.visible_chunks:
-			render_chunk.draw(gl.GL_TRIANGLES)
+		if self.arena:
+			# all visible chunks at once (see 'arena.py')
+			self.arena.prepare_draw_commands(self.visible_chunks, self.sorted_chunks)
+			self.arena.draw(gl.GL_TRIANGLES)
+		else:
+			for render_chunk in self.visible_chunks:
+				render_chunk.draw(gl.GL_TRIANGLES)
+
+		if self.occlusion_culler:
+			self.occlusion_culler.draw_proxies(self.frustum_chunks, self.player.p_matrix * self.player.mv_matrix, self.camera_position)
 
 		self.draw_translucent()
 
@@ -575,23 +864,38 @@ class World:
 
 		self.daylight += self.incrementer
 	
+	def queue_chunk_building(self, pending_chunk):
+		# a chunk only needs to be built once, however many of its subchunk updates are done
+		if pending_chunk not in self.chunk_building_queue:
+			self.chunk_building_queue.append(pending_chunk)
+
 	def build_pending_chunks(self):
 		if self.chunk_building_queue:
 			pending_chunk = self.chunk_building_queue.popleft()
 			pending_chunk.update_mesh()
 
 	def process_chunk_updates(self):
-		for chunk in self.visible_chunks:
+		# every chunk in render distance is updated, nearest first, not just the visible ones,
+		# as a chunk hidden by cave or occlusion culling only gets seen again once its meshes & section connections are up to date
+		for chunk in self.chunk_ring.chunks:
 			chunk.process_chunk_updates()
 
 	
 	def tick(self, delta_time):
 		self.chunk_update_counter = 0
 		self.time += 1
+		self.chunk_streamer.update(self.player.position)
 		self.pending_chunk_update_count = sum(len(chunk.chunk_update_queue) for chunk in self.chunks.values())
 		self.update_daylight()
+
+		if self.mesher_pool:
+			self.mesher_pool.collect()
+
 		self.build_pending_chunks()
 		self.process_chunk_updates()
+
+		if self.mesher_pool:
+			self.mesher_pool.flush()
 			
 				
 		